@@ -1,8 +1,7 @@
-import os
-import logging
+import importlib
+
 from flask import Flask
 from config import Config
-from logging.handlers import RotatingFileHandler
 
 def create_app():
     """Crea y configura la instancia de la app Flask."""
@@ -24,28 +23,26 @@ def create_app():
     return app
 
 def setup_logging(app):
-    """Configura logging profesional para WhispAi."""
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-
-    info_handler = RotatingFileHandler('logs/whispai_info.log', maxBytes=10 * 1024 * 1024, backupCount=5)
-    info_handler.setLevel(logging.INFO)
-    info_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [%(pathname)s:%(lineno)d]'
-    ))
-
-    error_handler = RotatingFileHandler('logs/whispai_error.log', maxBytes=5 * 1024 * 1024, backupCount=3)
-    error_handler.setLevel(logging.ERROR)
-    error_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [%(pathname)s:%(lineno)d]'
-    ))
-
-    app.logger.addHandler(info_handler)
-    app.logger.addHandler(error_handler)
-    app.logger.setLevel(logging.DEBUG)
+    """Configura logging asíncrono y estructurado (JSON) para WhispAi."""
+    from flask.logging import default_handler
+    from app.utils import log_utils
+
+    log_utils.configure_logging()
+
+    # app.logger propaga al root, donde está el QueueHandler; el StreamHandler
+    # por defecto de Flask escribiría de forma síncrona desde el hilo de la petición.
+    app.logger.removeHandler(default_handler)
     app.logger.info('WhispAi startup')
 
-# Reexportar servicios para uso externo (como consumidor.py)
-from app import db as db
-from app.services import storage_service as storage_service
-from app.services import whisper_service as whisper_service
+# Reexportar servicios para uso externo (como consumidor.py) bajo demanda: importarlos aquí
+# cargaría whisper/torch en cada proceso de la API aunque nunca transcriba.
+_LAZY_EXPORTS = {
+    "db": "app.db",
+    "storage_service": "app.services.storage_service",
+    "whisper_service": "app.services.whisper_service",
+}
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        return importlib.import_module(_LAZY_EXPORTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,17 +1,20 @@
+import os
 import datetime
 import uuid
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from pymongo.errors import DuplicateKeyError
 from flask import current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 from config import Config
+from app.services import hashing_service
 
 mongo_client = None
 mongo_db = None
+_connection_settings = None
+_client_pid = None
 
 def init_db(app=None):
     """Inicializa la conexión a la base de datos MongoDB."""
-    global mongo_client, mongo_db
+    global _connection_settings
 
     if app:
         uri = app.config["MONGO_URI"]
@@ -20,19 +23,56 @@ def init_db(app=None):
         uri = Config.MONGO_URI
         db_name = "whispai"
 
-    mongo_client = MongoClient(uri)
-    mongo_db = mongo_client[db_name]
+    _connection_settings = (uri, db_name)
+    _connect()
 
     # Crear índice único en 'email' para evitar duplicados
     mongo_db["users"].create_index("email", unique=True)
 
+    # Consultas de audios por propietario y por lote
+    mongo_db["audios"].create_index("owner_id")
+    mongo_db["audios"].create_index([("batch_id", 1), ("owner_id", 1)], sparse=True)
+    mongo_db["feature_cache"].create_index("last_access")
+    # Trabajos en curso por usuario para el planificador
+    mongo_db["audios"].create_index([("status", 1), ("owner_id", 1)])
+    mongo_db["model_stats"].create_index("profile")
+    # Throughput reciente para el control de admisión
+    mongo_db["audios"].create_index("completed_at", sparse=True)
+    # Búsqueda de leases caducados por el reaper
+    mongo_db["audios"].create_index("lease.expires_at", sparse=True)
+
+    # Búsqueda de texto completo acotada por propietario (owner_id como prefijo de igualdad).
+    # Sin stemming ("none") porque conviven varios idiomas, y language_override apunta a un
+    # campo inexistente para que el campo "language" del audio no se interprete como idioma.
+    mongo_db["audios"].create_index(
+        [("owner_id", 1), ("transcription", "text"), ("output_text", "text")],
+        name="audios_text_search",
+        default_language="none",
+        language_override="search_language",
+        weights={"transcription": 2, "output_text": 1}
+    )
+
     return mongo_db
 
+def _connect():
+    global mongo_client, mongo_db, _client_pid
+    uri, db_name = _connection_settings
+    mongo_client = MongoClient(uri)
+    mongo_db = mongo_client[db_name]
+    _client_pid = os.getpid()
+
+def reset_after_fork():
+    """Abre un cliente nuevo en el proceso hijo; MongoClient no es seguro tras fork()."""
+    if _connection_settings is not None and _client_pid != os.getpid():
+        _connect()
+
 
 def require_db():
     """Lanza error si la base de datos aún no ha sido inicializada."""
     if mongo_db is None:
         raise RuntimeError("Base de datos no inicializada")
+    if _client_pid != os.getpid():
+        reset_after_fork()
 
 # === Usuarios ===
 
@@ -49,7 +89,7 @@ def create_user(name: str = None, email: str = None, password: str = None) -> di
             "_id": user_id,
             "name": name,
             "email": email,
-            "password_hash": generate_password_hash(password),
+            "password_hash": hashing_service.hash_password(password),
             "created_at": datetime.datetime.utcnow()
         }
         mongo_db["users"].insert_one(user_doc)
@@ -67,27 +107,74 @@ def get_user_by_email(email: str) -> dict | None:
 
 def verify_password(stored_hash: str, password: str) -> bool:
     """Verifica una contraseña contra su hash almacenado."""
-    return check_password_hash(stored_hash, password)
+    return hashing_service.check_password(stored_hash, password)
+
+def verify_user_password(user: dict, password: str) -> bool:
+    """Verifica la contraseña de un usuario y regenera su hash si los parámetros cambiaron."""
+    if not verify_password(user["password_hash"], password):
+        return False
+    if hashing_service.needs_rehash(user["password_hash"]):
+        hashing_service.rehash_in_background(
+            password, lambda new_hash: update_user_password_hash(user["_id"], user["password_hash"], new_hash)
+        )
+    return True
+
+def update_user_password_hash(user_id: str, old_hash: str, new_hash: str):
+    """Sustituye el hash solo si no ha cambiado entretanto (p. ej. por otro login)."""
+    require_db()
+    mongo_db["users"].update_one(
+        {"_id": user_id, "password_hash": old_hash},
+        {"$set": {"password_hash": new_hash}}
+    )
 
 # === Audios ===
 
+def versioned(set_fields: dict) -> dict:
+    """Operación de actualización que además incrementa ``version`` y fija ``updated_at``.
+
+    Toda modificación de estado o contenido de un audio debe pasar por aquí para
+    que los ETag de /api/result y /api/list cambien.
+    """
+    return {
+        "$set": {**set_fields, "updated_at": datetime.datetime.utcnow()},
+        "$inc": {"version": 1}
+    }
+
 def save_audio_metadata(metadata: dict) -> str:
     """Guarda los metadatos de un nuevo audio."""
     require_db()
     result = mongo_db["audios"].insert_one(metadata)
     return result.inserted_id
 
+def save_audio_metadata_many(documents: list[dict]) -> list[str]:
+    """Guarda los metadatos de varios audios en una sola operación."""
+    require_db()
+    if not documents:
+        return []
+    result = mongo_db["audios"].insert_many(documents, ordered=False)
+    return result.inserted_ids
+
 def update_audio_metadata(audio_id: str, data: dict):
     """Actualiza campos generales de un documento de audio."""
     require_db()
-    mongo_db["audios"].update_one({"_id": audio_id}, {"$set": data})
+    mongo_db["audios"].update_one({"_id": audio_id}, versioned(data))
 
-def find_audio_by_id(audio_id: str) -> dict | None:
+def find_audio_by_id(audio_id: str, projection: dict = None) -> dict | None:
     """Recupera un documento de audio por su ID."""
     require_db()
-    return mongo_db["audios"].find_one({"_id": audio_id})
+    return mongo_db["audios"].find_one({"_id": audio_id}, projection)
+
+def find_audios_by_ids(audio_ids: list[str], owner_id: str, projection: dict = None) -> list[dict]:
+    """Recupera en una sola consulta los audios del usuario con esos IDs."""
+    require_db()
+    return list(mongo_db["audios"].find({"_id": {"$in": audio_ids}, "owner_id": owner_id}, projection))
+
+def find_audios_by_batch(batch_id: str, owner_id: str, projection: dict = None) -> list[dict]:
+    """Recupera todos los audios de un lote del usuario."""
+    require_db()
+    return list(mongo_db["audios"].find({"batch_id": batch_id, "owner_id": owner_id}, projection))
 
-def update_audio_transcription(audio_id, transcription_text, language="unknown", output_text=None):
+def update_audio_transcription(audio_id, transcription_text, language="unknown", output_text=None, segments=None):
     require_db()
     update_fields = {
         "transcription": transcription_text,
@@ -95,25 +182,352 @@ def update_audio_transcription(audio_id, transcription_text, language="unknown",
     }
     if output_text:
         update_fields["output_text"] = output_text
+    if segments is not None:
+        update_fields["segments"] = segments
     mongo_db["audios"].update_one(
         {"_id": audio_id},
-        {"$set": update_fields}
+        versioned(update_fields)
     )
 
-def update_audio_status(audio_id: str, status: str, error_message: str = None):
-    """Actualiza el estado del procesamiento de un audio."""
+def update_audio_status(audio_id: str, status: str, error_message: str = None, only_if: str = None) -> bool:
+    """Actualiza el estado del procesamiento de un audio.
+
+    Con ``only_if`` solo se cambia si el estado actual es ese (p. ej. para que el
+    final de un trabajo no pise una cancelación tardía). Devuelve si se actualizó.
+    """
     require_db()
     update_data = {"status": status}
     if error_message:
         update_data["error_message"] = error_message
-    mongo_db["audios"].update_one({"_id": audio_id}, {"$set": update_data})
+    if status == "completed":
+        update_data["completed_at"] = datetime.datetime.utcnow()
+    query = {"_id": audio_id}
+    if only_if:
+        query["status"] = only_if
+    result = mongo_db["audios"].update_one(query, versioned(update_data))
+    return result.matched_count == 1
 
-def list_audios_by_user_id(user_id: str) -> list[dict]:
+def update_audios_status(audio_ids: list[str], status: str, error_message: str = None):
+    """Actualiza el estado de varios audios a la vez."""
+    require_db()
+    update_data = {"status": status}
+    if error_message:
+        update_data["error_message"] = error_message
+    mongo_db["audios"].update_many({"_id": {"$in": audio_ids}}, versioned(update_data))
+
+def list_audios_by_user_id(user_id: str, projection: dict = None) -> list[dict]:
     """Devuelve todos los audios pertenecientes a un usuario."""
     require_db()
-    return list(mongo_db["audios"].find({"owner_id": user_id}))
+    return list(mongo_db["audios"].find({"owner_id": user_id}, projection))
+
+def search_audios(owner_id: str, query: str, skip: int = 0, limit: int = 20, projection: dict = None) -> list[dict]:
+    """Busca en las transcripciones de un usuario con el índice de texto, ordenado por relevancia."""
+    require_db()
+    projection = dict(projection or {})
+    projection["score"] = {"$meta": "textScore"}
+    cursor = mongo_db["audios"].find({"owner_id": owner_id, "$text": {"$search": query}}, projection)
+    return list(cursor.sort([("score", {"$meta": "textScore"})]).skip(skip).limit(limit))
 
 def delete_audio(audio_id: str):
     """Elimina un audio por ID."""
     require_db()
     mongo_db["audios"].delete_one({"_id": audio_id})
+
+# === Trabajos (leases) ===
+
+def claim_audio_lease(audio_id: str, lease: dict, job: dict) -> dict | None:
+    """Reclama el trabajo de un audio si sigue en proceso y nadie tiene un lease vigente.
+
+    Incrementa ``attempts`` y guarda ``job`` (el mensaje original) para poder
+    reencolarlo. Devuelve el documento actualizado o ``None`` si no se pudo reclamar.
+
+    El refinado de un trabajo en dos pasadas puede quedarse con el lease del
+    borrador: el borrador ya está guardado y su worker solo está encolando el
+    refinado, que puede llegar a otro worker antes de que lo libere.
+    """
+    require_db()
+    now = datetime.datetime.utcnow()
+    claimable = [{"lease": None}, {"lease.expires_at": {"$lt": now}}]
+    if job.get("pass") == "refine":
+        claimable.append({"draft_ready": True, "job.pass": "draft"})
+    return mongo_db["audios"].find_one_and_update(
+        {"_id": audio_id, "status": "processing", "$or": claimable},
+        {"$set": {"lease": lease, "job": job}, "$inc": {"attempts": 1}},
+        projection={"attempts": 1, "owner_id": 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+def renew_audio_lease(audio_id: str, token: str, expires_at: datetime.datetime) -> bool:
+    """Prolonga el lease si sigue siendo nuestro (heartbeat)."""
+    require_db()
+    result = mongo_db["audios"].update_one(
+        {"_id": audio_id, "lease.token": token},
+        {"$set": {"lease.expires_at": expires_at}}
+    )
+    return result.matched_count == 1
+
+def release_audio_lease(audio_id: str, token: str):
+    require_db()
+    mongo_db["audios"].update_one({"_id": audio_id, "lease.token": token}, {"$unset": {"lease": ""}})
+
+def expire_audio_lease(audio_id: str, token: str):
+    """Da el lease por caducado ya para que el reaper recupere el trabajo en su próxima pasada."""
+    require_db()
+    mongo_db["audios"].update_one(
+        {"_id": audio_id, "lease.token": token},
+        {"$set": {"lease.expires_at": datetime.datetime.utcnow()}}
+    )
+
+def restore_audio_lease(audio_id: str, lease: dict):
+    """Devuelve un lease caducado tomado por el reaper si no pudo reencolar el trabajo."""
+    require_db()
+    mongo_db["audios"].update_one(
+        {"_id": audio_id, "status": "processing", "lease": {"$exists": False}},
+        {"$set": {"lease": lease}}
+    )
+
+def find_expired_leases(limit: int = 100) -> list[dict]:
+    """Audios en proceso cuyo worker dejó de renovar el lease."""
+    require_db()
+    now = datetime.datetime.utcnow()
+    return list(mongo_db["audios"].find(
+        {"status": "processing", "lease.expires_at": {"$lt": now}},
+        {"lease": 1, "job": 1, "attempts": 1}
+    ).limit(limit))
+
+def take_expired_lease(audio_id: str, token: str) -> bool:
+    """Libera un lease caducado; solo un reaper gana aunque haya varios en paralelo."""
+    require_db()
+    result = mongo_db["audios"].update_one(
+        {"_id": audio_id, "lease.token": token, "lease.expires_at": {"$lt": datetime.datetime.utcnow()}},
+        {"$unset": {"lease": ""}}
+    )
+    return result.modified_count == 1
+
+def record_job_error(audio_id: str, error_message: str, next_attempt_at: datetime.datetime = None):
+    """Registra el error de un intento fallido que se va a reintentar."""
+    require_db()
+    mongo_db["audios"].update_one(
+        {"_id": audio_id},
+        versioned({"last_error": error_message, "next_attempt_at": next_attempt_at})
+    )
+
+def cancel_audio(audio_id: str, owner_id: str) -> bool:
+    """Marca como cancelado un audio en proceso. Devuelve False si ya había terminado."""
+    require_db()
+    result = mongo_db["audios"].update_one(
+        {"_id": audio_id, "owner_id": owner_id, "status": "processing"},
+        versioned({"status": "cancelled", "cancelled_at": datetime.datetime.utcnow()})
+    )
+    return result.modified_count == 1
+
+def is_audio_cancelled(audio_id: str) -> bool:
+    """Un audio eliminado cuenta como cancelado: su trabajo ya no tiene destinatario."""
+    require_db()
+    audio_doc = mongo_db["audios"].find_one({"_id": audio_id}, {"status": 1})
+    return audio_doc is None or audio_doc.get("status") == "cancelled"
+
+def hold_scheduler_job(audio_id: str, job: dict) -> bool:
+    """Guarda el mensaje de un audio retenido por el planificador (su cola virtual vive en MongoDB).
+
+    Devuelve False si el audio ya no está pendiente (cancelado, borrado o ya despachado).
+    """
+    require_db()
+    result = mongo_db["audios"].update_one(
+        {"_id": audio_id, "status": "processing", "scheduled_at": {"$exists": False}},
+        {"$set": {"scheduler_job": job}}
+    )
+    return result.matched_count == 1
+
+def find_held_scheduler_jobs() -> list[dict]:
+    """Mensajes retenidos por el planificador y aún sin despachar, por orden de subida."""
+    require_db()
+    cursor = mongo_db["audios"].find(
+        {"status": "processing", "scheduled_at": {"$exists": False}, "scheduler_job": {"$exists": True}},
+        {"scheduler_job": 1}
+    ).sort("upload_time", 1)
+    return [doc["scheduler_job"] for doc in cursor]
+
+def mark_audios_scheduled(audio_ids: list[str]):
+    """Registra que el planificador ya pasó estos audios a la cola de los workers."""
+    require_db()
+    mongo_db["audios"].update_many(
+        {"_id": {"$in": audio_ids}},
+        {"$set": {"scheduled_at": datetime.datetime.utcnow()}, "$unset": {"scheduler_job": ""}}
+    )
+
+def count_active_jobs_by_owner() -> dict:
+    """Trabajos despachados y aún en proceso, agrupados por usuario."""
+    require_db()
+    pipeline = [
+        {"$match": {"status": "processing", "scheduled_at": {"$exists": True}}},
+        {"$group": {"_id": "$owner_id", "count": {"$sum": 1}}}
+    ]
+    return {row["_id"]: row["count"] for row in mongo_db["audios"].aggregate(pipeline)}
+
+# === Control de admisión ===
+
+def count_unscheduled_audios() -> int:
+    """Audios en proceso que el planificador aún no ha pasado a la cola de los workers."""
+    require_db()
+    return mongo_db["audios"].count_documents({"status": "processing", "scheduled_at": {"$exists": False}})
+
+def count_completed_since(since: datetime.datetime) -> int:
+    require_db()
+    return mongo_db["audios"].count_documents({"completed_at": {"$gte": since}})
+
+def take_rate_limit_tokens(key: str, cost: float, rate: float, burst: float, required: float = None) -> dict:
+    """Token bucket atómico en MongoDB compartido por todos los procesos de la API.
+
+    Rellena ``rate`` tokens por segundo hasta ``burst`` y descuenta ``cost`` si
+    hay al menos ``required`` (por defecto ``cost``). Con ``required < cost`` el
+    bucket queda en negativo y las siguientes peticiones esperan a que se pague
+    la deuda. Devuelve el bucket con ``allowed`` y los ``tokens`` restantes.
+    """
+    require_db()
+    required = cost if required is None else required
+    now = datetime.datetime.utcnow()
+    elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+    refilled = {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]}
+    return mongo_db["rate_limits"].find_one_and_update(
+        {"_id": key},
+        [
+            {"$set": {"tokens": refilled, "updated_at": now}},
+            {"$set": {
+                "allowed": {"$gte": ["$tokens", required]},
+                "tokens": {"$cond": [{"$gte": ["$tokens", required]}, {"$subtract": ["$tokens", cost]}, "$tokens"]}
+            }}
+        ],
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+def refund_rate_limit_tokens(key: str, cost: float, burst: float):
+    """Devuelve ``cost`` tokens al bucket (sin pasar de ``burst``) de una petición que no llegó a hacerse."""
+    require_db()
+    mongo_db["rate_limits"].update_one(
+        {"_id": key},
+        [{"$set": {"tokens": {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, cost]}]}}}]
+    )
+
+# === Rendimiento medido de los modelos ===
+
+def get_model_stats(profile: str) -> dict:
+    """RTF y tiempo de carga medidos por modelo en un perfil de hardware."""
+    require_db()
+    return {doc["model"]: doc for doc in mongo_db["model_stats"].find({"profile": profile})}
+
+def record_model_stats(profile: str, model: str, alpha: float, rtf: float = None, load_seconds: float = None):
+    """Actualiza la media móvil exponencial del RTF y/o del tiempo de carga de un modelo."""
+    require_db()
+    def ewma(field, value):
+        return {"$add": [alpha * value, {"$multiply": [1 - alpha, {"$ifNull": [f"${field}", value]}]}]}
+
+    fields = {"profile": profile, "model": model, "updated_at": datetime.datetime.utcnow()}
+    if rtf is not None:
+        fields["rtf"] = ewma("rtf", rtf)
+        fields["samples"] = {"$add": [{"$ifNull": ["$samples", 0]}, 1]}
+    if load_seconds is not None:
+        fields["load_seconds"] = ewma("load_seconds", load_seconds)
+    mongo_db["model_stats"].update_one({"_id": f"{profile}:{model}"}, [{"$set": fields}], upsert=True)
+
+# === Dos pasadas (borrador y refinado) ===
+
+def save_audio_draft(audio_id: str, transcription_text: str, language: str, segments: dict, draft: dict) -> bool:
+    """Guarda el borrador y marca ``draft_ready``; el audio sigue en proceso hasta el refinado.
+
+    Reinicia ``attempts`` para que el refinado tenga sus propios reintentos y
+    descarta el checkpoint de tramos, que era del modelo del borrador.
+    """
+    require_db()
+    update = versioned({
+        "transcription": transcription_text,
+        "output_text": transcription_text.strip(),
+        "segments": segments,
+        "language": language,
+        "draft_ready": True,
+        "draft": draft,
+        "attempts": 0
+    })
+    update["$unset"] = {"checkpoint": ""}
+    result = mongo_db["audios"].update_one({"_id": audio_id, "status": "processing"}, update)
+    return result.modified_count == 1
+
+# === Checkpoints de audios largos ===
+
+def start_audio_checkpoint(audio_id: str, settings: dict):
+    """Inicia un checkpoint vacío; ``settings`` determina si se puede reanudar más tarde."""
+    require_db()
+    mongo_db["audios"].update_one(
+        {"_id": audio_id},
+        {"$set": {"checkpoint": {**settings, "next_offset": 0.0, "chunks": [],
+                                 "updated_at": datetime.datetime.utcnow()}}}
+    )
+
+def append_audio_checkpoint_chunk(audio_id: str, chunk: dict, next_offset: float):
+    """Añade el resultado de un tramo terminado sin reescribir los anteriores."""
+    require_db()
+    mongo_db["audios"].update_one(
+        {"_id": audio_id},
+        {
+            "$push": {"checkpoint.chunks": chunk},
+            "$set": {"checkpoint.next_offset": next_offset, "checkpoint.updated_at": datetime.datetime.utcnow()}
+        }
+    )
+
+def clear_audio_checkpoint(audio_id: str):
+    require_db()
+    mongo_db["audios"].update_one({"_id": audio_id}, {"$unset": {"checkpoint": ""}})
+
+# === Lotes ===
+
+def save_batch(batch: dict) -> str:
+    """Guarda el documento que agrupa los audios de una subida por lotes."""
+    require_db()
+    result = mongo_db["batches"].insert_one(batch)
+    return result.inserted_id
+
+def find_batch_by_id(batch_id: str) -> dict | None:
+    require_db()
+    return mongo_db["batches"].find_one({"_id": batch_id})
+
+def count_batch_statuses(batch_id: str, owner_id: str) -> dict:
+    """Devuelve el número de audios del lote por estado."""
+    require_db()
+    pipeline = [
+        {"$match": {"batch_id": batch_id, "owner_id": owner_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]
+    return {row["_id"]: row["count"] for row in mongo_db["audios"].aggregate(pipeline)}
+
+# === Caché de features (índice LRU del backend MinIO) ===
+
+def touch_feature_cache_entry(key: str) -> bool:
+    """Marca la entrada como usada ahora; devuelve False si no existe."""
+    require_db()
+    result = mongo_db["feature_cache"].update_one(
+        {"_id": key}, {"$set": {"last_access": datetime.datetime.utcnow()}}
+    )
+    return result.matched_count > 0
+
+def upsert_feature_cache_entry(key: str, size: int):
+    require_db()
+    mongo_db["feature_cache"].update_one(
+        {"_id": key},
+        {"$set": {"size": size, "last_access": datetime.datetime.utcnow()}},
+        upsert=True
+    )
+
+def feature_cache_total_bytes() -> int:
+    require_db()
+    rows = list(mongo_db["feature_cache"].aggregate([{"$group": {"_id": None, "total": {"$sum": "$size"}}}]))
+    return rows[0]["total"] if rows else 0
+
+def oldest_feature_cache_entries(limit: int = 100) -> list[dict]:
+    require_db()
+    return list(mongo_db["feature_cache"].find({}, {"size": 1}).sort("last_access", 1).limit(limit))
+
+def delete_feature_cache_entries(keys: list[str]):
+    require_db()
+    if keys:
+        mongo_db["feature_cache"].delete_many({"_id": {"$in": keys}})
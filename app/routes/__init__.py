@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api = Blueprint("api", __name__)
 
-from app.routes import auth_routes, manage_routes, upload_routes
+from app.routes import auth_routes, manage_routes, upload_routes, metrics_routes, playback_routes, search_routes
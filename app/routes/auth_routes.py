@@ -1,6 +1,7 @@
 from flask import request, jsonify
 from app.routes import api
 from app import db
+from app.services.hashing_service import HashingBusyError
 from app.utils.jwt_utils import generate_jwt, generate_refresh_token, decode_jwt, jwt_required
 
 @api.route('/api/login', methods=['POST'])
@@ -10,8 +11,11 @@ def login_user():
         return jsonify({"error": "Email y contraseña requeridos"}), 400
 
     user = db.get_user_by_email(data["email"])
-    if not user or not db.verify_password(user["password_hash"], data["password"]):
-        return jsonify({"error": "Credenciales inválidas"}), 401
+    try:
+        if not user or not db.verify_user_password(user, data["password"]):
+            return jsonify({"error": "Credenciales inválidas"}), 401
+    except HashingBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
 
     access_token = generate_jwt(user["_id"], user.get("name"))
     refresh_token = generate_refresh_token(user["_id"])
@@ -54,6 +58,8 @@ def register_user():
         )
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    except HashingBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
 
     access_token = generate_jwt(user["_id"], user.get("name"))
     refresh_token = generate_refresh_token(user["_id"])
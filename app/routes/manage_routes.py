@@ -2,41 +2,173 @@ import os
 import uuid
 import datetime
 
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, make_response
 from config import Config
 from app.routes import api
 from app import db
-from app.services import storage_service
+from app.services import storage_service, embedding_service
 from app.utils.jwt_utils import jwt_required
+from app.utils.http_utils import compressed, etag_matches, make_etag, not_modified, parse_fields
 from rabbitmq.emisor import send_audio_task
 from app.utils.llm_utils import generate_llm_output 
+from app.utils.subtitle_utils import EXPORT_FORMATS, EXPORT_LEVELS, render
 
-@api.route('/api/result/<audio_id>', methods=['GET'])
-@jwt_required
-def get_transcription_result(audio_id):
-    audio_doc = db.find_audio_by_id(audio_id)
-    if not audio_doc:
-        return jsonify({"error": "Audio no encontrado"}), 404
+# Campo de la respuesta -> campo del documento; TEXT_FIELDS son los grandes que se pueden omitir
+RESULT_FIELDS = {
+    "status": "status",
+    "format": "output_format",
+    "transcription": "transcription",
+    "duration": "duration",
+    "model_used": "model_used",
+    "model_decision": "model_decision",
+    "language": "language",
+    "generate_llm_output": "generate_llm_output",
+    "llm_model_used": "llm_model_used",
+    "output_text": "output_text",
+    "draft_ready": "draft_ready",
+    "draft": "draft",
+    "error_message": "error_message"
+}
+TEXT_FIELDS = ("transcription", "output_text")
+LIST_PROJECTION = {"filename": 1, "status": 1, "upload_time": 1, "output_format": 1, "version": 1}
 
-    if audio_doc.get("owner_id") != request.user["_id"]:
-        return jsonify({"error": "Acceso no autorizado"}), 403
+def result_projection(fields=None) -> dict:
+    """Proyección de Mongo con solo los campos necesarios para ``fields`` (todos si es None)."""
+    names = RESULT_FIELDS if fields is None else fields
+    projection = {RESULT_FIELDS[name]: 1 for name in names}
+    projection.update({"owner_id": 1, "version": 1, "updated_at": 1})
+    return projection
 
+def serialize_result(audio_doc: dict, fields=None) -> dict:
+    """Representación pública del resultado de un audio (opcionalmente solo ``fields``)."""
     response = {
-        "id": audio_id,
+        "id": audio_doc["_id"],
         "status": audio_doc.get("status", "processing"),
         "format": audio_doc.get("output_format", "text"),
         "transcription": audio_doc.get("transcription"),
         "duration": audio_doc.get("duration"),
         "model_used": audio_doc.get("model_used"),
+        "model_decision": audio_doc.get("model_decision"),
         "language": audio_doc.get("language", "unknown"),
         "generate_llm_output": audio_doc.get("generate_llm_output", True),
         "llm_model_used": audio_doc.get("llm_model_used"),
-        "output_text": audio_doc.get("output_text")
+        "output_text": audio_doc.get("output_text"),
+        # En dos pasadas: texto del borrador disponible mientras status sigue en "processing"
+        "draft_ready": audio_doc.get("draft_ready", False),
+        "draft": audio_doc.get("draft")
     }
 
     if audio_doc.get("error_message"):
         response["error_message"] = audio_doc["error_message"]
 
+    if fields is not None:
+        response = {key: value for key, value in response.items() if key == "id" or key in fields}
+    return response
+
+@api.route('/api/result/<audio_id>', methods=['GET'])
+@jwt_required
+@compressed
+def get_transcription_result(audio_id):
+    try:
+        fields = parse_fields(RESULT_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    audio_doc = db.find_audio_by_id(audio_id, result_projection(fields))
+    if not audio_doc:
+        return jsonify({"error": "Audio no encontrado"}), 404
+
+    if audio_doc.get("owner_id") != request.user["_id"]:
+        return jsonify({"error": "Acceso no autorizado"}), 403
+
+    # La versión cambia con cada actualización de estado o contenido del audio
+    etag = make_etag(audio_id, audio_doc.get("version", 0), sorted(fields) if fields else None)
+    if etag_matches(etag):
+        return not_modified(etag)
+
+    response = make_response(jsonify(serialize_result(audio_doc, fields)), 200)
+    response.set_etag(etag, weak=True)
+    if audio_doc.get("updated_at"):
+        response.last_modified = audio_doc["updated_at"]
+    return response
+
+@api.route('/api/result/<audio_id>/export', methods=['GET'])
+@jwt_required
+@compressed
+def export_transcription(audio_id):
+    """Subtítulos SRT/VTT o JSON generados a partir de los segmentos guardados (sin re-inferencia)."""
+    export_format = request.args.get("format", "srt").lower()
+    level = request.args.get("level", "segment").lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Formato no válido. Opciones: {', '.join(EXPORT_FORMATS)}"}), 400
+    if level not in EXPORT_LEVELS:
+        return jsonify({"error": f"Nivel no válido. Opciones: {', '.join(EXPORT_LEVELS)}"}), 400
+
+    audio_doc = db.find_audio_by_id(audio_id, {"owner_id": 1, "filename": 1, "segments": 1, "version": 1, "updated_at": 1})
+    if not audio_doc:
+        return jsonify({"error": "Audio no encontrado"}), 404
+
+    if audio_doc.get("owner_id") != request.user["_id"]:
+        return jsonify({"error": "Acceso no autorizado"}), 403
+
+    if not audio_doc.get("segments"):
+        return jsonify({"error": "No hay segmentos disponibles para este audio"}), 404
+
+    etag = make_etag(audio_id, audio_doc.get("version", 0), export_format, level)
+    if etag_matches(etag):
+        return not_modified(etag)
+
+    try:
+        body = render(audio_doc["segments"], export_format, level)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    basename = os.path.splitext(audio_doc.get("filename") or audio_id)[0]
+    response = make_response(body, 200)
+    response.mimetype = EXPORT_FORMATS[export_format]
+    response.headers.set("Content-Disposition", "attachment", filename=f"{basename}.{export_format}")
+    response.set_etag(etag, weak=True)
+    if audio_doc.get("updated_at"):
+        response.last_modified = audio_doc["updated_at"]
+    return response
+
+@api.route('/api/results', methods=['POST'])
+@jwt_required
+@compressed
+def get_transcription_results():
+    """Resultados de muchos audios (``ids`` o ``batch_id``) en una sola consulta."""
+    data = request.get_json(silent=True) or {}
+    audio_ids = data.get("ids")
+    batch_id = data.get("batch_id")
+    include_text = data.get("include_text", True)
+    # Como en el resto de flags también se acepta "true"/"false" como texto
+    if isinstance(include_text, str) and include_text.lower() in ("true", "false"):
+        include_text = include_text.lower() == "true"
+
+    if not isinstance(include_text, bool):
+        return jsonify({"error": "'include_text' debe ser true o false"}), 400
+    if not audio_ids and not batch_id:
+        return jsonify({"error": "Se requiere 'ids' o 'batch_id'"}), 400
+    if audio_ids is not None and (not isinstance(audio_ids, list) or not all(isinstance(i, str) for i in audio_ids)):
+        return jsonify({"error": "'ids' debe ser una lista de IDs"}), 400
+    if audio_ids and len(audio_ids) > Config.BULK_RESULT_MAX_IDS:
+        return jsonify({"error": f"Máximo {Config.BULK_RESULT_MAX_IDS} IDs por consulta"}), 400
+
+    fields = None if include_text else [name for name in RESULT_FIELDS if name not in TEXT_FIELDS]
+    projection = result_projection(fields)
+    owner_id = request.user["_id"]
+    if audio_ids:
+        audio_docs = db.find_audios_by_ids(audio_ids, owner_id, projection)
+    else:
+        audio_docs = db.find_audios_by_batch(batch_id, owner_id, projection)
+
+    results = [serialize_result(audio_doc, fields) for audio_doc in audio_docs]
+
+    response = {"results": results}
+    if audio_ids:
+        # Los IDs ajenos se tratan igual que los inexistentes para no revelar su existencia
+        found = {r["id"] for r in results}
+        response["missing"] = [audio_id for audio_id in audio_ids if audio_id not in found]
     return jsonify(response), 200
 
 @api.route('/api/reinterpret/<audio_id>', methods=['POST'])
@@ -80,8 +212,14 @@ def reinterpret_audio(audio_id):
 
 @api.route('/api/list', methods=['GET'])
 @jwt_required
+@compressed
 def list_audios():
-    audios = db.list_audios_by_user_id(request.user["_id"])
+    audios = db.list_audios_by_user_id(request.user["_id"], LIST_PROJECTION)
+
+    etag = make_etag(request.user["_id"], [(a["_id"], a.get("version", 0)) for a in audios])
+    if etag_matches(etag):
+        return not_modified(etag)
+
     result = [{
         "id": a["_id"],
         "filename": a.get("filename"),
@@ -89,7 +227,25 @@ def list_audios():
         "upload_time": a.get("upload_time"),
         "format": a.get("output_format")
     } for a in audios]
-    return jsonify(result), 200
+    response = make_response(jsonify(result), 200)
+    response.set_etag(etag, weak=True)
+    return response
+
+@api.route('/api/audio/<audio_id>/cancel', methods=['POST'])
+@jwt_required
+def cancel_audio(audio_id):
+    """Cancela la transcripción: los mensajes en cola se descartan y el worker se detiene en la siguiente etapa."""
+    audio_doc = db.find_audio_by_id(audio_id, {"owner_id": 1, "status": 1})
+    if not audio_doc:
+        return jsonify({"error": "Audio no encontrado"}), 404
+
+    if audio_doc.get("owner_id") != request.user["_id"]:
+        return jsonify({"error": "Acceso no autorizado"}), 403
+
+    if not db.cancel_audio(audio_id, request.user["_id"]):
+        return jsonify({"error": "El audio ya no está en proceso", "status": audio_doc.get("status")}), 409
+
+    return jsonify({"message": "Transcripción cancelada", "id": audio_id, "status": "cancelled"}), 200
 
 @api.route('/api/audio/<audio_id>', methods=['DELETE'])
 @jwt_required
@@ -103,8 +259,16 @@ def delete_audio(audio_id):
 
     try:
         storage_service.delete_file(audio_doc["object_name"])
+        normalized_object = audio_doc.get("normalized_object_name")
+        if normalized_object and normalized_object != audio_doc["object_name"]:
+            storage_service.delete_file(normalized_object)
         db.delete_audio(audio_id)
-        return jsonify({"message": "Audio eliminado correctamente"}), 200
     except Exception as e:
         current_app.logger.error(f"Error al eliminar audio {audio_id}: {e}")
         return jsonify({"error": "No se pudo eliminar el audio"}), 500
+
+    try:
+        embedding_service.request_remove(audio_doc["owner_id"], audio_id)
+    except Exception as e:
+        current_app.logger.warning(f"No se pudo quitar el audio {audio_id} del índice semántico: {e}")
+    return jsonify({"message": "Audio eliminado correctamente"}), 200
@@ -0,0 +1,36 @@
+import time
+import threading
+
+from flask import Response, current_app
+from app.routes import api
+from config import Config
+from app.services import metrics_service, rabbitmq_service
+
+_depth_at = 0.0
+_depth_lock = threading.Lock()
+
+def refresh_queue_depth():
+    """Actualiza la profundidad de la cola como mucho cada ``METRICS_QUEUE_DEPTH_CACHE_SECONDS``.
+
+    Si otro scrape ya la está consultando no se espera: se sirve el último valor.
+    """
+    global _depth_at
+    if time.monotonic() - _depth_at < Config.METRICS_QUEUE_DEPTH_CACHE_SECONDS:
+        return
+    if not _depth_lock.acquire(blocking=False):
+        return
+    try:
+        depth = rabbitmq_service.get_queue_depth()
+        metrics_service.queue_depth.labels(rabbitmq_service.queue_name).set(depth)
+    except Exception as e:
+        current_app.logger.warning(f"No se pudo leer la profundidad de la cola: {e}")
+    finally:
+        # También tras un fallo: con RabbitMQ caído cada scrape no debe esperar al timeout
+        _depth_at = time.monotonic()
+        _depth_lock.release()
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    refresh_queue_depth()
+    payload, content_type = metrics_service.render_metrics()
+    return Response(payload, content_type=content_type)
@@ -0,0 +1,71 @@
+from flask import Response, request, jsonify, redirect, current_app
+from config import Config
+from app.routes import api
+from app import db
+from app.services import storage_service
+from app.utils.jwt_utils import jwt_required
+
+def _stream_object(obj):
+    """Generador que lee de MinIO por trozos la respuesta ya abierta, sin cargarla en memoria."""
+    try:
+        for chunk in obj.stream(Config.PLAYBACK_CHUNK_SIZE):
+            yield chunk
+    finally:
+        obj.close()
+        obj.release_conn()
+
+@api.route('/api/audio/<audio_id>/stream', methods=['GET'])
+@jwt_required
+def stream_audio(audio_id):
+    """Reproduce el audio original con soporte de peticiones HTTP Range."""
+    audio_doc = db.find_audio_by_id(audio_id, {"owner_id": 1, "object_name": 1, "content_type": 1})
+    if not audio_doc:
+        return jsonify({"error": "Audio no encontrado"}), 404
+
+    if audio_doc.get("owner_id") != request.user["_id"]:
+        return jsonify({"error": "Acceso no autorizado"}), 403
+
+    object_name = audio_doc["object_name"]
+    use_redirect = request.args.get("redirect", str(Config.PLAYBACK_REDIRECT)).lower() == "true"
+
+    try:
+        if use_redirect:
+            # El cliente descarga directamente de MinIO; la API no queda en el camino de los datos
+            return redirect(storage_service.presigned_url(object_name, Config.PRESIGNED_URL_EXPIRES), code=302)
+
+        stat = storage_service.stat_file(object_name)
+    except Exception as e:
+        current_app.logger.error(f"Error accediendo al audio {audio_id} en MinIO: {e}")
+        return jsonify({"error": "No se pudo acceder al audio"}), 500
+
+    size = stat.size
+    headers = {"Accept-Ranges": "bytes"}
+    if stat.etag:
+        headers["ETag"] = f'"{stat.etag}"'
+    mimetype = audio_doc.get("content_type") or stat.content_type or "application/octet-stream"
+
+    # Las peticiones multirango (multipart/byteranges) no se soportan: se sirve el audio completo
+    if request.range is None or len(request.range.ranges) > 1:
+        status, start, length = 200, 0, 0
+        headers["Content-Length"] = str(size)
+    else:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+
+        start, stop = byte_range
+        status, length = 206, stop - start
+        headers["Content-Length"] = str(length)
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+
+    # Se abre antes de construir la respuesta: un fallo de MinIO dentro del generador
+    # llegaría con las cabeceras ya enviadas y el cliente vería una respuesta truncada
+    try:
+        obj = storage_service.open_range(object_name, start, length)
+    except Exception as e:
+        current_app.logger.error(f"Error leyendo el audio {audio_id} de MinIO: {e}")
+        return jsonify({"error": "No se pudo acceder al audio"}), 500
+
+    return Response(_stream_object(obj), status, headers=headers,
+                    mimetype=mimetype, direct_passthrough=True)
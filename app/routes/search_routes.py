@@ -0,0 +1,76 @@
+from flask import request, jsonify, current_app
+from config import Config
+from app.routes import api
+from app import db
+from app.services import search_service, embedding_service
+from app.utils.jwt_utils import jwt_required
+from app.utils.http_utils import compressed
+
+@api.route('/api/search', methods=['GET'])
+@jwt_required
+@compressed
+def search_transcriptions():
+    """Búsqueda de texto completo en las transcripciones del usuario, paginada."""
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Se requiere el parámetro 'q'"}), 400
+
+    try:
+        page = int(request.args.get("page", 1))
+        per_page = int(request.args.get("per_page", Config.SEARCH_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "'page' y 'per_page' deben ser números enteros"}), 400
+    if page < 1 or not 1 <= per_page <= Config.SEARCH_MAX_PAGE_SIZE:
+        return jsonify({"error": f"'page' debe ser >= 1 y 'per_page' entre 1 y {Config.SEARCH_MAX_PAGE_SIZE}"}), 400
+
+    try:
+        result = search_service.search(request.user["_id"], query, page, per_page)
+    except Exception as e:
+        current_app.logger.error(f"Error en la búsqueda de texto: {e}")
+        return jsonify({"error": "No se pudo completar la búsqueda"}), 500
+
+    return jsonify(result), 200
+
+@api.route('/api/search/semantic', methods=['GET'])
+@jwt_required
+@compressed
+def semantic_search():
+    """Fragmentos de transcripción más parecidos en significado a ``q`` (top-k por similitud coseno)."""
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Se requiere el parámetro 'q'"}), 400
+    if not embedding_service.available():
+        return jsonify({"error": "La búsqueda semántica no está disponible"}), 503
+
+    try:
+        k = int(request.args.get("k", 10))
+    except ValueError:
+        return jsonify({"error": "'k' debe ser un número entero"}), 400
+    if not 1 <= k <= Config.SEMANTIC_SEARCH_MAX_K:
+        return jsonify({"error": f"'k' debe estar entre 1 y {Config.SEMANTIC_SEARCH_MAX_K}"}), 400
+    approximate = request.args.get("approximate", "true").lower() == "true"
+
+    owner_id = request.user["_id"]
+    try:
+        # El embedding de la consulta lo calcula el indexador: la API no carga el modelo
+        hits = embedding_service.request_search(owner_id, query, k, approximate)
+    except TimeoutError as e:
+        current_app.logger.error(f"El indexador semántico no responde: {e}")
+        return jsonify({"error": "La búsqueda semántica no está disponible"}), 503
+    except Exception as e:
+        current_app.logger.error(f"Error en la búsqueda semántica: {e}")
+        return jsonify({"error": "No se pudo completar la búsqueda"}), 500
+
+    # Solo audios que siguen existiendo y son del usuario
+    audio_ids = list({hit["audio_id"] for hit in hits})
+    filenames = {doc["_id"]: doc.get("filename") for doc in db.find_audios_by_ids(audio_ids, owner_id, {"filename": 1})}
+    results = [{
+        "id": hit["audio_id"],
+        "filename": filenames[hit["audio_id"]],
+        "score": hit["score"],
+        "text": hit["text"],
+        "start": hit["start"],
+        "end": hit["end"]
+    } for hit in hits if hit["audio_id"] in filenames]
+
+    return jsonify({"query": query, "results": results}), 200
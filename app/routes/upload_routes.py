@@ -1,18 +1,67 @@
 import os
 import io
 import uuid
+import zipfile
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from flask import request, jsonify, current_app
 from config import Config
 from app.routes import api
 from app import db
-from app.services import storage_service
+from app.services import storage_service, admission_service
 from app.utils.jwt_utils import jwt_required
-from rabbitmq.emisor import send_audio_task
+from rabbitmq.emisor import send_audio_task, send_audio_tasks
 
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def admission_rejected(error: admission_service.Rejected):
+    response = jsonify({"error": str(error), "retry_after": error.retry_after})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, error.status
+
+def parse_deadline() -> int | None:
+    """Lee el campo ``deadline`` (segundos desde la subida). Lanza ``ValueError`` si no es válido."""
+    raw = request.form.get("deadline")
+    if not raw:
+        return None
+    deadline = int(raw)
+    if deadline <= 0:
+        raise ValueError("El plazo debe ser un número positivo de segundos")
+    return deadline
+
+def build_audio_metadata(file_id: str, filename: str, content_type: str, object_name: str, size: int,
+                         output_format: str, generate_llm_output_flag: bool, owner_id: str,
+                         word_timestamps: bool = False, deadline_seconds: int = None,
+                         two_pass: bool = False) -> dict:
+    """Documento inicial de un audio recién subido."""
+    now = datetime.datetime.utcnow()
+    deadline_at = now + datetime.timedelta(seconds=deadline_seconds) if deadline_seconds else None
+    return {
+        "_id": file_id,
+        "filename": filename,
+        "content_type": content_type,
+        "bucket": Config.MINIO_BUCKET,
+        "object_name": object_name,
+        "size": size,
+        "upload_time": now,
+        "updated_at": now,
+        "version": 1,
+        "transcription": None,
+        "status": "processing",
+        "output_format": output_format,
+        "owner_id": owner_id,
+        "generate_llm_output": generate_llm_output_flag,
+        "word_timestamps": word_timestamps,
+        "deadline_at": deadline_at,
+        "two_pass": two_pass,
+        "draft_ready": False,
+        "output_text": None,
+        "language": "unknown",
+        "model_used": None,
+        "duration": None
+    }
+
 @api.route('/api/upload', methods=['POST'])
 @jwt_required
 def upload_audio():
@@ -29,9 +78,20 @@ def upload_audio():
     mode = request.form.get("mode") or "auto"
     output_format = request.form.get("format") or "text"
     generate_llm_output_flag = request.form.get("generate_llm_output", "false").lower() == "true"
+    word_timestamps = request.form.get("word_timestamps", str(Config.WORD_TIMESTAMPS)).lower() == "true"
+    two_pass = request.form.get("two_pass", str(Config.TWO_PASS_DEFAULT)).lower() == "true"
 
     if output_format not in Config.ALLOWED_FORMATS:
         return jsonify({"error": "Formato de salida no válido"}), 400
+    try:
+        deadline_seconds = parse_deadline()
+    except ValueError:
+        return jsonify({"error": "El plazo ('deadline') debe ser un número positivo de segundos"}), 400
+
+    try:
+        mode = admission_service.admit(request.user["_id"], mode)
+    except admission_service.Rejected as e:
+        return admission_rejected(e)
 
     file_id = str(uuid.uuid4())
     ext = os.path.splitext(file.filename)[1]
@@ -43,31 +103,20 @@ def upload_audio():
         storage_service.save_file(io.BytesIO(data), object_name)
     except Exception as e:
         current_app.logger.error(f"Error guardando archivo en MinIO: {e}")
+        admission_service.refund_tokens(request.user["_id"])
         return jsonify({"error": "Error al guardar el archivo en almacenamiento"}), 500
 
-    metadata = {
-        "_id": file_id,
-        "filename": file.filename,
-        "content_type": file.mimetype,
-        "bucket": Config.MINIO_BUCKET,
-        "object_name": object_name,
-        "size": len(data),
-        "upload_time": datetime.datetime.utcnow(),
-        "transcription": None,
-        "status": "processing",
-        "output_format": output_format,
-        "owner_id": request.user["_id"],
-        "generate_llm_output": generate_llm_output_flag,
-        "output_text": None,
-        "language": "unknown",
-        "model_used": None,
-        "duration": None
-    }
+    metadata = build_audio_metadata(
+        file_id, file.filename, file.mimetype, object_name, len(data),
+        output_format, generate_llm_output_flag, request.user["_id"], word_timestamps, deadline_seconds,
+        two_pass
+    )
 
     try:
         db.save_audio_metadata(metadata)
     except Exception as e:
         current_app.logger.error(f"Error guardando metadatos en MongoDB: {e}")
+        admission_service.refund_tokens(request.user["_id"])
         return jsonify({"error": "Error al guardar metadatos en la base de datos"}), 500
 
     try:
@@ -75,18 +124,197 @@ def upload_audio():
             "audio_id": file_id,
             "object_name": object_name,
             "output_format": output_format,
-            "mode": mode
+            "mode": mode,
+            "owner_id": request.user["_id"],
+            "size": len(data),
+            "pass": "draft" if two_pass else None
         })
     except Exception as e:
         current_app.logger.error(f"Error al enviar mensaje a RabbitMQ: {e}")
+        admission_service.refund_tokens(request.user["_id"])
         return jsonify({"error": "No se pudo enviar la tarea de transcripción"}), 500
 
     return jsonify({
         "message": "Audio recibido. Procesamiento encolado.",
         "id": file_id,
-        "status": "processing"
+        "status": "processing",
+        "mode": mode
+    }), 202
+
+def _stream_size(stream) -> int:
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+def _collect_batch_entries(rejected: list) -> list[dict]:
+    """Reúne los audios de ``files`` y de los zip de ``archive`` sin leerlos en memoria."""
+    entries = []
+    for file in request.files.getlist('files'):
+        if not file.filename:
+            continue
+        if not allowed_file(file.filename):
+            rejected.append({"filename": file.filename, "error": "Tipo de archivo no soportado"})
+            continue
+        entries.append({
+            "filename": file.filename,
+            "content_type": file.mimetype,
+            "size": _stream_size(file.stream),
+            "open": lambda file=file: file.stream
+        })
+
+    for archive in request.files.getlist('archive'):
+        try:
+            zf = zipfile.ZipFile(archive.stream)
+        except zipfile.BadZipFile:
+            rejected.append({"filename": archive.filename, "error": "Archivo zip no válido"})
+            continue
+
+        members = [info for info in zf.infolist() if not info.is_dir()]
+        if sum(info.file_size for info in members) > Config.BATCH_MAX_UNCOMPRESSED_BYTES:
+            rejected.append({"filename": archive.filename, "error": "El zip supera el tamaño máximo descomprimido"})
+            continue
+
+        for info in members:
+            name = os.path.basename(info.filename)
+            if not name or name.startswith('.'):
+                continue
+            if not allowed_file(name):
+                rejected.append({"filename": info.filename, "error": "Tipo de archivo no soportado"})
+                continue
+            entries.append({
+                "filename": name,
+                "content_type": "application/octet-stream",
+                "size": info.file_size,
+                "open": lambda zf=zf, info=info: zf.open(info)
+            })
+    return entries
+
+@api.route('/api/upload/batch', methods=['POST'])
+@jwt_required
+def upload_audio_batch():
+    """Sube varios audios (``files`` múltiples y/o ``archive`` zip) como un único lote."""
+    mode = request.form.get("mode") or "auto"
+    output_format = request.form.get("format") or "text"
+    generate_llm_output_flag = request.form.get("generate_llm_output", "false").lower() == "true"
+    word_timestamps = request.form.get("word_timestamps", str(Config.WORD_TIMESTAMPS)).lower() == "true"
+    two_pass = request.form.get("two_pass", str(Config.TWO_PASS_DEFAULT)).lower() == "true"
+
+    if output_format not in Config.ALLOWED_FORMATS:
+        return jsonify({"error": "Formato de salida no válido"}), 400
+    try:
+        deadline_seconds = parse_deadline()
+    except ValueError:
+        return jsonify({"error": "El plazo ('deadline') debe ser un número positivo de segundos"}), 400
+
+    rejected = []
+    entries = _collect_batch_entries(rejected)
+    if not entries:
+        return jsonify({"error": "No se encontraron archivos válidos en la petición", "rejected": rejected}), 400
+    if len(entries) > Config.BATCH_MAX_FILES:
+        return jsonify({"error": f"Máximo {Config.BATCH_MAX_FILES} archivos por lote"}), 400
+
+    try:
+        mode = admission_service.admit(request.user["_id"], mode, len(entries))
+    except admission_service.Rejected as e:
+        return admission_rejected(e)
+
+    batch_id = str(uuid.uuid4())
+    owner_id = request.user["_id"]
+    for entry in entries:
+        entry["id"] = str(uuid.uuid4())
+        entry["object_name"] = f"{entry['id']}{os.path.splitext(entry['filename'])[1]}"
+
+    def upload(entry):
+        with entry["open"]() as stream:
+            storage_service.save_stream(stream, entry["object_name"], entry["size"], entry["content_type"])
+
+    stored = []
+    with ThreadPoolExecutor(max_workers=Config.BATCH_UPLOAD_CONCURRENCY) as executor:
+        for entry, future in [(entry, executor.submit(upload, entry)) for entry in entries]:
+            try:
+                future.result()
+                stored.append(entry)
+            except Exception as e:
+                current_app.logger.error(f"Error guardando {entry['filename']} del lote {batch_id} en MinIO: {e}")
+                rejected.append({"filename": entry["filename"], "error": "Error al guardar el archivo en almacenamiento"})
+
+    # Solo se cobran los archivos que llegaron a guardarse
+    admission_service.refund_tokens(owner_id, len(entries) - len(stored))
+    if not stored:
+        return jsonify({"error": "No se pudo guardar ningún archivo del lote", "rejected": rejected}), 500
+
+    documents = []
+    for entry in stored:
+        metadata = build_audio_metadata(
+            entry["id"], entry["filename"], entry["content_type"], entry["object_name"], entry["size"],
+            output_format, generate_llm_output_flag, owner_id, word_timestamps, deadline_seconds,
+            two_pass
+        )
+        metadata["batch_id"] = batch_id
+        documents.append(metadata)
+    audio_ids = [doc["_id"] for doc in documents]
+
+    try:
+        db.save_audio_metadata_many(documents)
+        db.save_batch({
+            "_id": batch_id,
+            "owner_id": owner_id,
+            "audio_ids": audio_ids,
+            "total": len(audio_ids),
+            "created_at": datetime.datetime.utcnow()
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error guardando metadatos del lote {batch_id} en MongoDB: {e}")
+        admission_service.refund_tokens(owner_id, len(stored))
+        return jsonify({"error": "Error al guardar metadatos en la base de datos"}), 500
+
+    try:
+        send_audio_tasks([{
+            "audio_id": doc["_id"],
+            "object_name": doc["object_name"],
+            "output_format": output_format,
+            "mode": mode,
+            "owner_id": owner_id,
+            "size": doc["size"],
+            "pass": "draft" if two_pass else None
+        } for doc in documents])
+    except Exception as e:
+        current_app.logger.error(f"Error al enviar el lote {batch_id} a RabbitMQ: {e}")
+        db.update_audios_status(audio_ids, "failed", "No se pudo encolar la tarea de transcripción")
+        admission_service.refund_tokens(owner_id, len(stored))
+        return jsonify({"error": "No se pudo enviar la tarea de transcripción", "batch_id": batch_id}), 500
+
+    return jsonify({
+        "message": "Lote recibido. Procesamiento encolado.",
+        "batch_id": batch_id,
+        "status": "processing",
+        "mode": mode,
+        "accepted": [{"id": doc["_id"], "filename": doc["filename"]} for doc in documents],
+        "rejected": rejected
     }), 202
 
+@api.route('/api/batch/<batch_id>', methods=['GET'])
+@jwt_required
+def get_batch_status(batch_id):
+    batch = db.find_batch_by_id(batch_id)
+    if not batch:
+        return jsonify({"error": "Lote no encontrado"}), 404
+
+    if batch.get("owner_id") != request.user["_id"]:
+        return jsonify({"error": "Acceso no autorizado"}), 403
+
+    counts = db.count_batch_statuses(batch_id, request.user["_id"])
+    pending = sum(count for status, count in counts.items() if status not in ("completed", "failed", "cancelled"))
+    return jsonify({
+        "batch_id": batch_id,
+        "total": batch.get("total", len(batch.get("audio_ids", []))),
+        "created_at": batch.get("created_at"),
+        "status": "processing" if pending else "completed",
+        "counts": counts,
+        "audio_ids": batch.get("audio_ids", [])
+    }), 200
+
 @api.route('/api/prueba', methods=['POST'])
 def prueba_rabbit():
     if 'file' not in request.files:
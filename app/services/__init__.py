@@ -2,4 +2,6 @@ from flask import Blueprint
 
 api = Blueprint("api", __name__)
 
-from app.services import rabbitmq_service, storage_service, whisper_service 
+# whisper_service y feature_cache son exclusivos del worker y se importan explícitamente
+# allí: importarlos aquí cargaría torch en cada proceso de la API.
+from app.services import rabbitmq_service, storage_service, metrics_service, hashing_service, transcode_service, search_service, embedding_service, job_service, scheduler_service, admission_service, model_selection_service, cpu_service
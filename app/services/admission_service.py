@@ -0,0 +1,150 @@
+import math
+import time
+import logging
+import datetime
+import threading
+
+from config import Config
+from app.services import metrics_service, rabbitmq_service, job_service
+
+logger = logging.getLogger(__name__)
+
+# Control de admisión de /api/upload.
+#
+# La espera de un trabajo nuevo se estima como trabajos pendientes / throughput
+# reciente (audios completados en ADMISSION_THROUGHPUT_WINDOW). Por encima de
+# ADMISSION_SLA_SECONDS el modo "auto" pasa a un modelo más rápido y por encima
+# de ADMISSION_MAX_WAIT_SECONDS la subida se rechaza con 503 y Retry-After.
+# Aparte, cada usuario tiene un token bucket en MongoDB (429 al agotarlo).
+
+_estimate = None
+_estimate_at = 0.0
+_estimate_lock = threading.Lock()
+
+
+class Rejected(Exception):
+    """Subida no admitida; ``status`` es 429 o 503 y ``retry_after`` los segundos a esperar."""
+
+    def __init__(self, message: str, status: int, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _backlog() -> int:
+    """Trabajos por delante de uno nuevo.
+
+    Suma la cola principal, la de refinados y las de reintento: todos acaban
+    ocupando a los workers. Con el planificador activo la cola de entrada no
+    sirve: confirma cada mensaje al retenerlo y sus colas virtuales viven en
+    MongoDB, donde se cuentan los audios aún no despachados.
+    """
+    from app import db
+
+    depth = sum(rabbitmq_service.get_queue_depth(queue, missing_ok=True) for queue in job_service.pending_queues())
+    if Config.SCHEDULER_ENABLED:
+        depth += db.count_unscheduled_audios()
+    return depth
+
+
+def _throughput() -> float:
+    """Trabajos completados por segundo en la ventana reciente (con un mínimo)."""
+    from app import db
+
+    window = Config.ADMISSION_THROUGHPUT_WINDOW
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=window)
+    completed = db.count_completed_since(since)
+    return max(completed / window, Config.ADMISSION_MIN_THROUGHPUT / 60)
+
+
+def estimated_wait() -> float | None:
+    """Segundos que esperaría en cola un trabajo encolado ahora; ``None`` si no se pudo estimar.
+
+    Se cachea ``ADMISSION_CACHE_SECONDS`` por proceso para no consultar RabbitMQ
+    y MongoDB en cada subida, también cuando falla: con RabbitMQ caído cada
+    subida no debe esperar a su propio timeout. Las consultas se hacen fuera del
+    lock; si dos hilos refrescan a la vez, gana el último.
+    """
+    global _estimate, _estimate_at
+    with _estimate_lock:
+        if _estimate_at and time.monotonic() - _estimate_at <= Config.ADMISSION_CACHE_SECONDS:
+            return _estimate
+
+    try:
+        estimate = _backlog() / _throughput()
+    except Exception as e:
+        logger.warning(f"No se pudo estimar la espera en cola: {e}")
+        estimate = None
+    else:
+        metrics_service.estimated_wait.set(estimate)
+
+    with _estimate_lock:
+        _estimate, _estimate_at = estimate, time.monotonic()
+    return estimate
+
+
+def take_tokens(owner_id: str, cost: int = 1):
+    """Descuenta ``cost`` subidas del token bucket del usuario o lanza ``Rejected`` (429).
+
+    Un lote mayor que la ráfaga nunca cabría en el bucket: se admite solo con el
+    bucket lleno y se cobra entero, dejándolo en negativo hasta que se recupere.
+    """
+    from app import db
+
+    rate = Config.RATE_LIMIT_UPLOADS_PER_MINUTE / 60
+    if rate <= 0:
+        return
+    burst = Config.RATE_LIMIT_BURST
+    required = min(cost, burst)
+    bucket = db.take_rate_limit_tokens(f"upload:{owner_id}", cost, rate, burst, required)
+    if not bucket["allowed"]:
+        metrics_service.uploads_rejected.labels("rate_limited").inc()
+        retry_after = math.ceil((required - bucket["tokens"]) / rate)
+        raise Rejected("Demasiadas subidas; espera antes de volver a intentarlo", 429, max(retry_after, 1))
+
+
+def refund_tokens(owner_id: str, cost: int = 1):
+    """Devuelve al bucket las subidas cobradas en ``admit`` que luego fallaron al guardarse o encolarse.
+
+    Un fallo propio (MinIO, MongoDB o RabbitMQ) no debe gastar el cupo del usuario
+    que reintenta. Si no se puede devolver se registra y se sigue.
+    """
+    from app import db
+
+    if not Config.ADMISSION_ENABLED or cost <= 0 or Config.RATE_LIMIT_UPLOADS_PER_MINUTE <= 0:
+        return
+    try:
+        db.refund_rate_limit_tokens(f"upload:{owner_id}", cost, Config.RATE_LIMIT_BURST)
+    except Exception as e:
+        logger.warning(f"No se pudieron devolver {cost} subidas al límite de {owner_id}: {e}")
+
+
+def admit(owner_id: str, mode: str, cost: int = 1) -> str:
+    """Aplica el límite por usuario y la contrapresión de la cola. Devuelve el modo a usar.
+
+    Si no se puede estimar la cola (RabbitMQ o MongoDB caídos) la subida se admite
+    tal cual: el control de admisión no debe convertirse en un punto de fallo.
+    """
+    if not Config.ADMISSION_ENABLED:
+        return mode
+
+    # La saturación se comprueba antes de cobrar: un 503 no gasta el cupo del usuario
+    wait = estimated_wait()
+    if wait is not None and wait > Config.ADMISSION_MAX_WAIT_SECONDS:
+        metrics_service.uploads_rejected.labels("overloaded").inc()
+        retry_after = math.ceil(wait - Config.ADMISSION_MAX_WAIT_SECONDS)
+        raise Rejected("Sistema saturado; vuelve a intentarlo más tarde", 503, max(retry_after, 1))
+
+    try:
+        take_tokens(owner_id, cost)
+    except Rejected:
+        raise
+    except Exception as e:
+        logger.warning(f"Límite por usuario no disponible, se admite la subida: {e}")
+
+    if wait is None:
+        return mode
+    if mode == "auto" and wait > Config.ADMISSION_SLA_SECONDS:
+        metrics_service.uploads_degraded.inc()
+        return Config.ADMISSION_DEGRADED_MODE
+    return mode
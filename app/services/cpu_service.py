@@ -0,0 +1,138 @@
+import os
+import sys
+import math
+import logging
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Reparto de CPU entre procesos de transcripción en un mismo host.
+#
+# PyTorch usa por defecto un hilo intra-op por núcleo visible, sin tener en
+# cuenta los límites del contenedor (cgroup) ni que haya otros workers en la
+# misma máquina: con N procesos se lanzan N × núcleos hilos que compiten entre
+# sí. Aquí se calcula cuántos núcleos hay de verdad, se reparten entre
+# WORKER_PROCESSES y cada proceso fija sus hilos (y opcionalmente su afinidad)
+# antes de importar torch.
+#
+# Las variables OMP_NUM_THREADS y compañía solo se leen al cargar cada
+# biblioteca, y numpy ya está cargado al importar app.services. Por eso sus
+# pools (OpenBLAS, MKL, OpenMP) se limitan además en caliente con threadpoolctl.
+
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# Reparto fijado para este proceso por configure_process
+_layout = None
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit() -> float | None:
+    """Núcleos permitidos por la cuota CFS del cgroup (v2 o v1); ``None`` si no hay límite."""
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") or _read("/sys/fs/cgroup/cpu,cpuacct/cpu.cfs_quota_us")
+    period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us") or _read("/sys/fs/cgroup/cpu,cpuacct/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def allowed_cpus() -> list[int]:
+    """CPUs en las que puede ejecutarse el proceso (afinidad heredada, cpuset)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_cpus() -> int:
+    """Núcleos utilizables: el mínimo entre la afinidad y la cuota del cgroup."""
+    cpus = len(allowed_cpus())
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.floor(limit)))
+    return max(1, cpus)
+
+
+def plan(processes: int = None, threads: int = None, cpus: int = None) -> dict:
+    """Reparto de procesos × hilos intra-op. 0 o ``None`` = automático.
+
+    Por defecto un proceso con todos los núcleos; si se fijan los procesos, los
+    núcleos se dividen a partes iguales entre ellos.
+    """
+    cpus = cpus or available_cpus()
+    processes = processes if processes is not None else Config.WORKER_PROCESSES
+    threads = threads if threads is not None else Config.TORCH_THREADS
+    if not processes:
+        processes = max(1, cpus // threads) if threads else 1
+    if not threads:
+        threads = max(1, cpus // processes)
+    return {
+        "cpus": cpus,
+        "processes": processes,
+        "threads": threads,
+        "interop_threads": Config.TORCH_INTEROP_THREADS or 1,
+        "oversubscribed": processes * threads > cpus,
+    }
+
+
+def cpus_for(index: int, layout: dict) -> list[int]:
+    """Bloque contiguo de CPUs del proceso ``index`` (se reparte en círculo si no hay suficientes)."""
+    cpus = allowed_cpus()
+    threads = layout["threads"]
+    start = (index * threads) % len(cpus)
+    return [cpus[(start + i) % len(cpus)] for i in range(min(threads, len(cpus)))]
+
+
+def _limit_loaded_threadpools(threads: int):
+    """Limita los pools de hilos de las bibliotecas nativas ya cargadas (BLAS de numpy, OpenMP)."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        logger.warning("threadpoolctl no está instalado: los pools de hilos ya cargados no se limitan")
+        return
+    threadpool_limits(limits=threads)
+
+
+def configure_process(index: int, layout: dict, pin: bool = None):
+    """Fija hilos (y afinidad, si se pide) del proceso ``index``. Debe llamarse antes de importar torch."""
+    global _layout
+    _layout = layout
+    threads = str(layout["threads"])
+    for name in _THREAD_ENV_VARS:
+        os.environ[name] = threads
+    _limit_loaded_threadpools(layout["threads"])
+
+    pin = Config.WORKER_CPU_AFFINITY if pin is None else pin
+    if pin and hasattr(os, "sched_setaffinity"):
+        cpus = cpus_for(index, layout)
+        os.sched_setaffinity(0, cpus)
+        logger.info(f"Proceso {index} fijado a las CPUs {cpus}")
+
+    if "torch" in sys.modules:
+        apply_torch_threads(layout)
+
+
+def apply_torch_threads(layout: dict = None):
+    """Aplica los hilos intra/inter-op a torch recién importado."""
+    import torch
+
+    layout = layout or _layout or plan()
+    torch.set_num_threads(layout["threads"])
+    try:
+        # Solo se puede fijar antes del primer trabajo paralelo inter-op
+        torch.set_num_interop_threads(layout["interop_threads"])
+    except RuntimeError:
+        pass
@@ -0,0 +1,325 @@
+import os
+import re
+import json
+import fcntl
+import importlib
+import importlib.util
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+
+from config import Config
+from app.services import rabbitmq_service
+
+# Índice semántico por usuario en disco, en ficheros append-only que se mapean en memoria:
+#   manifest.json  dimensión de los vectores
+#   rows.jsonl     metadatos de cada fila (audio, tiempos y texto del fragmento)
+#   vectors.bin    vectores normalizados en EMBEDDING_DTYPE
+#   codes.bin      firmas binarias por proyección aleatoria (búsqueda aproximada)
+#   dead.bin       1 byte por fila; 1 = borrada (audio eliminado o re-indexado)
+# Solo el indexador (rabbitmq/indexador.py) carga el modelo y abre el índice: los
+# workers le envían las transcripciones terminadas, la API le pide las búsquedas
+# por RPC y así ni la API carga torch ni hace falta compartir el directorio.
+
+_model = None
+_model_lock = threading.Lock()
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_planes = {}
+
+# Número de bits a 1 de cada byte, para la distancia de Hamming vectorizada
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+_SCORE_BLOCK_ROWS = 8192
+
+
+@lru_cache(maxsize=1)
+def installed() -> bool:
+    # Solo se comprueba que el paquete existe: importarlo cargaría torch al arrancar
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+def available() -> bool:
+    """Búsqueda semántica activada; el modelo solo lo necesita el indexador."""
+    return Config.EMBEDDING_ENABLED
+
+
+def get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            try:
+                sentence_transformers = importlib.import_module("sentence_transformers")
+            except ImportError:
+                raise RuntimeError("sentence-transformers no está instalado")
+            _model = sentence_transformers.SentenceTransformer(Config.EMBEDDING_MODEL, device="cpu")
+        return _model
+
+
+def embed(texts: list[str]) -> np.ndarray:
+    """Vectores L2-normalizados (el producto escalar es la similitud coseno)."""
+    vectors = get_model().encode(
+        texts, batch_size=Config.EMBEDDING_BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _hyperplanes(dim: int) -> np.ndarray:
+    """Hiperplanos aleatorios fijos (semilla constante) para las firmas de la búsqueda aproximada."""
+    if dim not in _planes:
+        rng = np.random.default_rng(Config.EMBEDDING_ANN_SEED)
+        _planes[dim] = rng.standard_normal((dim, Config.EMBEDDING_ANN_BITS)).astype(np.float32)
+    return _planes[dim]
+
+
+def signatures(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(vectors @ _hyperplanes(vectors.shape[-1]) > 0, axis=-1)
+
+
+def chunk_transcript(segments: dict | None, transcription: str | None) -> list[dict]:
+    """Agrupa segmentos consecutivos en fragmentos de ~``EMBEDDING_CHUNK_CHARS`` caracteres."""
+    max_chars = Config.EMBEDDING_CHUNK_CHARS
+    chunks = []
+    if segments and segments.get("text"):
+        text, offsets = segments["text"], segments["offsets"]
+        count = len(segments["start"])
+        first = 0
+        for i in range(count):
+            if offsets[i + 1] - offsets[first] >= max_chars or i == count - 1:
+                chunks.append({
+                    "text": text[offsets[first]:offsets[i + 1]].strip(),
+                    "start": segments["start"][first] / 1000,
+                    "end": segments["end"][i] / 1000,
+                })
+                first = i + 1
+    elif transcription:
+        # Sin segmentos (audios antiguos) se corta por frases sin tiempos
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", transcription):
+            if current and len(current) + len(sentence) > max_chars:
+                chunks.append({"text": current.strip(), "start": None, "end": None})
+                current = ""
+            current += sentence + " "
+        chunks.append({"text": current.strip(), "start": None, "end": None})
+    return [chunk for chunk in chunks if chunk["text"]]
+
+
+class UserIndex:
+    """Índice de vectores de un usuario respaldado por ficheros mapeados en memoria."""
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self.dtype = np.dtype(Config.EMBEDDING_DTYPE)
+        self.row_bytes = dim * self.dtype.itemsize
+        self.code_bytes = Config.EMBEDDING_ANN_BITS // 8
+        self.lock = threading.Lock()
+        self.rows = []
+        self._rows_offset = 0
+        self.size = 0
+        self.vectors = None
+        self.codes = None
+        self.dead = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusión entre procesos (varios workers pueden indexar audios del mismo usuario)."""
+        with open(self._path(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rows_on_disk(self, name: str, row_bytes: int) -> int:
+        try:
+            return os.path.getsize(self._path(name)) // row_bytes
+        except FileNotFoundError:
+            return 0
+
+    def _map(self, name: str, dtype, shape):
+        if shape[0] == 0:
+            return None
+        return np.memmap(self._path(name), dtype=dtype, mode="r", shape=shape)
+
+    def refresh(self):
+        """Vuelve a mapear los ficheros si otro proceso ha añadido filas."""
+        with self.lock:
+            path = self._path("rows.jsonl")
+            if os.path.exists(path) and os.path.getsize(path) > self._rows_offset:
+                with open(path, "rb") as f:
+                    f.seek(self._rows_offset)
+                    for line in f:
+                        # Una línea a medio escribir se leerá en la siguiente actualización
+                        if not line.endswith(b"\n"):
+                            break
+                        self.rows.append(json.loads(line))
+                        self._rows_offset += len(line)
+
+            # vectors.bin se escribe el último, así que limita las filas completas
+            size = min(len(self.rows), self._rows_on_disk("vectors.bin", self.row_bytes),
+                       self._rows_on_disk("dead.bin", 1))
+            if self.code_bytes:
+                size = min(size, self._rows_on_disk("codes.bin", self.code_bytes))
+            if size != self.size or (size and self.vectors is None):
+                self.vectors = self._map("vectors.bin", self.dtype, (size, self.dim))
+                self.dead = self._map("dead.bin", np.uint8, (size,))
+                if self.code_bytes:
+                    self.codes = self._map("codes.bin", np.uint8, (size, self.code_bytes))
+                self.size = size
+
+    def _mark_dead(self, audio_id: str):
+        rows = [i for i, row in enumerate(self.rows[:self.size]) if row["audio_id"] == audio_id]
+        if not rows:
+            return
+        with open(self._path("dead.bin"), "r+b") as f:
+            for i in rows:
+                f.seek(i)
+                f.write(b"\x01")
+
+    def add(self, audio_id: str, chunks: list[dict], vectors: np.ndarray):
+        """Añade los fragmentos de un audio, marcando como borradas sus filas anteriores."""
+        with self._file_lock():
+            self.refresh()
+            self._mark_dead(audio_id)
+            with open(self._path("rows.jsonl"), "ab") as f:
+                for chunk in chunks:
+                    f.write((json.dumps({"audio_id": audio_id, **chunk}, ensure_ascii=False) + "\n").encode())
+            if self.code_bytes:
+                with open(self._path("codes.bin"), "ab") as f:
+                    f.write(signatures(vectors).tobytes())
+            with open(self._path("dead.bin"), "ab") as f:
+                f.write(bytes(len(chunks)))
+            with open(self._path("vectors.bin"), "ab") as f:
+                f.write(vectors.astype(self.dtype).tobytes())
+        self.refresh()
+
+    def remove(self, audio_id: str):
+        with self._file_lock():
+            self.refresh()
+            self._mark_dead(audio_id)
+
+    def _candidates(self, query: np.ndarray, codes, dead, approximate: bool) -> np.ndarray | None:
+        """Filas candidatas por distancia de Hamming entre firmas (``None`` = búsqueda exacta)."""
+        if not (approximate and codes is not None and len(codes) >= Config.EMBEDDING_ANN_MIN_ROWS):
+            return None
+        distances = _POPCOUNT[np.bitwise_xor(codes, signatures(query))].sum(axis=1)
+        distances[dead != 0] = np.iinfo(distances.dtype).max
+        count = min(Config.EMBEDDING_ANN_CANDIDATES, len(codes))
+        return np.argpartition(distances, count - 1)[:count]
+
+    def search(self, query: np.ndarray, k: int, approximate: bool = True) -> list[tuple[dict, float]]:
+        self.refresh()
+        # Copia coherente de los mapas: otro hilo puede volver a mapearlos mientras se busca
+        with self.lock:
+            size, vectors, codes, dead = self.size, self.vectors, self.codes, self.dead
+        if size == 0:
+            return []
+
+        candidates = self._candidates(query, codes, dead, approximate)
+        if candidates is None:
+            # Producto escalar por bloques para no materializar todo el índice en float32
+            scores = np.empty(size, dtype=np.float32)
+            for start in range(0, size, _SCORE_BLOCK_ROWS):
+                block = vectors[start:start + _SCORE_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ query
+            scores[dead != 0] = -np.inf
+            rows = np.arange(size)
+        else:
+            scores = vectors[candidates].astype(np.float32) @ query
+            scores[dead[candidates] != 0] = -np.inf
+            rows = candidates
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.rows[rows[i]], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+def _index_dir(owner_id: str) -> str:
+    model_slug = re.sub(r"[^A-Za-z0-9_.-]", "_", Config.EMBEDDING_MODEL)
+    return os.path.join(Config.EMBEDDING_INDEX_DIR, model_slug, owner_id)
+
+
+def get_index(owner_id: str, dim: int = None) -> UserIndex | None:
+    """Índice abierto del usuario (se crea si se indica ``dim``); LRU de índices abiertos."""
+    with _indexes_lock:
+        index = _indexes.get(owner_id)
+        if index is not None:
+            _indexes.move_to_end(owner_id)
+            return index
+
+        directory = _index_dir(owner_id)
+        manifest_path = os.path.join(directory, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                dim = json.load(f)["dim"]
+        elif dim is None:
+            return None
+        else:
+            os.makedirs(directory, exist_ok=True)
+            with open(manifest_path, "w") as f:
+                json.dump({"dim": dim, "model": Config.EMBEDDING_MODEL}, f)
+
+        index = UserIndex(directory, dim)
+        _indexes[owner_id] = index
+        while len(_indexes) > Config.EMBEDDING_OPEN_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+
+def index_transcript(owner_id: str, audio_id: str, segments: dict | None, transcription: str | None) -> int:
+    """Calcula y guarda los embeddings de los fragmentos de una transcripción. Devuelve cuántos."""
+    chunks = chunk_transcript(segments, transcription)
+    if not chunks:
+        return 0
+    vectors = embed([chunk["text"] for chunk in chunks])
+    get_index(owner_id, vectors.shape[1]).add(audio_id, chunks, vectors)
+    return len(chunks)
+
+
+def remove_audio(owner_id: str, audio_id: str):
+    index = get_index(owner_id)
+    if index is not None:
+        index.remove(audio_id)
+
+
+def search(owner_id: str, query: str, k: int, approximate: bool = True) -> list[dict]:
+    """Fragmentos más similares a ``query`` entre los audios del usuario."""
+    index = get_index(owner_id)
+    if index is None:
+        return []
+    query_vector = embed([query])[0]
+    return [{**row, "score": round(score, 4)} for row, score in index.search(query_vector, k, approximate)]
+
+
+# === Cliente del indexador (API y workers) ===
+
+def request_index(owner_id: str, audio_id: str, segments: dict | None, transcription: str | None):
+    """Encola la indexación de una transcripción terminada."""
+    message = {"action": "index", "owner_id": owner_id, "audio_id": audio_id,
+               "segments": segments, "transcription": transcription}
+    rabbitmq_service.publish_message(json.dumps(message, ensure_ascii=False), Config.EMBEDDING_QUEUE)
+
+
+def request_remove(owner_id: str, audio_id: str):
+    """Encola el borrado de las filas de un audio."""
+    message = {"action": "remove", "owner_id": owner_id, "audio_id": audio_id}
+    rabbitmq_service.publish_message(json.dumps(message), Config.EMBEDDING_QUEUE)
+
+
+def request_search(owner_id: str, query: str, k: int, approximate: bool = True) -> list[dict]:
+    """``search`` ejecutado por el indexador; lanza ``TimeoutError`` si no responde a tiempo."""
+    message = {"owner_id": owner_id, "query": query, "k": k, "approximate": approximate}
+    body = rabbitmq_service.call(json.dumps(message, ensure_ascii=False), Config.EMBEDDING_QUERY_QUEUE,
+                                 Config.EMBEDDING_QUERY_TIMEOUT)
+    reply = json.loads(body)
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    return reply["results"]
@@ -0,0 +1,197 @@
+import io
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+
+import numpy as np
+
+from config import Config
+from app.services import metrics_service
+
+logger = logging.getLogger(__name__)
+
+# Caché de espectrogramas log-mel ya calculados, indexada por hash del contenido del
+# audio y por la configuración del mel. Una re-transcripción con otro modelo o modo
+# reutiliza el mel y se salta la decodificación con ffmpeg y la STFT.
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def content_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(audio_hash: str, mel_config: dict) -> str:
+    # El dtype forma parte de la clave: cambiarlo no debe servir entradas de otra precisión
+    mel_config = {**mel_config, "dtype": Config.FEATURE_CACHE_DTYPE}
+    config = ",".join(f"{k}={mel_config[k]}" for k in sorted(mel_config))
+    return hashlib.sha256(f"{audio_hash}|{config}".encode()).hexdigest()
+
+
+def _serialize(mel: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, mel=mel.astype(Config.FEATURE_CACHE_DTYPE))
+    return buffer.getvalue()
+
+
+def _deserialize(data: bytes) -> np.ndarray:
+    with np.load(io.BytesIO(data)) as npz:
+        return npz["mel"].astype(np.float32)
+
+
+class DiskStore:
+    """Ficheros .npz en disco local; el mtime hace de marca de último acceso para el LRU."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, key: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".npz"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    metrics_service.feature_cache_evictions.inc()
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+class MinioStore:
+    """Objetos en MinIO compartidos por todos los workers.
+
+    El orden LRU se lleva en la colección ``feature_cache`` de Mongo, porque
+    MinIO no registra la fecha de último acceso.
+    """
+
+    def __init__(self, prefix: str, max_bytes: int):
+        self.prefix = prefix.rstrip("/")
+        self.max_bytes = max_bytes
+
+    def _object_name(self, key: str) -> str:
+        return f"{self.prefix}/{key}.npz"
+
+    def get(self, key: str) -> bytes | None:
+        from app import db
+        from app.services import storage_service
+
+        if not db.touch_feature_cache_entry(key):
+            return None
+        try:
+            obj = storage_service.open_range(self._object_name(key))
+        except Exception:
+            db.delete_feature_cache_entries([key])
+            return None
+        try:
+            return obj.read()
+        finally:
+            obj.close()
+            obj.release_conn()
+
+    def put(self, key: str, data: bytes):
+        from app import db
+        from app.services import storage_service
+
+        storage_service.save_stream(io.BytesIO(data), self._object_name(key), len(data))
+        db.upsert_feature_cache_entry(key, len(data))
+        self.evict()
+
+    def evict(self):
+        from app import db
+        from app.services import storage_service
+
+        excess = db.feature_cache_total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = []
+        for entry in db.oldest_feature_cache_entries():
+            if excess <= 0:
+                break
+            try:
+                storage_service.delete_file(self._object_name(entry["_id"]))
+            except Exception:
+                pass
+            evicted.append(entry["_id"])
+            excess -= entry["size"]
+        db.delete_feature_cache_entries(evicted)
+        metrics_service.feature_cache_evictions.inc(len(evicted))
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if Config.FEATURE_CACHE_BACKEND == "minio":
+                _store = MinioStore(Config.FEATURE_CACHE_PREFIX, Config.FEATURE_CACHE_MAX_BYTES)
+            else:
+                _store = DiskStore(Config.FEATURE_CACHE_DIR, Config.FEATURE_CACHE_MAX_BYTES)
+        return _store
+
+
+def get_or_compute(audio_path: str, mel_config: dict, compute) -> np.ndarray:
+    """Devuelve el log-mel del audio desde la caché o lo calcula con ``compute()`` y lo guarda."""
+    if not Config.FEATURE_CACHE_ENABLED:
+        return compute()
+
+    key = cache_key(content_hash(audio_path), mel_config)
+    store = get_store()
+    try:
+        data = store.get(key)
+    except Exception as e:
+        logger.warning(f"No se pudo leer la caché de features: {e}")
+        data = None
+    if data is not None:
+        metrics_service.feature_cache_requests.labels("hit").inc()
+        return _deserialize(data)
+
+    metrics_service.feature_cache_requests.labels("miss").inc()
+    # Con la misma precisión que un acierto, para que el resultado no dependa de la caché
+    mel = compute().astype(Config.FEATURE_CACHE_DTYPE).astype(np.float32)
+    try:
+        store.put(key, _serialize(mel))
+    except Exception as e:
+        # La caché es una optimización: un fallo al guardar no debe romper el trabajo
+        logger.warning(f"No se pudo guardar en la caché de features: {e}")
+    return mel
@@ -0,0 +1,85 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+from app.services import metrics_service
+
+# hashlib.pbkdf2_hmac y hashlib.scrypt liberan el GIL, así que un pool de hilos
+# pequeño acota la CPU dedicada a contraseñas sin bloquear al resto de peticiones.
+_executor = None
+_slots = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class HashingBusyError(RuntimeError):
+    """El pool de hashing está saturado y la petición no pudo encolarse a tiempo."""
+
+
+def _get_executor():
+    global _executor, _slots, _executor_pid
+    with _executor_lock:
+        # Los hilos no sobreviven a fork(): cada worker de gunicorn crea su propio pool
+        if _executor is None or _executor_pid != os.getpid():
+            workers = Config.PASSWORD_HASH_WORKERS
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+            _slots = threading.BoundedSemaphore(workers + Config.PASSWORD_HASH_QUEUE_SIZE)
+            _executor_pid = os.getpid()
+        return _executor, _slots
+
+
+def _submit(operation: str, fn, *args, wait: bool = True):
+    """Encola ``fn`` en el pool respetando el límite de peticiones pendientes."""
+    executor, slots = _get_executor()
+    acquired = slots.acquire(timeout=Config.PASSWORD_HASH_QUEUE_TIMEOUT) if wait else slots.acquire(blocking=False)
+    if not acquired:
+        metrics_service.hash_rejected.labels(operation).inc()
+        raise HashingBusyError("Servicio de autenticación saturado, inténtalo de nuevo en unos segundos")
+
+    queued_at = time.perf_counter()
+    metrics_service.hash_queue_depth.inc()
+
+    def run():
+        metrics_service.hash_queue_depth.dec()
+        metrics_service.hash_wait_duration.labels(operation).observe(time.perf_counter() - queued_at)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            metrics_service.hash_duration.labels(operation).observe(time.perf_counter() - start)
+            slots.release()
+
+    future = executor.submit(run)
+    return future.result() if wait else future
+
+
+def hash_password(password: str) -> str:
+    """Genera el hash de una contraseña con los parámetros configurados."""
+    return _submit("hash", generate_password_hash, password, Config.PASSWORD_HASH_METHOD)
+
+
+def check_password(stored_hash: str, password: str) -> bool:
+    """Verifica una contraseña contra su hash en el pool de hashing."""
+    return _submit("verify", check_password_hash, stored_hash, password)
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    """Indica si el hash se generó con parámetros distintos a los configurados."""
+    return stored_hash.split("$", 1)[0] != Config.PASSWORD_HASH_METHOD
+
+
+def rehash_in_background(password: str, callback):
+    """Genera un hash con los parámetros actuales sin esperar y se lo pasa a ``callback``.
+
+    Si el pool está lleno se descarta: el rehash se reintentará en el próximo login.
+    """
+    def rehash():
+        callback(generate_password_hash(password, Config.PASSWORD_HASH_METHOD))
+
+    try:
+        return _submit("rehash", rehash, wait=False)
+    except HashingBusyError:
+        return None
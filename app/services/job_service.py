@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import datetime
+import threading
+
+from config import Config
+from app.services import metrics_service, rabbitmq_service
+
+logger = logging.getLogger(__name__)
+
+# Ciclo de vida de un trabajo de transcripción:
+#   1. El worker reclama un lease (owner + token + expires_at) en el documento del audio.
+#   2. Un hilo lo renueva cada JOB_HEARTBEAT_SECONDS mientras el trabajo corre.
+#   3. Si falla, se reintenta con backoff exponencial a través de una cola de espera
+#      (TTL + dead-letter de vuelta a la cola principal) hasta JOB_MAX_ATTEMPTS.
+#   4. Agotados los intentos, el mensaje va a la cola de dead-letter con su error.
+#   5. El reaper reencola los trabajos cuyo worker murió (lease caducado).
+
+DEAD_LETTER_QUEUE = f"{rabbitmq_service.queue_name}.dead"
+# Refinados de los trabajos en dos pasadas: el worker solo los atiende con la cola principal vacía
+REFINE_QUEUE = f"{rabbitmq_service.queue_name}.refine"
+
+
+# Audios cuyo lease ha reclamado otro worker mientras este proceso seguía con el trabajo
+_lost_leases = set()
+
+
+class JobCancelled(Exception):
+    """El audio se canceló o eliminó mientras el trabajo estaba en cola o en curso."""
+
+
+def check_cancelled(audio_id: str):
+    """Lanza ``JobCancelled`` si el usuario canceló el audio o este worker perdió su lease.
+
+    Se llama entre etapas y tramos y antes de guardar resultados: un worker sin
+    lease no debe escribir encima del trabajo del nuevo dueño.
+    """
+    from app import db
+
+    if audio_id in _lost_leases:
+        raise JobCancelled(f"Trabajo {audio_id} abandonado: otro worker ha reclamado su lease")
+    if db.is_audio_cancelled(audio_id):
+        raise JobCancelled(f"Trabajo {audio_id} cancelado")
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _lease_expiry() -> datetime.datetime:
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=Config.JOB_LEASE_SECONDS)
+
+
+def claim(audio_id: str, job: dict) -> dict | None:
+    """Reclama el trabajo del audio. Devuelve el lease (con ``attempts``) o ``None``."""
+    from app import db
+
+    lease = {"owner": worker_id(), "token": uuid.uuid4().hex, "expires_at": _lease_expiry()}
+    audio_doc = db.claim_audio_lease(audio_id, lease, job)
+    if audio_doc is None:
+        return None
+    return {**lease, "audio_id": audio_id, "attempts": audio_doc.get("attempts", 1)}
+
+
+def release(lease: dict, handled: bool = True):
+    """Libera el lease. Si el fallo no se pudo gestionar (reintento o dead-letter sin
+    publicar), lo deja caducado para que el reaper recupere el trabajo."""
+    from app import db
+
+    if handled:
+        db.release_audio_lease(lease["audio_id"], lease["token"])
+    else:
+        db.expire_audio_lease(lease["audio_id"], lease["token"])
+
+
+class Heartbeat:
+    """Renueva el lease en segundo plano mientras dura el bloque ``with``."""
+
+    def __init__(self, lease: dict):
+        self.lease = lease
+        self.stopped = threading.Event()
+        self.lost = False
+        self.thread = threading.Thread(target=self._run, name=f"lease-{lease['audio_id']}", daemon=True)
+
+    def _run(self):
+        from app import db
+
+        while not self.stopped.wait(Config.JOB_HEARTBEAT_SECONDS):
+            try:
+                if not db.renew_audio_lease(self.lease["audio_id"], self.lease["token"], _lease_expiry()):
+                    # Otro worker lo ha reclamado (p. ej. tras una pausa larga): check_cancelled
+                    # detiene el trabajo antes de su siguiente escritura
+                    self.lost = True
+                    _lost_leases.add(self.lease["audio_id"])
+                    logger.warning(f"Lease perdido para el audio {self.lease['audio_id']}")
+                    return
+            except Exception as e:
+                logger.warning(f"No se pudo renovar el lease del audio {self.lease['audio_id']}: {e}")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        _lost_leases.discard(self.lease["audio_id"])
+
+
+def retry_delay(attempt: int) -> int:
+    """Segundos de espera antes del intento ``attempt + 1`` (backoff exponencial acotado)."""
+    return min(Config.JOB_RETRY_BASE_DELAY * 2 ** (attempt - 1), Config.JOB_RETRY_MAX_DELAY)
+
+
+def job_queue(job: dict) -> str:
+    """Cola de origen del trabajo: la de refinados o la principal."""
+    return REFINE_QUEUE if job.get("pass") == "refine" else rabbitmq_service.queue_name
+
+
+def retry_queue(delay: int, target: str = rabbitmq_service.queue_name) -> tuple[str, dict]:
+    """Cola de espera para ``delay`` segundos: al caducar, RabbitMQ devuelve el mensaje a ``target``."""
+    name = f"{target}.retry.{delay}s"
+    arguments = {
+        "x-message-ttl": delay * 1000,
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": target,
+    }
+    return name, arguments
+
+
+def pending_queues() -> list[str]:
+    """Colas con trabajos que ocupan a los workers: principal, refinados y sus colas de espera.
+
+    Las colas de reintento dependen del retraso, así que se enumeran los de
+    todos los intentos posibles con la configuración actual.
+    """
+    delays = sorted({retry_delay(attempt) for attempt in range(1, Config.JOB_MAX_ATTEMPTS)})
+    queues = []
+    for target in (rabbitmq_service.queue_name, REFINE_QUEUE):
+        queues.append(target)
+        queues.extend(retry_queue(delay, target)[0] for delay in delays)
+    return queues
+
+
+def enqueue_refine(job: dict):
+    """Encola la segunda pasada de un trabajo cuyo borrador ya está guardado."""
+    rabbitmq_service.publish_message(json.dumps({**job, "pass": "refine"}), REFINE_QUEUE)
+
+
+def dead_letter(job: dict, error_message: str, attempts: int = None):
+    """Guarda el mensaje en la cola de dead-letter junto con el motivo."""
+    message = {
+        "job": job,
+        "error": error_message,
+        "attempts": attempts,
+        "worker": worker_id(),
+        "dead_lettered_at": datetime.datetime.utcnow().isoformat() + "Z",
+    }
+    rabbitmq_service.publish_message(json.dumps(message, default=str), DEAD_LETTER_QUEUE)
+    metrics_service.jobs_dead_lettered.inc()
+
+
+def handle_failure(audio_id: str, job: dict, attempts: int, error_message: str) -> str:
+    """Reintenta con backoff o, agotados los intentos, marca el audio como fallido y lo manda a dead-letter."""
+    from app import db
+
+    if attempts < Config.JOB_MAX_ATTEMPTS:
+        delay = retry_delay(attempts)
+        name, arguments = retry_queue(delay, job_queue(job))
+        rabbitmq_service.publish_message(json.dumps(job), name, arguments)
+        db.record_job_error(audio_id, error_message, datetime.datetime.utcnow() + datetime.timedelta(seconds=delay))
+        metrics_service.jobs_retried.inc()
+        logger.warning(f"Intento {attempts} fallido para {audio_id}; reintento en {delay} s: {error_message}")
+        return "retrying"
+
+    db.update_audio_status(audio_id, "failed", error_message, only_if="processing")
+    db.update_audio_metadata(audio_id, {"dead_lettered": True})
+    dead_letter(job, error_message, attempts)
+    logger.error(f"Audio {audio_id} enviado a dead-letter tras {attempts} intentos: {error_message}")
+    return "dead"
+
+
+def reap_expired_leases() -> int:
+    """Reencola (o manda a dead-letter) los trabajos cuyo worker dejó de enviar heartbeats."""
+    from app import db
+
+    reaped = 0
+    for audio_doc in db.find_expired_leases():
+        lease = audio_doc["lease"]
+        if not db.take_expired_lease(audio_doc["_id"], lease["token"]):
+            continue
+        job = audio_doc["job"]
+        error_message = f"El worker {lease.get('owner')} dejó de renovar el lease"
+        try:
+            handle_failure(audio_doc["_id"], job, audio_doc.get("attempts", 1), error_message)
+        except Exception:
+            # Sin publicar el reintento el audio quedaría en proceso sin lease y nadie
+            # lo volvería a ver: se devuelve el lease caducado para la siguiente pasada.
+            db.restore_audio_lease(audio_doc["_id"], lease)
+            raise
+        metrics_service.leases_expired.inc()
+        reaped += 1
+    return reaped
+
+
+def start_reaper() -> threading.Thread:
+    """Lanza el reaper en un hilo daemon; es seguro tener uno por worker."""
+    def run():
+        while True:
+            try:
+                reaped = reap_expired_leases()
+                if reaped:
+                    logger.warning(f"Reaper: {reaped} trabajos con lease caducado reencolados")
+            except Exception as e:
+                logger.error(f"Error en el reaper de leases: {e}")
+            time.sleep(Config.JOB_REAPER_INTERVAL)
+
+    thread = threading.Thread(target=run, name="lease-reaper", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,260 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from config import Config
+
+# Buckets pensados para etapas que van de milisegundos (escrituras en Mongo)
+# a varios minutos (transcripción de audios largos).
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+
+stage_duration = Histogram(
+    "whispai_stage_duration_seconds",
+    "Duración de cada etapa de background_transcription",
+    ["stage", "model", "mode"],
+    buckets=STAGE_BUCKETS,
+)
+
+job_duration = Histogram(
+    "whispai_job_duration_seconds",
+    "Duración total de un trabajo de transcripción",
+    ["model", "mode", "status"],
+    buckets=STAGE_BUCKETS,
+)
+
+real_time_factor = Histogram(
+    "whispai_real_time_factor",
+    "Tiempo de procesamiento dividido por la duración del audio",
+    ["model", "mode"],
+    buckets=RTF_BUCKETS,
+)
+
+jobs_in_flight = Gauge(
+    "whispai_jobs_in_flight",
+    "Trabajos de transcripción en curso en este proceso",
+    multiprocess_mode="livesum",
+)
+
+queue_depth = Gauge(
+    "whispai_queue_depth",
+    "Mensajes pendientes en la cola de RabbitMQ",
+    ["queue"],
+    multiprocess_mode="max",
+)
+
+model_loads = Counter(
+    "whispai_model_loads_total",
+    "Cargas de modelos Whisper desde disco",
+    ["model"],
+)
+
+model_cache_hits = Counter(
+    "whispai_model_cache_hits_total",
+    "Peticiones de modelo resueltas con el modelo ya cargado",
+    ["model"],
+)
+
+model_load_duration = Histogram(
+    "whispai_model_load_seconds",
+    "Tiempo de carga de un modelo Whisper",
+    ["model"],
+    buckets=STAGE_BUCKETS,
+)
+
+models_loaded = Gauge(
+    "whispai_models_loaded",
+    "Modelos Whisper residentes en memoria en este proceso",
+    multiprocess_mode="livesum",
+)
+
+languages_detected = Counter(
+    "whispai_languages_detected_total",
+    "Audios por idioma detectado (mezcla de idiomas para dimensionar el pool de modelos)",
+    ["language"],
+)
+
+model_routed = Counter(
+    "whispai_model_routed_total",
+    "Trabajos transcritos por modelo tras el enrutado por idioma",
+    ["model", "variant"],
+)
+
+audio_seconds_by_language = Counter(
+    "whispai_audio_seconds_by_language_total",
+    "Segundos de audio transcritos por idioma detectado",
+    ["language"],
+)
+
+normalized_bytes_saved = Counter(
+    "whispai_normalized_bytes_saved_total",
+    "Bytes ahorrados al normalizar los audios subidos a 16 kHz mono",
+)
+
+feature_cache_requests = Counter(
+    "whispai_feature_cache_requests_total",
+    "Consultas a la caché de espectrogramas log-mel",
+    ["result"],
+)
+
+feature_cache_evictions = Counter(
+    "whispai_feature_cache_evictions_total",
+    "Entradas expulsadas de la caché de espectrogramas por límite de tamaño",
+)
+
+scheduler_pending = Gauge(
+    "whispai_scheduler_pending_jobs",
+    "Trabajos retenidos en las colas virtuales del planificador",
+    multiprocess_mode="max",
+)
+
+scheduler_pending_users = Gauge(
+    "whispai_scheduler_pending_users",
+    "Usuarios con trabajos pendientes en el planificador",
+    multiprocess_mode="max",
+)
+
+scheduler_dispatched = Counter(
+    "whispai_scheduler_dispatched_total",
+    "Trabajos pasados por el planificador a la cola de los workers",
+)
+
+uploads_rejected = Counter(
+    "whispai_uploads_rejected_total",
+    "Subidas rechazadas por el control de admisión",
+    ["reason"],
+)
+
+uploads_degraded = Counter(
+    "whispai_uploads_degraded_total",
+    "Subidas en modo auto enviadas a un modelo más rápido por exceso de cola",
+)
+
+estimated_wait = Gauge(
+    "whispai_estimated_wait_seconds",
+    "Espera estimada en cola para un trabajo nuevo",
+    multiprocess_mode="max",
+)
+
+jobs_retried = Counter(
+    "whispai_jobs_retried_total",
+    "Trabajos fallidos reencolados con backoff para otro intento",
+)
+
+jobs_dead_lettered = Counter(
+    "whispai_jobs_dead_lettered_total",
+    "Trabajos enviados a la cola de dead-letter tras agotar los intentos",
+)
+
+jobs_cancelled = Counter(
+    "whispai_jobs_cancelled_total",
+    "Trabajos interrumpidos en el worker porque el audio se canceló o eliminó",
+)
+
+leases_expired = Counter(
+    "whispai_job_leases_expired_total",
+    "Trabajos recuperados por el reaper porque su worker dejó de renovar el lease",
+)
+
+hash_queue_depth = Gauge(
+    "whispai_password_hash_queue_depth",
+    "Operaciones de hashing de contraseñas esperando en el pool",
+    multiprocess_mode="livesum",
+)
+
+hash_wait_duration = Histogram(
+    "whispai_password_hash_wait_seconds",
+    "Tiempo en cola antes de ejecutar una operación de hashing",
+    ["operation"],
+    buckets=STAGE_BUCKETS,
+)
+
+hash_duration = Histogram(
+    "whispai_password_hash_seconds",
+    "Duración de una operación de hashing de contraseñas",
+    ["operation"],
+    buckets=STAGE_BUCKETS,
+)
+
+hash_rejected = Counter(
+    "whispai_password_hash_rejected_total",
+    "Operaciones de hashing rechazadas por saturación del pool",
+    ["operation"],
+)
+
+
+class JobTimings:
+    """Acumula los tiempos por etapa de un trabajo.
+
+    El modelo no se conoce hasta después de la descarga y el cálculo de
+    duración, así que las observaciones se guardan y se publican todas
+    juntas en ``flush`` con las etiquetas definitivas.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode or "auto"
+        self.model = "unknown"
+        self.stages = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def flush(self, status: str, audio_duration: float = 0.0):
+        """Publica las etapas acumuladas, la duración total y el RTF."""
+        for name, seconds in self.stages:
+            stage_duration.labels(name, self.model, self.mode).observe(seconds)
+
+        total = self.elapsed()
+        job_duration.labels(self.model, self.mode, status).observe(total)
+        if status == "completed" and audio_duration and audio_duration > 0:
+            real_time_factor.labels(self.model, self.mode).observe(total / audio_duration)
+        self.stages = []
+
+
+def render_metrics():
+    """Devuelve (payload, content_type) con el estado actual del registro.
+
+    Con gunicorn cada worker es un proceso distinto; si ``PROMETHEUS_MULTIPROC_DIR``
+    está definido se agregan los ficheros de todos los workers.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Limpia los ficheros de métricas de un worker de gunicorn que ha terminado."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+
+
+def start_worker_server(port: int = None):
+    """Expone las métricas del worker en un puerto HTTP propio."""
+    port = port or Config.WORKER_METRICS_PORT
+    start_http_server(port)
+    return port
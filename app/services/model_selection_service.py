@@ -0,0 +1,191 @@
+import os
+import time
+import platform
+import datetime
+import threading
+
+from config import Config
+
+# Elección del modelo Whisper según el plazo del trabajo.
+#
+# Cada worker registra en MongoDB (colección model_stats) el real-time factor
+# medido de cada modelo (segundos de transcripción / segundos de audio) y su
+# tiempo de carga, como media móvil por perfil de hardware. Con esas medidas se
+# predice cuánto tardaría cada candidato y se elige el más preciso que termina
+# antes del plazo; si ninguno llega, el más rápido.
+
+# Orden de precisión de los modelos de Whisper, de menor a mayor
+ACCURACY_ORDER = ["tiny", "base", "small", "medium", "large-v1", "large-v2", "large-v3", "large"]
+
+# Tamaños con variante solo-inglés (.en); large no la tiene
+ENGLISH_VARIANTS = {"tiny", "base", "small", "medium"}
+
+# Modelo máximo de cada modo explícito
+PRECISION_MODELS = {
+    "fast": "base",
+    "balanced": "small",
+    "accurate": "medium",
+}
+
+# Valores iniciales (CPU, fp32) hasta que haya mediciones en este hardware
+PRIOR_RTF = {"tiny": 0.08, "base": 0.15, "small": 0.45, "medium": 1.2, "large": 2.5}
+PRIOR_LOAD_SECONDS = {"tiny": 1.0, "base": 2.0, "small": 5.0, "medium": 12.0, "large": 25.0}
+
+_stats = None
+_stats_at = 0.0
+_stats_lock = threading.Lock()
+
+
+def profile() -> str:
+    return Config.MODEL_RTF_PROFILE or f"{platform.machine()}-{os.cpu_count()}cpu"
+
+
+def accuracy_rank(model_name: str) -> int:
+    family = model_name.split(".")[0]
+    return ACCURACY_ORDER.index(family) if family in ACCURACY_ORDER else len(ACCURACY_ORDER)
+
+
+def candidates() -> list[str]:
+    """Modelos configurados, de menor a mayor precisión."""
+    models = [name.strip() for name in Config.MODEL_CANDIDATES.split(",") if name.strip()]
+    return sorted(models, key=accuracy_rank)
+
+
+def for_language(model_name: str, language: str = None) -> str:
+    """Variante ``.en`` del mismo tamaño para audio en inglés, si existe y está activada."""
+    family = model_name.split(".")[0]
+    if Config.ENGLISH_ONLY_MODELS and language == "en" and family in ENGLISH_VARIANTS:
+        return f"{family}.en"
+    return model_name
+
+
+def _prior(table: dict, model_name: str) -> float:
+    family = model_name.split(".")[0]
+    return table.get(family, table["large"] if family.startswith("large") else table["medium"])
+
+
+def model_stats() -> dict:
+    """Mediciones del perfil actual, cacheadas ``MODEL_STATS_CACHE_SECONDS`` por proceso."""
+    from app import db
+
+    global _stats, _stats_at
+    with _stats_lock:
+        if _stats is None or time.monotonic() - _stats_at > Config.MODEL_STATS_CACHE_SECONDS:
+            _stats = db.get_model_stats(profile())
+            _stats_at = time.monotonic()
+        return _stats
+
+
+def rtf(model_name: str) -> float:
+    return model_stats().get(model_name, {}).get("rtf") or _prior(PRIOR_RTF, model_name)
+
+
+def load_seconds(model_name: str) -> float:
+    return model_stats().get(model_name, {}).get("load_seconds") or _prior(PRIOR_LOAD_SECONDS, model_name)
+
+
+def predict(model_name: str, duration: float, loaded: tuple = ()) -> float:
+    """Segundos previstos de carga (si no está en el pool) más transcripción."""
+    load = 0.0 if model_name in loaded else load_seconds(model_name)
+    return load + duration * rtf(model_name)
+
+
+def deadline_for(audio_doc: dict, mode: str) -> datetime.datetime | None:
+    """Plazo del trabajo: el pedido en la subida o, en modo auto, el plazo por defecto."""
+    if audio_doc.get("deadline_at"):
+        return audio_doc["deadline_at"]
+    if mode not in PRECISION_MODELS and audio_doc.get("upload_time"):
+        return audio_doc["upload_time"] + datetime.timedelta(seconds=Config.MODEL_DEFAULT_DEADLINE_SECONDS)
+    return None
+
+
+def choose(audio_doc: dict, mode: str, duration: float, loaded: tuple = (), language: str = None,
+           refine: bool = False) -> dict:
+    """Elige el modelo y devuelve la decisión que se guarda en el documento del audio.
+
+    El presupuesto se mide al sacar el trabajo de la cola, así que ya descuenta
+    el tiempo esperado detrás del resto de trabajos. Con ``language="en"`` se
+    comparan las variantes ``.en``, cada una con su propio RTF medido. Si hay
+    un checkpoint reanudable solo se predice el audio que queda por transcribir.
+
+    El refinado de un trabajo en dos pasadas (``refine``) no mira el plazo: el
+    borrador ya lo cubrió y, con el presupuesto gastado, acabaría en el modelo
+    más rápido, que no mejora el borrador.
+    """
+    deadline_at = deadline_for(audio_doc, mode)
+    budget = (deadline_at - datetime.datetime.utcnow()).total_seconds() if deadline_at else None
+    if refine:
+        budget = None
+
+    pool = candidates()
+    if mode in PRECISION_MODELS:
+        cap = accuracy_rank(PRECISION_MODELS[mode])
+        pool = [name for name in pool if accuracy_rank(name) <= cap] or [PRECISION_MODELS[mode]]
+    pool = [for_language(name, language) for name in pool]
+
+    # Un reintento con tramos ya guardados sigue con el mismo modelo si llega a
+    # tiempo con lo que falta: cambiar de modelo descartaría el checkpoint
+    checkpoint = audio_doc.get("checkpoint") or {}
+    if checkpoint.get("chunks") and checkpoint.get("model") in pool and checkpoint.get("language") == language:
+        remaining = max(duration - checkpoint.get("next_offset", 0.0), 0.0)
+        if budget is None or predict(checkpoint["model"], remaining, loaded) * Config.MODEL_DEADLINE_MARGIN <= budget:
+            return _decision(checkpoint["model"], mode, "checkpoint", remaining, loaded, language, deadline_at, budget)
+
+    if budget is None:
+        # Sin plazo (modo explícito o refinado): el modelo más preciso que permite el modo
+        model_name, reason = pool[-1], "refine" if refine else "mode"
+    else:
+        model_name, reason = pool[0], "deadline_unreachable"
+        for name in reversed(pool):
+            if predict(name, duration, loaded) * Config.MODEL_DEADLINE_MARGIN <= budget:
+                model_name, reason = name, "deadline"
+                break
+
+    return _decision(model_name, mode, reason, duration, loaded, language, deadline_at, budget)
+
+
+def draft(duration: float, loaded: tuple = (), language: str = None) -> dict:
+    """Decisión para la pasada de borrador de un trabajo en dos pasadas: siempre ``DRAFT_MODEL``."""
+    model_name = for_language(Config.DRAFT_MODEL, language)
+    return _decision(model_name, "draft", "draft", duration, loaded, language)
+
+
+def _decision(model_name: str, mode: str, reason: str, duration: float, loaded: tuple = (),
+              language: str = None, deadline_at: datetime.datetime = None, budget: float = None) -> dict:
+    return {
+        "model": model_name,
+        "mode": mode,
+        "reason": reason,
+        "language": language,
+        "profile": profile(),
+        "deadline_at": deadline_at,
+        "budget_seconds": round(budget, 2) if budget is not None else None,
+        "rtf": round(rtf(model_name), 4),
+        "predicted_seconds": round(predict(model_name, duration, loaded), 2),
+    }
+
+
+def record(decision: dict, duration: float, transcription_seconds: float, load_seconds: float = None,
+           measure_rtf: bool = True) -> dict:
+    """Guarda las mediciones del trabajo y completa la decisión con el tiempo real.
+
+    ``measure_rtf`` es falso cuando la transcripción se reanudó desde un
+    checkpoint: el tiempo medido no cubre todo el audio.
+    """
+    from app import db
+
+    measured_rtf = transcription_seconds / duration if duration > 0 else None
+    if (measure_rtf and measured_rtf is not None) or load_seconds is not None:
+        db.record_model_stats(
+            profile(), decision["model"], Config.MODEL_RTF_ALPHA,
+            rtf=measured_rtf if measure_rtf else None, load_seconds=load_seconds
+        )
+
+    actual = transcription_seconds + (load_seconds or 0.0)
+    completed_at = datetime.datetime.utcnow()
+    return {
+        **decision,
+        "actual_seconds": round(actual, 2),
+        "actual_rtf": round(measured_rtf, 4) if measured_rtf is not None else None,
+        "met_deadline": completed_at <= decision["deadline_at"] if decision["deadline_at"] else None,
+    }
@@ -1,28 +1,114 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
 import pika
+from config import Config
 
 rabbit_connection = None
 queue_name = 'audios'
+_connection_pid = None
+# BlockingConnection no es thread-safe: los workers gthread comparten una sola conexión
+_connection_lock = threading.RLock()
+# Solo la API reutiliza la conexión. En los workers nadie atiende su E/S entre
+# publicaciones y el broker la cierra por heartbeat durante una transcripción larga.
+_shared_connection = True
+
+def _connect():
+    credentials = pika.PlainCredentials(Config.RABBITMQ_USER, Config.RABBITMQ_PASSWORD)
+    return pika.BlockingConnection(
+        pika.ConnectionParameters(host=Config.RABBITMQ_HOST, credentials=credentials)
+    )
+
+def use_short_lived_connections():
+    """Abre una conexión por operación en lugar de la compartida (workers y planificador)."""
+    global _shared_connection
+    _shared_connection = False
 
 def get_rabbit_connection():
-    global rabbit_connection
-    if rabbit_connection is None or rabbit_connection.is_closed:
-        credentials = pika.PlainCredentials("admin", "admin")
-        rabbit_connection = pika.BlockingConnection(
-            pika.ConnectionParameters(host="localhost", credentials=credentials)
+    global rabbit_connection, _connection_pid
+    with _connection_lock:
+        if rabbit_connection is None or rabbit_connection.is_closed or _connection_pid != os.getpid():
+            rabbit_connection = _connect()
+            _connection_pid = os.getpid()
+        return rabbit_connection
+
+@contextmanager
+def _channel():
+    if not _shared_connection:
+        connection = _connect()
+        try:
+            yield connection.channel()
+        finally:
+            if connection.is_open:
+                connection.close()
+        return
+
+    with _connection_lock:
+        channel = get_rabbit_connection().channel()
+        try:
+            yield channel
+        finally:
+            if channel.is_open:
+                channel.close()
+
+def publish_message(message, queue: str = queue_name, arguments: dict = None):
+    """Publica un mensaje persistente en ``queue`` (declarándola con ``arguments`` si hace falta)."""
+    with _channel() as channel:
+        channel.queue_declare(queue=queue, durable=True, arguments=arguments)
+        channel.basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=message,
+            properties=pika.BasicProperties(
+                delivery_mode=2,  # Make message persistent
+            )
+        )
+
+def get_queue_depth(name: str = queue_name, missing_ok: bool = False) -> int:
+    """Devuelve el número de mensajes pendientes en la cola (declaración pasiva).
+
+    Con ``missing_ok`` una cola que aún no existe (p. ej. una de reintento que
+    nunca se ha usado) cuenta como vacía en lugar de lanzar la excepción del broker.
+    """
+    try:
+        with _channel() as channel:
+            method = channel.queue_declare(queue=name, durable=True, passive=True)
+            return method.method.message_count
+    except pika.exceptions.ChannelClosedByBroker as e:
+        if missing_ok and e.reply_code == 404:
+            return 0
+        raise
+
+def call(message, queue: str, timeout: float) -> bytes:
+    """Petición-respuesta sobre ``queue`` con direct reply-to; lanza ``TimeoutError`` sin respuesta.
+
+    Usa una conexión propia: esperar la respuesta con la compartida bloquearía
+    las publicaciones del resto de hilos.
+    """
+    connection = _connect()
+    try:
+        channel = connection.channel()
+        replies = []
+        channel.basic_consume(
+            queue="amq.rabbitmq.reply-to",
+            on_message_callback=lambda ch, method, properties, body: replies.append(body),
+            auto_ack=True
         )
-    return rabbit_connection
-
-def publish_message(message):
-    if rabbit_connection is None or rabbit_connection.is_closed:
-        get_rabbit_connection()
-
-    channel = rabbit_connection.channel()
-    channel.queue_declare(queue=queue_name, durable=True)
-    channel.basic_publish(
-        exchange='',
-        routing_key=queue_name,
-        body=message,
-        properties=pika.BasicProperties(
-            delivery_mode=2,  # Make message persistent
+        channel.basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=message,
+            properties=pika.BasicProperties(reply_to="amq.rabbitmq.reply-to", expiration=str(int(timeout * 1000)))
         )
-    )
\ No newline at end of file
+        deadline = time.monotonic() + timeout
+        while not replies:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Sin respuesta de '{queue}' en {timeout} s")
+            connection.process_data_events(time_limit=min(remaining, 1))
+        return replies[0]
+    finally:
+        if connection.is_open:
+            connection.close()
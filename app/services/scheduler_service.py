@@ -0,0 +1,116 @@
+import math
+from collections import OrderedDict, deque
+
+from config import Config
+
+# Reparto justo de la capacidad de transcripción entre usuarios.
+#
+# Cada usuario tiene su propia cola virtual y un déficit al estilo deficit
+# round-robin: en cada vuelta recibe ``quantum * peso`` y puede despachar
+# trabajos mientras su coste no supere el déficit acumulado. Un usuario con
+# un solo audio pendiente sale en la siguiente vuelta aunque otro tenga cientos
+# en cola, y cuando no hay competencia un solo usuario aprovecha toda la capacidad.
+
+ANONYMOUS_OWNER = "_anonymous"
+
+
+def parse_overrides(spec: str, cast=float) -> dict:
+    """Convierte ``"user1=2,user2=0.5"`` en un dict ``{owner_id: valor}``."""
+    overrides = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        owner_id, value = item.split("=", 1)
+        overrides[owner_id.strip()] = cast(value.strip())
+    return overrides
+
+
+def job_cost(payload: dict) -> float:
+    """Coste estimado de un trabajo en unidades de ``SCHEDULER_COST_UNIT_BYTES`` (mínimo 1)."""
+    size = payload.get("size") or 0
+    return max(1.0, math.ceil(size / Config.SCHEDULER_COST_UNIT_BYTES))
+
+
+class FairScheduler:
+    """Colas virtuales por usuario con deficit round-robin ponderado y límites de concurrencia."""
+
+    def __init__(self, quantum: float = None, weights: dict = None, caps: dict = None,
+                 default_weight: float = 1.0, default_cap: int = None):
+        self.quantum = quantum or Config.SCHEDULER_QUANTUM
+        self.weights = weights if weights is not None else parse_overrides(Config.SCHEDULER_WEIGHTS)
+        self.caps = caps if caps is not None else parse_overrides(Config.SCHEDULER_MAX_CONCURRENT, int)
+        self.default_weight = default_weight
+        self.default_cap = Config.SCHEDULER_MAX_CONCURRENT_PER_USER if default_cap is None else default_cap
+        self.queues = OrderedDict()
+        self.deficits = {}
+        self.active = {}
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def weight(self, owner_id: str) -> float:
+        # Un peso 0 bloquearía al usuario para siempre; se deja una cuota mínima
+        return max(self.weights.get(owner_id, self.default_weight), 0.01)
+
+    def cap(self, owner_id: str) -> int:
+        return self.caps.get(owner_id, self.default_cap)
+
+    def enqueue(self, owner_id: str, item, cost: float = 1.0):
+        owner_id = owner_id or ANONYMOUS_OWNER
+        if owner_id not in self.queues:
+            self.queues[owner_id] = deque()
+            self.deficits[owner_id] = 0.0
+        self.queues[owner_id].append((cost, item))
+
+    def set_active(self, active: dict):
+        """Trabajos ya despachados y sin terminar por usuario (se consulta a MongoDB)."""
+        self.active = dict(active)
+
+    def _capped(self, owner_id: str) -> bool:
+        cap = self.cap(owner_id)
+        if not cap or self.active.get(owner_id, 0) < cap:
+            return False
+        # El límite solo se aplica si otro usuario está esperando: sin competencia
+        # los trabajos masivos aprovechan la capacidad libre.
+        return any(queue and other != owner_id and not self._at_cap(other)
+                   for other, queue in self.queues.items())
+
+    def _at_cap(self, owner_id: str) -> bool:
+        cap = self.cap(owner_id)
+        return bool(cap) and self.active.get(owner_id, 0) >= cap
+
+    def next(self):
+        """Devuelve ``(owner_id, item)`` del siguiente trabajo a despachar o ``None``."""
+        if not self.queues:
+            return None
+
+        # Como mucho tantas vueltas como hagan falta para que el trabajo más caro quepa
+        for _ in range(self._max_rounds()):
+            for owner_id in list(self.queues):
+                queue = self.queues[owner_id]
+                if self._capped(owner_id):
+                    continue
+                cost, item = queue[0]
+                if self.deficits[owner_id] < cost:
+                    continue
+                queue.popleft()
+                self.deficits[owner_id] -= cost
+                self.active[owner_id] = self.active.get(owner_id, 0) + 1
+                # Se pasa al final para que el siguiente turno sea de otro usuario
+                self.queues.move_to_end(owner_id)
+                if not queue:
+                    del self.queues[owner_id]
+                    del self.deficits[owner_id]
+                return owner_id, item
+
+            eligible = [owner_id for owner_id in self.queues if not self._capped(owner_id)]
+            if not eligible:
+                return None
+            for owner_id in eligible:
+                self.deficits[owner_id] += self.quantum * self.weight(owner_id)
+        return None
+
+    def _max_rounds(self) -> int:
+        largest = max(queue[0][0] for queue in self.queues.values())
+        smallest_share = min(self.quantum * self.weight(owner_id) for owner_id in self.queues)
+        return int(math.ceil(largest / max(smallest_share, 1e-9))) + 1
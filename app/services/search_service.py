@@ -0,0 +1,164 @@
+import re
+import bisect
+import unicodedata
+from functools import lru_cache
+
+from config import Config
+
+# Los campos de segmentos bastan para generar fragmentos con tiempos sin traer
+# la transcripción completa ni las marcas por palabra.
+SEARCH_PROJECTION = {
+    "filename": 1,
+    "upload_time": 1,
+    "language": 1,
+    "output_text": 1,
+    "segments.text": 1,
+    "segments.offsets": 1,
+    "segments.start": 1,
+    "segments.end": 1,
+}
+
+
+@lru_cache(maxsize=4096)
+def _fold_char(char: str) -> str:
+    base = unicodedata.normalize("NFD", char)[:1] or char
+    return base.lower()[:1] or char
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin diacríticos, carácter a carácter para conservar las posiciones."""
+    return "".join(_fold_char(char) for char in text)
+
+
+def query_terms(query: str) -> list[str]:
+    """Términos y frases de una consulta ``$search`` (sin los negados con ``-``)."""
+    phrases = re.findall(r'"([^"]+)"', query)
+    rest = re.sub(r'"[^"]*"', " ", query)
+    words = [word for word in re.findall(r"-?\w+", rest) if not word.startswith("-")]
+    return [fold(term) for term in phrases + words if term.strip()]
+
+
+def _pattern(terms: list[str]):
+    alternatives = "|".join(re.escape(term) for term in sorted(set(terms), key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternatives})\b")
+
+
+def _segment_snippets(segments: dict, pattern, limit: int) -> list[dict]:
+    """Un fragmento por segmento con coincidencias, con sus tiempos de inicio y fin."""
+    text = segments["text"]
+    offsets = segments["offsets"]
+    folded = fold(text)
+
+    snippets = {}
+    for match in pattern.finditer(folded):
+        index = bisect.bisect_right(offsets, match.start()) - 1
+        if index >= len(segments["start"]):
+            break
+        if index not in snippets:
+            if len(snippets) == limit:
+                break
+            segment_text = text[offsets[index]:offsets[index + 1]]
+            lead = len(segment_text) - len(segment_text.lstrip())
+            snippets[index] = {
+                "field": "transcription",
+                "text": segment_text.strip(),
+                "highlights": [],
+                "start": segments["start"][index] / 1000,
+                "end": segments["end"][index] / 1000,
+                "_base": offsets[index] + lead,
+            }
+        snippet = snippets[index]
+        snippet["highlights"].append([match.start() - snippet["_base"], match.end() - snippet["_base"]])
+
+    for snippet in snippets.values():
+        del snippet["_base"]
+    return list(snippets.values())
+
+
+def _window_snippets(text: str, field: str, pattern, limit: int) -> list[dict]:
+    """Fragmentos de ``SEARCH_SNIPPET_CHARS`` caracteres alrededor de cada coincidencia."""
+    folded = fold(text)
+    half = Config.SEARCH_SNIPPET_CHARS // 2
+    snippets = []
+    window_end = -1
+
+    for match in pattern.finditer(folded):
+        if snippets and match.end() <= window_end:
+            base = snippets[-1]["_base"]
+            snippets[-1]["highlights"].append([match.start() - base, match.end() - base])
+            continue
+        if len(snippets) == limit:
+            break
+        start = max(0, match.start() - half)
+        end = min(len(text), match.end() + half)
+        # Ajuste a límites de palabra para no cortar términos por la mitad
+        if start > 0:
+            space = text.find(" ", start, match.start())
+            start = space + 1 if space != -1 else start
+        if end < len(text):
+            space = text.rfind(" ", match.end(), end)
+            end = space if space != -1 else end
+        window_end = end
+        snippets.append({
+            "field": field,
+            "text": text[start:end],
+            "highlights": [[match.start() - start, match.end() - start]],
+            "_base": start,
+        })
+
+    for snippet in snippets:
+        del snippet["_base"]
+    return snippets
+
+
+def build_snippets(audio_doc: dict, terms: list[str]) -> list[dict]:
+    """Fragmentos resaltados de la transcripción (con tiempos si hay segmentos) y de la salida LLM."""
+    if not terms:
+        return []
+    pattern = _pattern(terms)
+    limit = Config.SEARCH_SNIPPETS_PER_RESULT
+
+    snippets = []
+    segments = audio_doc.get("segments")
+    if segments and segments.get("text"):
+        snippets = _segment_snippets(segments, pattern, limit)
+    elif audio_doc.get("transcription"):
+        snippets = _window_snippets(audio_doc["transcription"], "transcription", pattern, limit)
+
+    if len(snippets) < limit and audio_doc.get("output_text"):
+        snippets += _window_snippets(audio_doc["output_text"], "output_text", pattern, limit - len(snippets))
+    return snippets
+
+
+def search(owner_id: str, query: str, page: int = 1, per_page: int = None) -> dict:
+    """Página ``page`` de resultados de búsqueda de texto completo de un usuario."""
+    from app import db
+
+    per_page = per_page or Config.SEARCH_PAGE_SIZE
+    # Se pide un documento de más para saber si hay página siguiente sin contar el total
+    audio_docs = db.search_audios(owner_id, query, (page - 1) * per_page, per_page + 1, SEARCH_PROJECTION)
+    has_more = len(audio_docs) > per_page
+    audio_docs = audio_docs[:per_page]
+
+    # Audios anteriores a los segmentos guardados: se recurre a la transcripción completa
+    legacy_ids = [doc["_id"] for doc in audio_docs if not doc.get("segments")]
+    if legacy_ids:
+        transcriptions = {
+            doc["_id"]: doc.get("transcription")
+            for doc in db.find_audios_by_ids(legacy_ids, owner_id, {"transcription": 1})
+        }
+        for doc in audio_docs:
+            if doc["_id"] in transcriptions:
+                doc["transcription"] = transcriptions[doc["_id"]]
+
+    terms = query_terms(query)
+    results = [{
+        "id": doc["_id"],
+        "filename": doc.get("filename"),
+        "upload_time": doc.get("upload_time"),
+        "language": doc.get("language"),
+        "score": round(doc.get("score", 0.0), 4),
+        "snippets": build_snippets(doc, terms),
+    } for doc in audio_docs]
+
+    return {"query": query, "page": page, "per_page": per_page, "has_more": has_more, "results": results}
@@ -1,16 +1,22 @@
+import os
 import io
-from flask import current_app
+import logging
+import datetime
 from minio import Minio
 from minio.error import S3Error
 from werkzeug.utils import secure_filename
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 minio_client = None
 bucket_name = None
+_client_settings = None
+_client_pid = None
 
 def init_storage(app=None):
     """Inicializa el cliente de MinIO y asegura que el bucket exista."""
-    global minio_client, bucket_name
+    global bucket_name, _client_settings
 
     if app:
         endpoint = app.config["MINIO_ENDPOINT"]
@@ -25,12 +31,8 @@ def init_storage(app=None):
         secure = Config.MINIO_SECURE
         bucket_name = Config.MINIO_BUCKET
 
-    minio_client = Minio(
-        endpoint,
-        access_key=access_key,
-        secret_key=secret_key,
-        secure=secure
-    )
+    _client_settings = (endpoint, access_key, secret_key, secure)
+    _connect()
 
     # Crea el bucket si no existe
     if not minio_client.bucket_exists(bucket_name):
@@ -41,9 +43,31 @@ def init_storage(app=None):
         if app:
             app.logger.debug(f"Bucket ya existente: {bucket_name}")
 
-def save_file(file, object_name=None):
+def _connect():
+    global minio_client, _client_pid
+    endpoint, access_key, secret_key, secure = _client_settings
+    minio_client = Minio(
+        endpoint,
+        access_key=access_key,
+        secret_key=secret_key,
+        secure=secure
+    )
+    _client_pid = os.getpid()
+
+def reset_after_fork():
+    """Crea un cliente nuevo en el proceso hijo; el pool de urllib3 no es seguro tras fork()."""
+    if _client_settings is not None and _client_pid != os.getpid():
+        _connect()
+
+def require_storage():
+    """Lanza error si MinIO no está inicializado y reabre el cliente tras un fork."""
     if minio_client is None:
         raise RuntimeError("Cliente de MinIO no inicializado")
+    if _client_pid != os.getpid():
+        reset_after_fork()
+
+def save_file(file, object_name=None):
+    require_storage()
 
     try:
         if hasattr(file, "filename"):  # FileStorage
@@ -56,7 +80,7 @@ def save_file(file, object_name=None):
             data = file.read()
 
         file_size = len(data)
-        current_app.logger.info(f"📤 Subiendo {object_name} ({file_size} bytes) a MinIO...")
+        logger.debug("📤 Subiendo %s (%d bytes) a MinIO...", object_name, file_size)
 
         minio_client.put_object(
             bucket_name,
@@ -69,15 +93,43 @@ def save_file(file, object_name=None):
         return object_name
 
     except S3Error as e:
-        current_app.logger.error(f"❌ Error al subir archivo a MinIO: {e}")
+        logger.error(f"❌ Error al subir archivo a MinIO: {e}")
         raise
 
+def save_stream(stream, object_name: str, length: int, content_type: str = "application/octet-stream"):
+    """Sube un stream a MinIO sin cargarlo entero en memoria."""
+    require_storage()
+    logger.debug("📤 Subiendo %s (%d bytes) a MinIO en streaming...", object_name, length)
+    minio_client.put_object(
+        bucket_name,
+        object_name,
+        stream,
+        length,
+        content_type=content_type or "application/octet-stream"
+    )
+    return object_name
+
 def download_file(object_name: str, download_path: str):
-    if minio_client is None:
-        raise RuntimeError("Cliente de MinIO no inicializado")
+    require_storage()
     minio_client.fget_object(bucket_name, object_name, download_path)
 
 def delete_file(object_name: str):
-    if minio_client is None:
-        raise RuntimeError("Cliente de MinIO no inicializado")
+    require_storage()
     minio_client.remove_object(bucket_name, object_name)
+
+def stat_file(object_name: str):
+    """Devuelve los metadatos del objeto (tamaño, content_type, etag)."""
+    require_storage()
+    return minio_client.stat_object(bucket_name, object_name)
+
+def open_range(object_name: str, offset: int = 0, length: int = 0):
+    """Abre una lectura parcial del objeto; el llamador debe cerrar y liberar la respuesta."""
+    require_storage()
+    return minio_client.get_object(bucket_name, object_name, offset=offset, length=length)
+
+def presigned_url(object_name: str, expires_seconds: int) -> str:
+    """URL GET prefirmada y de corta duración para descargar el objeto directamente de MinIO."""
+    require_storage()
+    return minio_client.presigned_get_object(
+        bucket_name, object_name, expires=datetime.timedelta(seconds=expires_seconds)
+    )
@@ -0,0 +1,55 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+from config import Config
+
+# Whisper trabaja a 16 kHz mono: normalizar una sola vez evita remuestrear en cada ejecución
+SAMPLE_RATE = 16000
+
+FORMATS = {
+    "opus": {"extension": ".opus", "content_type": "audio/ogg", "codec": ["-c:a", "libopus"]},
+    "flac": {"extension": ".flac", "content_type": "audio/flac", "codec": ["-c:a", "flac", "-compression_level", "8"]},
+}
+
+
+def get_format(name: str = None) -> dict:
+    name = (name or Config.NORMALIZED_AUDIO_FORMAT).lower()
+    if name not in FORMATS:
+        raise ValueError(f"Formato de normalización no soportado: {name}")
+    return {"name": name, **FORMATS[name]}
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(Config.FFMPEG_BINARY) is not None
+
+
+def normalize_audio(input_path: str, format_name: str = None) -> str:
+    """Transcodifica a 16 kHz mono en el formato configurado y devuelve la ruta del fichero nuevo.
+
+    El llamador es responsable de borrar el fichero devuelto.
+    """
+    fmt = get_format(format_name)
+    fd, output_path = tempfile.mkstemp(suffix=fmt["extension"])
+    os.close(fd)
+
+    cmd = [
+        Config.FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", input_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        *fmt["codec"],
+    ]
+    if fmt["name"] == "opus":
+        cmd += ["-b:a", Config.NORMALIZED_OPUS_BITRATE, "-application", "voip"]
+    cmd.append(output_path)
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=Config.FFMPEG_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        os.remove(output_path)
+        raise RuntimeError(f"ffmpeg falló al normalizar el audio: {e.stderr.decode(errors='replace').strip()}")
+    except Exception:
+        os.remove(output_path)
+        raise
+    return output_path
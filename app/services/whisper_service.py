@@ -1,44 +1,212 @@
 # app/whisper_service.py
 
-try:
-    import whisper
-except ImportError:
-    whisper = None
+import os
+import time
+import importlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 
 from flask import current_app
 from config import Config
+from app.services import metrics_service, feature_cache, cpu_service
 
+# whisper (y con él torch) se importa en el primer uso: solo los workers lo necesitan
+whisper = None
 model = None
 current_model_name = None
+# Modelos residentes (LRU de WHISPER_POOL_SIZE): detector de idioma, multilingüe y .en
+_pool = OrderedDict()
+# Log-mel del audio en curso: lo comparten la detección de idioma y la transcripción
+_features_memo = None
+# Un modelo no admite transcripciones concurrentes
+_transcribe_lock = threading.Lock()
+# Mel precalculado para la llamada a transcribe() en curso en cada hilo
+_mel_override = threading.local()
 
-def ensure_model_loaded(model_name: str = None):
-    """Carga el modelo Whisper solo si aún no está cargado o si cambia el nombre."""
-    global model, current_model_name
+def _import_whisper():
+    global whisper
     if whisper is None:
-        raise ImportError("La biblioteca Whisper no está instalada.")
+        try:
+            whisper = importlib.import_module("whisper")
+        except ImportError:
+            raise ImportError("La biblioteca Whisper no está instalada.")
+        cpu_service.apply_torch_threads()
+        _install_mel_hook()
+    return whisper
+
+def ensure_model_loaded(model_name: str = None) -> float | None:
+    """Activa el modelo Whisper, cargándolo solo si no está ya en el pool.
+
+    Devuelve los segundos de carga, o ``None`` si el modelo ya estaba en memoria.
+    """
+    global model, current_model_name
+    _import_whisper()
 
     # Usa el modelo por defecto si no se especifica
     model_name = model_name or Config.WHISPER_MODEL
 
-    if model is None or model_name != current_model_name:
-        model = whisper.load_model(model_name)
-        current_model_name = model_name
+    elapsed = None
+    if model_name in _pool:
+        _pool.move_to_end(model_name)
+        metrics_service.model_cache_hits.labels(model_name).inc()
+    else:
+        start = time.perf_counter()
+        _pool[model_name] = whisper.load_model(model_name)
+        elapsed = time.perf_counter() - start
+        while len(_pool) > max(Config.WHISPER_POOL_SIZE, 1):
+            _pool.popitem(last=False)
+        metrics_service.model_load_duration.labels(model_name).observe(elapsed)
+        metrics_service.model_loads.labels(model_name).inc()
+        metrics_service.models_loaded.set(len(_pool))
+
+    model = _pool[model_name]
+    current_model_name = model_name
+    return elapsed
+
+def loaded_models() -> tuple:
+    """Nombres de los modelos residentes en el pool."""
+    return tuple(_pool)
+
+def mel_config() -> dict:
+    """Parámetros que determinan el log-mel que espera el modelo cargado."""
+    return {
+        "n_mels": model.dims.n_mels,
+        "sample_rate": whisper.audio.SAMPLE_RATE,
+        "n_fft": whisper.audio.N_FFT,
+        "hop_length": whisper.audio.HOP_LENGTH,
+        "padding": whisper.audio.N_SAMPLES,
+    }
+
+def load_features(file_path: str):
+    """Devuelve el log-mel (con el mismo relleno que usa transcribe) desde la caché o calculándolo."""
+    global _features_memo
+    if model is None:
+        raise RuntimeError("Modelo Whisper no cargado.")
+
+    stat = os.stat(file_path)
+    memo_key = (file_path, stat.st_mtime_ns, stat.st_size, model.dims.n_mels)
+    if _features_memo is not None and _features_memo[0] == memo_key:
+        return _features_memo[1]
+
+    def compute():
+        audio = whisper.load_audio(file_path)
+        mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels, padding=whisper.audio.N_SAMPLES)
+        return mel.cpu().numpy()
+
+    mel = feature_cache.get_or_compute(file_path, mel_config(), compute)
+    _features_memo = (memo_key, mel)
+    return mel
+
+def clear_features_memo():
+    """Libera el log-mel del último audio (un audio largo ocupa cientos de MB en float32)."""
+    global _features_memo
+    _features_memo = None
+
+def _install_mel_hook():
+    """Permite a ``transcribe()`` recibir el log-mel ya calculado.
+
+    ``whisper.transcribe`` siempre calcula el mel a partir de su entrada (una
+    ruta o muestras de audio), así que no se le puede pasar directamente. Se
+    envuelve una sola vez su ``log_mel_spectrogram``: solo devuelve el mel
+    precalculado al hilo que lo ha pedido y para la misma entrada; el resto de
+    llamadas usan la función original.
+    """
+    module = importlib.import_module("whisper.transcribe")
+    original = module.log_mel_spectrogram
+    if getattr(original, "precomputed_hook", False):
+        return
 
-def transcribe_audio(file_path: str) -> str:
-    """Transcribe un archivo de audio usando el modelo cargado."""
+    def log_mel_spectrogram(audio, *args, **kwargs):
+        override = getattr(_mel_override, "value", None)
+        if override is not None and override[0] is audio:
+            return override[1]
+        return original(audio, *args, **kwargs)
+
+    log_mel_spectrogram.precomputed_hook = True
+    module.log_mel_spectrogram = log_mel_spectrogram
+
+@contextmanager
+def _precomputed_mel(source, mel):
+    """``transcribe(source)`` usa ``mel`` en este hilo en lugar de decodificar el audio de nuevo."""
+    import torch
+
+    _mel_override.value = (source, torch.from_numpy(mel))
+    try:
+        yield
+    finally:
+        _mel_override.value = None
+
+def transcribe_audio(file_path: str, word_timestamps: bool = False, language: str = None) -> dict:
+    """Transcribe un archivo de audio usando el modelo cargado.
+
+    Devuelve el resultado de Whisper completo (``text`` y ``segments``, con
+    ``words`` en cada segmento si se piden marcas por palabra). Con ``language``
+    Whisper no repite la detección de idioma.
+    """
+    if model is None:
+        raise RuntimeError("Modelo Whisper no cargado.")
+
+    mel = load_features(file_path)
+    with _transcribe_lock, _precomputed_mel(file_path, mel):
+        return model.transcribe(file_path, word_timestamps=word_timestamps, language=language)
+
+def content_duration(file_path: str) -> float:
+    """Duración en segundos del audio según su log-mel (sin el relleno final)."""
+    mel = load_features(file_path)
+    return (mel.shape[-1] - whisper.audio.N_FRAMES) / whisper.audio.FRAMES_PER_SECOND
+
+def _shift(segment: dict, offset: float) -> dict:
+    segment["start"] += offset
+    segment["end"] += offset
+    for word in segment.get("words") or []:
+        word["start"] += offset
+        word["end"] += offset
+    return segment
+
+def transcribe_range(file_path: str, start: float, end: float, language: str = None,
+                     word_timestamps: bool = False, initial_prompt: str = None) -> dict:
+    """Transcribe solo ``[start, end)`` segundos del audio, con tiempos absolutos.
+
+    Se usa un tramo del log-mel ya calculado. ``transcribe`` descuenta los
+    últimos 30 s del mel como relleno, así que se añaden para que el contenido
+    sea exactamente el tramo; no dan contexto: Whisper rellena con ceros la
+    última ventana. Las fronteras entre tramos se resuelven con solape en
+    ``transcribe_long_audio``.
+    """
     if model is None:
         raise RuntimeError("Modelo Whisper no cargado.")
 
-    result = model.transcribe(file_path)
-    return result["text"]
+    mel = load_features(file_path)
+    first = int(start * whisper.audio.FRAMES_PER_SECOND)
+    last = int(end * whisper.audio.FRAMES_PER_SECOND)
+    chunk = mel[:, first:last + whisper.audio.N_FRAMES]
+
+    with _transcribe_lock, _precomputed_mel(file_path, chunk):
+        result = model.transcribe(
+            file_path, language=language, word_timestamps=word_timestamps, initial_prompt=initial_prompt
+        )
 
-def detect_language(file_path: str) -> str:
-    """Detecta el idioma predominante del audio usando Whisper."""
+    offset = first / whisper.audio.FRAMES_PER_SECOND
+    result["segments"] = [_shift(segment, offset) for segment in result["segments"]]
+    return result
+
+def detect_language(file_path: str) -> tuple[str, float]:
+    """Detecta el idioma predominante del audio con el modelo activo. Devuelve (idioma, probabilidad)."""
     if model is None:
         raise RuntimeError("Modelo Whisper no cargado.")
+    if not model.is_multilingual:
+        return "en", 1.0
+
+    import torch
 
-    result = model.transcribe(file_path, language=None)
-    return result.get("language", "unknown")
+    # Igual que transcribe(): identificación de idioma sobre la primera ventana de 30 s
+    mel = torch.from_numpy(load_features(file_path))
+    segment = whisper.pad_or_trim(mel, whisper.audio.N_FRAMES)
+    segment = segment.to(model.device, dtype=next(model.parameters()).dtype)
+    _, probs = model.detect_language(segment)
+    language = max(probs, key=probs.get)
+    return language, float(probs[language])
 
 def get_model_name() -> str:
     """Devuelve el nombre del modelo cargado actualmente."""
@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_etag(*parts) -> str:
+    """ETag corto y estable a partir de los valores que determinan la representación."""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def etag_matches(etag: str) -> bool:
+    """Indica si el cliente ya tiene esta versión (``If-None-Match``)."""
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag: str):
+    response = make_response("", 304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def parse_fields(allowed) -> set | None:
+    """Lee ``?fields=a,b`` y devuelve los campos pedidos (``None`` = todos).
+
+    Lanza ``ValueError`` si se pide un campo desconocido.
+    """
+    raw = request.args.get("fields")
+    if not raw:
+        return None
+    fields = {f.strip() for f in raw.split(",") if f.strip()}
+    unknown = fields - set(allowed)
+    if unknown:
+        raise ValueError(f"Campos no válidos: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def _preferred_encoding() -> str | None:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compressed(f):
+    """Comprime con br/gzip las respuestas grandes si el cliente lo acepta."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        response.vary.add("Accept-Encoding")
+
+        if (response.status_code != 200 or response.direct_passthrough
+                or "Content-Encoding" in response.headers):
+            return response
+
+        data = response.get_data()
+        if len(data) < Config.COMPRESSION_MIN_BYTES:
+            return response
+
+        encoding = _preferred_encoding()
+        if encoding == "br":
+            body = brotli.compress(data, quality=Config.BROTLI_QUALITY)
+        elif encoding == "gzip":
+            body = gzip.compress(data, compresslevel=Config.GZIP_LEVEL)
+        else:
+            return response
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    return decorated
@@ -0,0 +1,145 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import datetime
+import threading
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+from config import Config
+
+_log_queue = None
+_listener = None
+_handlers = []
+
+# Atributos estándar de LogRecord; el resto se considera contexto "extra"
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Deja pasar solo 1 de cada ``every`` mensajes DEBUG por punto de llamada.
+
+    Los niveles INFO y superiores nunca se muestrean.
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            count = self.counters.get(key, 0)
+            self.counters[key] = count + 1
+        if count % self.every == 0:
+            record.sampled_every = self.every
+            return True
+        return False
+
+
+def parse_levels(spec: str) -> dict:
+    """Convierte ``"app=INFO,app.services.storage_service=WARNING"`` en un dict."""
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _build_handlers(log_dir: str) -> list:
+    os.makedirs(log_dir, exist_ok=True)
+
+    # Workers de gunicorn y de transcripción escriben en los mismos ficheros: la
+    # rotación es externa (logrotate) y cada proceso reabre el fichero al detectarla
+    info_handler = WatchedFileHandler(os.path.join(log_dir, 'whispai_info.log'))
+    info_handler.setLevel(logging.INFO)
+    info_handler.setFormatter(JsonFormatter())
+
+    error_handler = WatchedFileHandler(os.path.join(log_dir, 'whispai_error.log'))
+    error_handler.setLevel(logging.ERROR)
+    error_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.DEBUG)
+    console_handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s %(name)s: %(message)s [%(pathname)s:%(lineno)d]'
+    ))
+
+    return [info_handler, error_handler, console_handler]
+
+
+def configure_logging(log_dir: str = None):
+    """Instala el pipeline de logging asíncrono (idempotente).
+
+    Los hilos de petición solo encolan registros mediante un ``QueueHandler``;
+    un ``QueueListener`` en segundo plano los formatea y escribe en disco.
+    """
+    global _log_queue, _listener, _handlers
+    if _listener is not None:
+        return
+
+    _log_queue = queue.SimpleQueue()
+    _handlers = _build_handlers(log_dir or Config.LOG_DIR)
+
+    queue_handler = QueueHandler(_log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(Config.LOG_DEBUG_SAMPLE_EVERY))
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+
+    levels = {"root": "WARNING", "app": Config.LOG_LEVEL, "rabbitmq": Config.LOG_LEVEL}
+    levels.update(parse_levels(Config.LOG_LEVELS))
+    for name, level in levels.items():
+        logging.getLogger(None if name == "root" else name).setLevel(level)
+
+    _listener = QueueListener(_log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def restart_after_fork():
+    """Arranca un listener nuevo en el proceso hijo: los hilos no sobreviven a fork()."""
+    global _listener
+    if _listener is None:
+        return
+    _listener = QueueListener(_log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Vacía la cola pendiente y detiene el listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
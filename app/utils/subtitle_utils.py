@@ -0,0 +1,115 @@
+import json
+
+# Los segmentos se guardan en columnas paralelas (tiempos en milisegundos y offsets
+# sobre un único texto concatenado) en lugar de un subdocumento por segmento o palabra:
+# el documento ocupa mucho menos y exportar es un simple recorrido de listas.
+
+EXPORT_FORMATS = {
+    "srt": "application/x-subrip",
+    "vtt": "text/vtt",
+    "json": "application/json",
+}
+EXPORT_LEVELS = ("segment", "word")
+
+
+def _to_ms(seconds) -> int:
+    return int(round(float(seconds) * 1000))
+
+
+def pack_segments(segments: list) -> dict:
+    """Convierte los segmentos de Whisper a la forma columnar que se guarda en Mongo.
+
+    ``text[offsets[i]:offsets[i + 1]]`` es el texto del segmento ``i``. Si Whisper
+    devolvió marcas por palabra se añade ``words`` con la misma estructura y
+    ``segment_offsets`` (índice de la primera palabra de cada segmento).
+    """
+    packed = {"start": [], "end": [], "offsets": [0], "text": ""}
+    parts = []
+    words = None
+    word_parts = []
+
+    for segment in segments:
+        text = segment.get("text", "")
+        packed["start"].append(_to_ms(segment["start"]))
+        packed["end"].append(_to_ms(segment["end"]))
+        parts.append(text)
+        packed["offsets"].append(packed["offsets"][-1] + len(text))
+
+        if "words" in segment:
+            if words is None:
+                words = {"start": [], "end": [], "offsets": [0], "segment_offsets": [0], "text": ""}
+            for word in segment["words"] or []:
+                words["start"].append(_to_ms(word["start"]))
+                words["end"].append(_to_ms(word["end"]))
+                word_parts.append(word["word"])
+                words["offsets"].append(words["offsets"][-1] + len(word["word"]))
+            words["segment_offsets"].append(len(words["start"]))
+
+    packed["text"] = "".join(parts)
+    if words is not None:
+        words["text"] = "".join(word_parts)
+        packed["words"] = words
+    return packed
+
+
+def _cues(columns: dict):
+    """Genera ``(start_ms, end_ms, texto)`` a partir de unas columnas empaquetadas."""
+    text = columns["text"]
+    offsets = columns["offsets"]
+    for i, (start, end) in enumerate(zip(columns["start"], columns["end"])):
+        yield start, end, text[offsets[i]:offsets[i + 1]].strip()
+
+
+def _timestamp(ms: int, separator: str) -> str:
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+def to_srt(columns: dict) -> str:
+    lines = []
+    for index, (start, end, text) in enumerate(_cues(columns), 1):
+        lines.append(f"{index}\n{_timestamp(start, ',')} --> {_timestamp(end, ',')}\n{text}\n")
+    return "\n".join(lines)
+
+
+def to_vtt(columns: dict) -> str:
+    lines = ["WEBVTT\n"]
+    for start, end, text in _cues(columns):
+        lines.append(f"{_timestamp(start, '.')} --> {_timestamp(end, '.')}\n{text}\n")
+    return "\n".join(lines)
+
+
+def to_json(packed: dict) -> str:
+    """Segmentos (y palabras, si existen) como lista de objetos con tiempos en segundos."""
+    words = packed.get("words")
+    word_cues = list(_cues(words)) if words else None
+
+    segments = []
+    for i, (start, end, text) in enumerate(_cues(packed)):
+        segment = {"start": start / 1000, "end": end / 1000, "text": text}
+        if word_cues is not None:
+            first, last = words["segment_offsets"][i], words["segment_offsets"][i + 1]
+            segment["words"] = [
+                {"start": w_start / 1000, "end": w_end / 1000, "word": w_text}
+                for w_start, w_end, w_text in word_cues[first:last]
+            ]
+        segments.append(segment)
+    return json.dumps({"segments": segments}, ensure_ascii=False)
+
+
+def render(packed: dict, export_format: str, level: str = "segment") -> str:
+    """Renderiza los segmentos guardados en ``srt``, ``vtt`` o ``json``.
+
+    Lanza ``ValueError`` si se piden palabras y el audio no las tiene.
+    """
+    if export_format == "json":
+        return to_json(packed)
+
+    columns = packed
+    if level == "word":
+        columns = packed.get("words")
+        if not columns:
+            raise ValueError("La transcripción no tiene marcas de tiempo por palabra")
+    return to_srt(columns) if export_format == "srt" else to_vtt(columns)
@@ -1,4 +1,5 @@
 import os
+import time
 import uuid
 import datetime
 import tempfile
@@ -8,32 +9,46 @@ from flask import current_app, request, jsonify
 from pydub.utils import mediainfo
 
 from config import Config
-from app import app, storage_service, db, whisper_service
-from utils.jwt_utils import generate_jwt, jwt_required
-from utils.llm_utils import generate_llm_output
+from app import db
+from app.services import storage_service, whisper_service, metrics_service, transcode_service, embedding_service, job_service, model_selection_service
+from app.utils.llm_utils import generate_llm_output
+from app.utils.subtitle_utils import pack_segments
 from app.services.whisper_service import transcribe_audio
 from app.services.rabbitmq_service import publish_message
 
+_app = None
+
+def get_app():
+    """Devuelve la app Flask del worker, creándola en el primer uso."""
+    global _app
+    if _app is None:
+        from app import create_app
+        _app = create_app()
+    return _app
+
 def allowed_file(filename: str) -> bool:
     if '.' not in filename:
         return False
     ext = filename.rsplit('.', 1)[1].lower()
     return ext in Config.ALLOWED_EXTENSIONS
 
-def map_precision_to_model(precision: str) -> str:
-    return {
-        "fast": "small",
-        "balanced": "medium",
-        "accurate": "base"
-    }.get(precision, "base")
-
-def select_model_by_duration(duration: float) -> str:
-    if duration < 30:
-        return "small"
-    elif duration < 90:
-        return "medium"
-    else:
-        return "base"
+def select_model(audio_doc: dict, mode: str, duration: float, language: str = None, refine: bool = False) -> dict:
+    """Decisión de modelo para el trabajo (ver ``model_selection_service.choose``)."""
+    return model_selection_service.choose(audio_doc, mode, duration, whisper_service.loaded_models(), language, refine)
+
+def detect_language(audio_doc: dict, audio_path: str) -> str:
+    """Idioma del audio, detectado con ``LANGUAGE_DETECTION_MODEL`` antes de elegir el modelo.
+
+    El refinado de un trabajo en dos pasadas reutiliza el idioma del borrador.
+    """
+    if audio_doc.get("draft_ready") and audio_doc.get("language") not in (None, "unknown"):
+        return audio_doc["language"]
+
+    whisper_service.ensure_model_loaded(Config.LANGUAGE_DETECTION_MODEL)
+    language, probability = whisper_service.detect_language(audio_path)
+    metrics_service.languages_detected.labels(language).inc()
+    current_app.logger.info(f"Idioma detectado para {audio_doc['_id']}: {language} ({probability:.2f})")
+    return language
 
 def get_audio_duration(file_path: str) -> float:
     try:
@@ -43,58 +58,325 @@ def get_audio_duration(file_path: str) -> float:
         current_app.logger.warning(f"No se pudo obtener duración del audio: {e}")
         return 0.0
 
-def background_transcription(audio_id: str, object_name: str, mode: str = "accurate", output_format: str = "text"):
-    with app.app_context():
+def normalize_stored_audio(audio_doc: dict, original_path: str) -> str | None:
+    """Transcodifica el original a 16 kHz mono, lo guarda en MinIO y registra el ahorro.
+
+    Devuelve la ruta local del fichero normalizado, o None si no se pudo normalizar
+    (en ese caso se sigue trabajando con el original).
+    """
+    audio_id = audio_doc["_id"]
+    try:
+        fmt = transcode_service.get_format()
+        normalized_path = transcode_service.normalize_audio(original_path, fmt["name"])
+    except Exception as e:
+        current_app.logger.warning(f"No se pudo normalizar el audio {audio_id}: {e}")
+        return None
+
+    normalized_object = f"{audio_id}.norm{fmt['extension']}"
+    normalized_size = os.path.getsize(normalized_path)
+    original_size = audio_doc.get("size") or os.path.getsize(original_path)
+    update = {
+        "normalized_object_name": normalized_object,
+        "normalized_format": fmt["name"],
+        "normalized_size": normalized_size,
+        "original_size": original_size,
+        "size_savings_bytes": original_size - normalized_size,
+        "size_savings_ratio": round(1 - normalized_size / original_size, 4) if original_size else None
+    }
+    if not Config.NORMALIZE_KEEP_ORIGINAL:
+        # El normalizado pasa a ser el único objeto: reproducción y borrado lo usan directamente
+        update.update({
+            "object_name": normalized_object,
+            "content_type": fmt["content_type"],
+            "size": normalized_size
+        })
+
+    try:
+        with open(normalized_path, "rb") as f:
+            storage_service.save_stream(f, normalized_object, normalized_size, fmt["content_type"])
+        db.update_audio_metadata(audio_id, update)
+    except Exception as e:
+        current_app.logger.warning(f"No se pudo guardar el audio normalizado {audio_id}: {e}")
+        os.remove(normalized_path)
+        return None
+
+    if not Config.NORMALIZE_KEEP_ORIGINAL:
+        # Solo cuando el documento ya apunta al normalizado; si falla queda un objeto huérfano, no un audio roto
+        try:
+            storage_service.delete_file(audio_doc["object_name"])
+        except Exception as e:
+            current_app.logger.warning(f"No se pudo borrar el original de {audio_id}: {e}")
+    metrics_service.normalized_bytes_saved.inc(max(0, original_size - normalized_size))
+    current_app.logger.info(
+        f"Audio {audio_id} normalizado a {fmt['name']}: {original_size} -> {normalized_size} bytes"
+    )
+    return normalized_path
+
+def _checkpoint_segment(segment: dict) -> dict:
+    """Solo los campos necesarios para reconstruir los segmentos al terminar."""
+    slim = {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+    if "words" in segment:
+        slim["words"] = [{"start": w["start"], "end": w["end"], "word": w["word"]} for w in segment["words"] or []]
+    return slim
+
+def transcribe_long_audio(audio_doc: dict, audio_path: str, model_name: str, language: str,
+                          word_timestamps: bool) -> dict:
+    """Transcribe por tramos de ``LONG_AUDIO_CHUNK_SECONDS`` guardando cada tramo terminado.
+
+    Cada tramo se transcribe con ``LONG_AUDIO_OVERLAP_SECONDS`` de audio extra y
+    se queda con los segmentos que empiezan antes de su frontera; el siguiente
+    empieza donde termina el último segmento conservado, así no se cortan
+    palabras ni se repiten segmentos.
+
+    Si el documento tiene un checkpoint compatible (mismo modelo, tramo e idioma)
+    se reanuda desde el último tramo completado en lugar de empezar de cero.
+    """
+    audio_id = audio_doc["_id"]
+    total = whisper_service.content_duration(audio_path)
+    settings = {
+        "model": model_name,
+        "chunk_seconds": Config.LONG_AUDIO_CHUNK_SECONDS,
+        "overlap_seconds": Config.LONG_AUDIO_OVERLAP_SECONDS,
+        "language": language,
+        "word_timestamps": word_timestamps
+    }
+
+    checkpoint = audio_doc.get("checkpoint")
+    if checkpoint and all(checkpoint.get(key) == value for key, value in settings.items()):
+        chunks = checkpoint.get("chunks", [])
+        offset = checkpoint.get("next_offset", 0.0)
+        current_app.logger.info(f"Reanudando {audio_id} desde {offset:.0f} s de {total:.0f} s ({len(chunks)} tramos)")
+    else:
+        db.start_audio_checkpoint(audio_id, settings)
+        chunks = []
+        offset = 0.0
+
+    while offset < total:
+        job_service.check_cancelled(audio_id)
+        boundary = offset + Config.LONG_AUDIO_CHUNK_SECONDS
+        window_end = min(boundary + Config.LONG_AUDIO_OVERLAP_SECONDS, total)
+        # El final del tramo anterior da contexto al decodificador en la frontera
+        prompt = chunks[-1]["text"][-Config.LONG_AUDIO_PROMPT_CHARS:] if chunks else None
+        result = whisper_service.transcribe_range(
+            audio_path, offset, window_end, language=language, word_timestamps=word_timestamps, initial_prompt=prompt
+        )
+        segments = result["segments"]
+        end = total
+        if window_end < total:
+            # Un segmento que llega al final de la ventana puede estar cortado: se repite en el siguiente tramo
+            segments = [s for s in segments if s["start"] < boundary and s["end"] < window_end - 1.0]
+            end = segments[-1]["end"] if segments and segments[-1]["end"] > offset else boundary
+        chunk = {
+            "start": offset,
+            "end": end,
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": [_checkpoint_segment(segment) for segment in segments]
+        }
+        db.append_audio_checkpoint_chunk(audio_id, chunk, end)
+        chunks.append(chunk)
+        offset = end
+
+    return {
+        "text": "".join(chunk["text"] for chunk in chunks),
+        "segments": [segment for chunk in chunks for segment in chunk["segments"]]
+    }
+
+def background_transcription(audio_id: str, object_name: str, mode: str = "accurate", output_format: str = "text",
+                             raise_errors: bool = False, draft: bool = False) -> str:
+    """Ejecuta el pipeline completo de un audio y devuelve el estado final.
+
+    Con ``raise_errors`` el error se propaga sin marcar el audio como fallido,
+    para que el llamador decida si reintentar (ver ``run_job``). Con ``draft``
+    solo se transcribe con ``DRAFT_MODEL`` y se guarda como borrador
+    (estado ``draft_ready``), sin salida LLM ni embeddings.
+    """
+    with get_app().app_context(), metrics_service.jobs_in_flight.track_inprogress():
         tmp_file = None
+        normalized_path = None
+        timings = metrics_service.JobTimings("draft" if draft else mode)
+        duration = 0.0
+        status = "failed"
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-                storage_service.download_file(object_name, tmp_file.name)
+            with timings.stage("mongo_find_audio"):
+                audio_doc = db.find_audio_by_id(audio_id)
+            if audio_doc is None or audio_doc.get("status") == "cancelled":
+                raise job_service.JobCancelled(f"Trabajo {audio_id} cancelado o eliminado")
+            if draft and audio_doc.get("draft_ready"):
+                # Reintento tras guardar el borrador pero antes de encolar el refinado
+                status = "draft_ready"
+                return status
+
+            # Si ya existe la versión normalizada (re-ejecuciones) se descarga esa
+            source_object = audio_doc.get("normalized_object_name") or object_name
+            suffix = os.path.splitext(source_object)[1] or ".wav"
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+                with timings.stage("download"):
+                    storage_service.download_file(source_object, tmp_file.name)
+            audio_path = tmp_file.name
+
+            if Config.NORMALIZE_AUDIO and not audio_doc.get("normalized_object_name"):
+                with timings.stage("normalize"):
+                    normalized_path = normalize_stored_audio(audio_doc, tmp_file.name)
+                audio_path = normalized_path or audio_path
 
-            duration = get_audio_duration(tmp_file.name)
+            with timings.stage("duration_probe"):
+                duration = get_audio_duration(audio_path)
 
-            if mode in ["fast", "balanced", "accurate"]:
-                model_name = map_precision_to_model(mode)
+            job_service.check_cancelled(audio_id)
+            # El idioma se detecta antes de elegir modelo para enrutar el inglés a las variantes .en
+            with timings.stage("language_detection"):
+                language = detect_language(audio_doc, audio_path)
+
+            if draft:
+                decision = model_selection_service.draft(duration, whisper_service.loaded_models(), language)
             else:
-                model_name = select_model_by_duration(duration)
+                # Con el borrador ya guardado este trabajo es el refinado
+                decision = select_model(audio_doc, mode, duration, language, refine=bool(audio_doc.get("draft_ready")))
+            model_name = decision["model"]
+            timings.model = model_name
 
-            whisper_service.ensure_model_loaded(model_name)
+            with timings.stage("model_load"):
+                load_seconds = whisper_service.ensure_model_loaded(model_name)
+            metrics_service.model_routed.labels(model_name, "en" if model_name.endswith(".en") else "multilingual").inc()
+            metrics_service.audio_seconds_by_language.labels(language).inc(duration)
 
-            language = whisper_service.detect_language(tmp_file.name)
-            transcription = transcribe_audio(tmp_file.name)
+            word_timestamps = audio_doc.get("word_timestamps", Config.WORD_TIMESTAMPS)
+            transcription_start = time.perf_counter()
+            with timings.stage("transcription"):
+                if duration >= Config.LONG_AUDIO_THRESHOLD:
+                    result = transcribe_long_audio(audio_doc, audio_path, model_name, language, word_timestamps)
+                else:
+                    result = transcribe_audio(audio_path, word_timestamps, language)
+            model_decision = model_selection_service.record(
+                decision, duration, time.perf_counter() - transcription_start, load_seconds,
+                measure_rtf=not audio_doc.get("checkpoint")
+            )
+            transcription = result["text"]
+            segments = pack_segments(result.get("segments", []))
+
+            job_service.check_cancelled(audio_id)
+            if draft:
+                ready_at = datetime.datetime.utcnow()
+                with timings.stage("mongo_update_transcription"):
+                    db.save_audio_draft(audio_id, transcription, language, segments, {
+                        "model": model_name,
+                        "ready_at": ready_at,
+                        "latency_seconds": round((ready_at - audio_doc["upload_time"]).total_seconds(), 2)
+                        if audio_doc.get("upload_time") else None,
+                        "decision": model_decision
+                    })
+                status = "draft_ready"
+                current_app.logger.info(f"Borrador listo para audio ID {audio_id} con {model_name}")
+                return status
 
-            audio_doc = db.find_audio_by_id(audio_id)
             generate_output = audio_doc.get("generate_llm_output", False)
 
             if generate_output and output_format in ["summary", "keypoints", "interview", "text"]:
-                formatted_output = generate_llm_output(transcription, output_format, language)
+                with timings.stage("llm"):
+                    formatted_output = generate_llm_output(transcription, output_format, language)
                 llm_model_used = output_format
                 current_app.logger.info(f"Salida LLM generada con modelo: {llm_model_used}")
             else:
                 formatted_output = transcription.strip()
                 llm_model_used = None
 
-            db.update_audio_transcription(
-                audio_id,
-                transcription_text=transcription,
-                language=language,
-                output_text=formatted_output
-            )
+            job_service.check_cancelled(audio_id)
+            with timings.stage("mongo_update_transcription"):
+                db.update_audio_transcription(
+                    audio_id,
+                    transcription_text=transcription,
+                    language=language,
+                    output_text=formatted_output,
+                    segments=segments
+                )
+
+            if embedding_service.available():
+                # La búsqueda semántica es secundaria: un fallo aquí no invalida la transcripción
+                try:
+                    with timings.stage("embedding"):
+                        embedding_service.request_index(audio_doc["owner_id"], audio_id, segments, transcription)
+                except Exception as e:
+                    current_app.logger.warning(f"No se pudo indexar semánticamente el audio {audio_id}: {e}")
 
-            db.update_audio_metadata(audio_id, {
-                "duration": duration,
-                "model_used": model_name,
-                "language": language,
-                "llm_model_used": llm_model_used
-            })
+            with timings.stage("mongo_update_metadata"):
+                db.update_audio_metadata(audio_id, {
+                    "duration": duration,
+                    "model_used": model_name,
+                    "model_decision": model_decision,
+                    "language": language,
+                    "llm_model_used": llm_model_used,
+                    # El texto refinado sustituye al borrador
+                    "draft_ready": False
+                })
 
-            db.update_audio_status(audio_id, "completed")
+            with timings.stage("mongo_update_status"):
+                completed = db.update_audio_status(audio_id, "completed", only_if="processing")
+            if not completed:
+                raise job_service.JobCancelled(f"Trabajo {audio_id} cancelado antes de completarse")
+            if audio_doc.get("checkpoint") or duration >= Config.LONG_AUDIO_THRESHOLD:
+                db.clear_audio_checkpoint(audio_id)
+            status = "completed"
             current_app.logger.info(f"Transcripción completada para audio ID {audio_id}")
 
+        except job_service.JobCancelled as e:
+            # Sin reintentos ni estado "failed": el audio ya está cancelado o no existe
+            status = "cancelled"
+            metrics_service.jobs_cancelled.inc()
+            current_app.logger.info(str(e))
+
         except Exception as e:
             error_message = str(e)
             current_app.logger.error(f"Error en transcripción background para {audio_id}: {error_message}")
-            db.update_audio_status(audio_id, "failed", error_message)
+            if raise_errors:
+                raise
+            with timings.stage("mongo_update_status"):
+                db.update_audio_status(audio_id, "failed", error_message, only_if="processing")
 
         finally:
             if tmp_file and os.path.exists(tmp_file.name):
                 os.remove(tmp_file.name)
+            if normalized_path and os.path.exists(normalized_path):
+                os.remove(normalized_path)
+            whisper_service.clear_features_memo()
+            timings.flush(status, duration)
+        return status
+
+def run_job(job: dict, on_claimed=None):
+    """Procesa un mensaje de la cola con lease, heartbeats y reintentos.
+
+    Si otro worker tiene el lease vigente o el audio ya no está en proceso
+    (mensaje duplicado o redelivery tras completar), el mensaje se descarta.
+    ``on_claimed`` se llama en cuanto el lease está reclamado: desde ahí la
+    recuperación depende del lease y del reaper, no del mensaje.
+    """
+    with get_app().app_context():
+        audio_id = job["audio_id"]
+        lease = job_service.claim(audio_id, job)
+        if lease is None:
+            current_app.logger.info(f"Trabajo {audio_id} descartado: ya completado o en curso en otro worker")
+            return
+        if on_claimed:
+            on_claimed()
+
+        handled = True
+        try:
+            with job_service.Heartbeat(lease):
+                status = background_transcription(
+                    audio_id,
+                    job["object_name"],
+                    mode=job.get("mode", "auto"),
+                    output_format=job.get("output_format", "text"),
+                    raise_errors=True,
+                    draft=job.get("pass") == "draft"
+                )
+            if status == "draft_ready":
+                job_service.enqueue_refine(job)
+        except Exception as e:
+            try:
+                job_service.handle_failure(audio_id, job, lease["attempts"], str(e))
+            except Exception as requeue_error:
+                # Si ni siquiera se puede reencolar, el lease queda caducado y el reaper lo recupera
+                handled = False
+                current_app.logger.error(f"No se pudo reencolar {audio_id}: {requeue_error}")
+        finally:
+            job_service.release(lease, handled)
@@ -0,0 +1,184 @@
+"""Mejor reparto procesos × hilos de torch para un modelo en este host.
+
+Para cada reparto se lanzan ``procesos`` subprocesos a la vez, cada uno con
+``hilos`` intra-op (y opcionalmente fijado a su bloque de CPUs, como hace
+``WORKER_CPU_AFFINITY``). Todos cargan el modelo, esperan la señal de salida y
+transcriben las mismas entradas; se compara el throughput agregado (segundos
+de audio por segundo) y la latencia de cada trabajo.
+
+Uso:
+    python -m benchmarks.bench_layout --model base --lengths 30 --jobs 4 \
+        --layouts auto --pin --output layout.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stats import percentile
+
+
+def parse_layouts(value: str, cpus: int) -> list[tuple[int, int]]:
+    """``"auto"`` = todos los repartos exactos de los núcleos; si no, ``"1x8,2x4"``."""
+    if value == "auto":
+        return [(p, cpus // p) for p in range(1, cpus + 1) if cpus % p == 0]
+    layouts = []
+    for item in value.split(","):
+        processes, threads = item.lower().split("x")
+        layouts.append((int(processes), int(threads)))
+    return layouts
+
+
+def run_child(args):
+    from app.services import cpu_service
+
+    layout = cpu_service.plan(args.processes, args.threads)
+    cpu_service.configure_process(args.index, layout, pin=args.pin)
+
+    import whisper
+
+    cpu_service.apply_torch_threads(layout)
+    model = whisper.load_model(args.model, device="cpu")
+    inputs = json.loads(args.inputs)
+
+    # Señal de listo y espera a que el padre dé la salida a todos a la vez
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    jobs = []
+    started = time.time()
+    for _ in range(args.jobs):
+        for item in inputs:
+            start = time.perf_counter()
+            model.transcribe(item["path"], language="en", fp16=False)
+            jobs.append({"input": item["name"], "audio_seconds": item["seconds"],
+                         "latency_s": time.perf_counter() - start})
+    print(json.dumps({"index": args.index, "started": started, "finished": time.time(), "jobs": jobs}), flush=True)
+
+
+def measure(args, processes: int, threads: int, inputs: list[dict]) -> dict:
+    children = []
+    for index in range(processes):
+        cmd = [
+            sys.executable, "-m", "benchmarks.bench_layout", "--child",
+            "--index", str(index), "--processes", str(processes), "--threads", str(threads),
+            "--model", args.model, "--jobs", str(args.jobs), "--inputs", json.dumps(inputs),
+        ]
+        if args.pin:
+            cmd.append("--pin")
+        children.append(subprocess.Popen(cmd, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE, text=True))
+
+    # Carga de modelos fuera de la medición
+    for child in children:
+        if child.stdout.readline().strip() != "ready":
+            for other in children:
+                other.kill()
+            return {"processes": processes, "threads": threads, "error": child.stderr.read().strip()[-2000:]}
+    for child in children:
+        child.stdin.write("go\n")
+        child.stdin.flush()
+
+    results = []
+    for child in children:
+        output, error = child.communicate()
+        if child.returncode != 0:
+            return {"processes": processes, "threads": threads, "error": error.strip()[-2000:]}
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    wall = max(r["finished"] for r in results) - min(r["started"] for r in results)
+    jobs = [job for r in results for job in r["jobs"]]
+    latencies = [job["latency_s"] for job in jobs]
+    audio_seconds = sum(job["audio_seconds"] for job in jobs)
+    return {
+        "processes": processes,
+        "threads": threads,
+        "jobs": len(jobs),
+        "wall_s": wall,
+        "throughput_audio_s_per_s": audio_seconds / wall if wall else None,
+        "throughput_jobs_per_s": len(jobs) / wall if wall else None,
+        "latency_mean_s": statistics.fmean(latencies),
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--layouts", default="auto", help='"auto" o lista "procesosxhilos" (p. ej. 1x8,2x4,4x2)')
+    parser.add_argument("--lengths", default="30", help="Duraciones en segundos del audio sintético")
+    parser.add_argument("--jobs", type=int, default=3, help="Repeticiones de las entradas por proceso")
+    parser.add_argument("--pin", action="store_true", help="Fija cada proceso a su bloque de CPUs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "whispai-bench"))
+    parser.add_argument("--output", default=None, help="Fichero JSON de resultados")
+    # Uso interno: un proceso de un reparto
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--index", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--processes", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--threads", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--inputs", default="[]", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.child:
+        run_child(args)
+        return
+
+    from app.services import cpu_service
+    from benchmarks.audio import build_inputs
+
+    cpus = cpu_service.available_cpus()
+    lengths = [float(v) for v in args.lengths.split(",") if v.strip()]
+    inputs = build_inputs(lengths, args.work_dir, seed=args.seed)
+    results = [measure(args, processes, threads, inputs) for processes, threads in parse_layouts(args.layouts, cpus)]
+
+    ok = [r for r in results if "error" not in r]
+    best = max(ok, key=lambda r: r["throughput_audio_s_per_s"] or 0.0) if ok else None
+
+    print(f"{args.model} en {cpus} CPUs disponibles ({'con' if args.pin else 'sin'} afinidad)")
+    print(f"{'reparto':<10}{'audio s/s':>11}{'jobs/s':>9}{'p50 s':>9}{'p95 s':>9}")
+    for r in results:
+        name = f"{r['processes']}x{r['threads']}"
+        if "error" in r:
+            print(f"{name:<10}  ERROR: {r['error'].splitlines()[-1] if r['error'] else ''}")
+            continue
+        mark = "  <- mejor" if r is best else ""
+        print(f"{name:<10}{r['throughput_audio_s_per_s']:11.2f}{r['throughput_jobs_per_s']:9.3f}"
+              f"{r['latency_p50_s']:9.2f}{r['latency_p95_s']:9.2f}{mark}")
+    if best:
+        print(f"\nWORKER_PROCESSES={best['processes']} TORCH_THREADS={best['threads']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpus_available": cpus,
+                    "cgroup_cpu_limit": cpu_service.cgroup_cpu_limit(),
+                    "model": args.model,
+                    "lengths_s": lengths,
+                    "jobs": args.jobs,
+                    "pin": args.pin,
+                },
+                "best": {"processes": best["processes"], "threads": best["threads"]} if best else None,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Benchmark reproducible de whisper_service + background_transcription.
+
+Ejecuta el pipeline real del worker contra dobles locales de MinIO, MongoDB
+y RabbitMQ (ver ``benchmarks/fakes.py``). Cada combinación modelo/modo se
+mide en un subproceso propio para que el pico de RSS sea comparable.
+
+Uso:
+    python -m benchmarks.bench_pipeline --models tiny,base --modes fast,auto \
+        --lengths 10,60,300 --repeat 3 --output bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stats import percentile
+
+STAGES = (
+    "download", "normalize", "duration_probe", "model_load", "language_detection", "transcription",
+    "llm", "embedding", "mongo_find_audio", "mongo_update_transcription", "mongo_update_metadata",
+    "mongo_update_status",
+)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB, macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def force_model(utils_module, model_name: str):
+    """Fija el modelo independientemente del modo para medir cada modelo por separado."""
+    utils_module.select_model = lambda *args, **kwargs: {"model": model_name, "deadline_at": None}
+    # Las mediciones del benchmark no deben alterar el RTF aprendido por los workers
+    utils_module.model_selection_service.record = lambda decision, *args, **kwargs: decision
+
+
+def stage_means(model_name: str, mode: str) -> dict:
+    from prometheus_client import REGISTRY
+
+    means = {}
+    for stage in STAGES:
+        labels = {"stage": stage, "model": model_name, "mode": mode}
+        count = REGISTRY.get_sample_value("whispai_stage_duration_seconds_count", labels)
+        total = REGISTRY.get_sample_value("whispai_stage_duration_seconds_sum", labels)
+        if count:
+            means[stage] = total / count
+    return means
+
+
+def run_child(args) -> dict:
+    """Mide una combinación modelo/modo dentro de este proceso."""
+    from benchmarks.fakes import install_fakes
+    from benchmarks.audio import build_inputs
+
+    install_fakes(mongo_uri=args.mongo_uri)
+
+    from app import db
+    from app.services import storage_service
+    from app.utils import utils
+
+    force_model(utils, args.model)
+    utils.get_app()
+
+    inputs = build_inputs(args.lengths, args.work_dir, corpus_dir=args.corpus, seed=args.seed)
+    owner_id = f"bench-{uuid.uuid4()}"
+    jobs = []
+    for item in inputs:
+        audio_id = str(uuid.uuid4())
+        object_name = f"{audio_id}{os.path.splitext(item['path'])[1]}"
+        storage_service.minio_client.fput_object(storage_service.bucket_name, object_name, item["path"])
+        db.save_audio_metadata({
+            "_id": audio_id,
+            "filename": item["name"],
+            "object_name": object_name,
+            "owner_id": owner_id,
+            "status": "processing",
+            "generate_llm_output": False,
+            "output_format": "text",
+        })
+        jobs.append((audio_id, object_name, item))
+
+    # Calentamiento: carga el modelo fuera de las mediciones
+    warm_id, warm_object, _ = min(jobs, key=lambda j: j[2]["seconds"] or float("inf"))
+    utils.background_transcription(warm_id, warm_object, mode=args.mode)
+
+    runs = []
+    wall_start = time.perf_counter()
+    for _ in range(args.repeat):
+        for audio_id, object_name, item in jobs:
+            db.update_audio_status(audio_id, "processing")
+            start = time.perf_counter()
+            utils.background_transcription(audio_id, object_name, mode=args.mode)
+            latency = time.perf_counter() - start
+            doc = db.find_audio_by_id(audio_id)
+            seconds = doc.get("duration") or item["seconds"] or 0.0
+            runs.append({
+                "input": item["name"],
+                "audio_seconds": seconds,
+                "latency_s": latency,
+                "rtf": latency / seconds if seconds else None,
+                "status": doc.get("status"),
+                "error": doc.get("error_message"),
+            })
+    wall = time.perf_counter() - wall_start
+
+    ok = [r for r in runs if r["status"] == "completed"]
+    latencies = [r["latency_s"] for r in ok]
+    rtfs = [r["rtf"] for r in ok if r["rtf"] is not None]
+    return {
+        "model": args.model,
+        "mode": args.mode,
+        "jobs": len(runs),
+        "failed": len(runs) - len(ok),
+        "throughput_jobs_per_s": len(ok) / wall if wall else None,
+        "throughput_audio_s_per_s": sum(r["audio_seconds"] for r in ok) / wall if wall else None,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "rtf_mean": statistics.fmean(rtfs) if rtfs else None,
+        "rtf_p50": percentile(rtfs, 50),
+        "rtf_p95": percentile(rtfs, 95),
+        "peak_rss_mb": peak_rss_mb(),
+        "stage_mean_s": stage_means(args.model, args.mode),
+        "runs": runs,
+    }
+
+
+def parse_list(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de transcripción")
+    parser.add_argument("--models", default="tiny,base", type=parse_list)
+    parser.add_argument("--modes", default="fast,auto", type=parse_list)
+    parser.add_argument("--lengths", default="10,60,300",
+                        type=lambda v: [float(x) for x in parse_list(v)],
+                        help="Duraciones en segundos del audio sintético")
+    parser.add_argument("--corpus", default=None, help="Directorio con audios reales adicionales")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB local (por defecto mongomock)")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "whispai-bench"))
+    parser.add_argument("--output", default=None, help="Fichero JSON de resultados")
+    # Uso interno: ejecución de una sola combinación en un subproceso
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--model", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default=None, help=argparse.SUPPRESS)
+    return parser
+
+
+def child_command(args, model_name: str, mode: str) -> list[str]:
+    cmd = [
+        sys.executable, "-m", "benchmarks.bench_pipeline", "--child",
+        "--model", model_name, "--mode", mode,
+        "--lengths", ",".join(f"{s:g}" for s in args.lengths),
+        "--repeat", str(args.repeat), "--seed", str(args.seed),
+        "--work-dir", args.work_dir,
+    ]
+    if args.corpus:
+        cmd += ["--corpus", args.corpus]
+    if args.mongo_uri:
+        cmd += ["--mongo-uri", args.mongo_uri]
+    return cmd
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.child:
+        result = run_child(args)
+        print(json.dumps(result, default=str))
+        return
+
+    results = []
+    for model_name in args.models:
+        for mode in args.modes:
+            proc = subprocess.run(child_command(args, model_name, mode), cwd=ROOT,
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                results.append({"model": model_name, "mode": mode, "error": proc.stderr.strip()[-2000:]})
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "lengths_s": args.lengths,
+            "corpus": args.corpus,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-".rjust(int(spec.split(".")[0]))
+
+    print(f"{'model':<10}{'mode':<10}{'jobs/s':>9}{'RTF':>8}{'p50 s':>9}{'p95 s':>9}{'RSS MB':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['model']:<10}{r['mode']:<10}  ERROR: {r['error'].splitlines()[-1] if r['error'] else ''}")
+            continue
+        print(f"{r['model']:<10}{r['mode']:<10}{fmt(r['throughput_jobs_per_s'], '9.3f')}"
+              f"{fmt(r['rtf_mean'], '8.3f')}{fmt(r['latency_p50_s'], '9.2f')}"
+              f"{fmt(r['latency_p95_s'], '9.2f')}{r['peak_rss_mb']:9.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Dobles locales de MinIO, MongoDB y RabbitMQ para benchmarks y pruebas de carga."""
+import io
+import os
+import threading
+
+
+class FakeObject:
+    """Respuesta mínima compatible con la de ``Minio.get_object``."""
+
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._buffer.read(amt)
+
+    def stream(self, amt=32 * 1024):
+        while True:
+            chunk = self._buffer.read(amt)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._buffer.close()
+
+    def release_conn(self):
+        pass
+
+
+class FakeStat:
+    def __init__(self, object_name: str, size: int, content_type: str):
+        self.object_name = object_name
+        self.size = size
+        self.content_type = content_type
+        self.etag = f"{hash((object_name, size)) & 0xffffffff:08x}"
+
+
+class FakeMinio:
+    """Cliente MinIO en memoria con la API que usa ``storage_service``."""
+
+    def __init__(self, *args, **kwargs):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket_exists(self, bucket):
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket):
+        self.buckets.setdefault(bucket, {})
+
+    def put_object(self, bucket, object_name, data, length, content_type="application/octet-stream", **kwargs):
+        payload = data.read() if length < 0 else data.read(length)
+        with self.lock:
+            self.buckets.setdefault(bucket, {})[object_name] = (payload, content_type)
+
+    def fput_object(self, bucket, object_name, file_path, content_type="application/octet-stream", **kwargs):
+        with open(file_path, "rb") as f:
+            self.put_object(bucket, object_name, f, os.path.getsize(file_path), content_type=content_type)
+
+    def get_object(self, bucket, object_name, offset=0, length=0, **kwargs):
+        data, _ = self.buckets[bucket][object_name]
+        end = offset + length if length else len(data)
+        return FakeObject(data[offset:end])
+
+    def fget_object(self, bucket, object_name, file_path, **kwargs):
+        data, _ = self.buckets[bucket][object_name]
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+    def stat_object(self, bucket, object_name, **kwargs):
+        data, content_type = self.buckets[bucket][object_name]
+        return FakeStat(object_name, len(data), content_type)
+
+    def remove_object(self, bucket, object_name, **kwargs):
+        with self.lock:
+            self.buckets.get(bucket, {}).pop(object_name, None)
+
+    def presigned_get_object(self, bucket, object_name, expires=None, **kwargs):
+        return f"http://fake-minio/{bucket}/{object_name}?X-Amz-Expires={int(expires.total_seconds()) if expires else 0}"
+
+
+class FakePublisher:
+    """Sustituto de ``send_audio_task`` que guarda los mensajes en memoria."""
+
+    def __init__(self):
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def __call__(self, payload: dict):
+        with self.lock:
+            self.messages.append(payload)
+
+    def publish_many(self, payloads: list[dict]):
+        with self.lock:
+            self.messages.extend(payloads)
+
+
+def install_fakes(mongo_uri: str = None):
+    """Sustituye los clientes externos antes de llamar a ``create_app()``.
+
+    Si se indica ``mongo_uri`` se usa un MongoDB local real; si no, mongomock.
+    Devuelve un dict con los dobles instalados para poder inspeccionarlos.
+    """
+    from app import db
+    from app.services import storage_service
+    from config import Config
+
+    if mongo_uri:
+        Config.MONGO_URI = mongo_uri
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("Instala mongomock (pip install mongomock) o indica --mongo-uri")
+        db.MongoClient = mongomock.MongoClient
+
+    storage_service.Minio = FakeMinio
+
+    publisher = FakePublisher()
+    from app.routes import upload_routes, manage_routes
+    upload_routes.send_audio_task = publisher
+    upload_routes.send_audio_tasks = publisher.publish_many
+    manage_routes.send_audio_task = publisher
+
+    return {"publisher": publisher}
@@ -0,0 +1,265 @@
+"""Prueba de carga de la API Flask contra dobles locales.
+
+Levanta ``create_app()`` con MinIO en memoria, mongomock (o un Mongo local
+con ``--mongo-uri``) y un publicador de RabbitMQ simulado, y lanza una
+mezcla de peticiones a ``/api/upload``, ``/api/result`` y ``/api/list``.
+
+Uso:
+    python -m benchmarks.loadtest --scenario mixed --concurrency 16 --duration 30 --output load.json
+    python -m benchmarks.loadtest --transport http --scenario poll
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import wave
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stats import percentile
+
+# Pesos relativos de cada endpoint por escenario
+SCENARIOS = {
+    "upload": {"upload": 1},
+    "poll": {"result": 1},
+    "list": {"list": 1},
+    "mixed": {"upload": 1, "result": 7, "list": 2},
+}
+
+
+class ClientTransport:
+    """Cliente de pruebas de Flask en el mismo proceso (sin red)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, headers=None, data=None):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, data=data)
+        response.close()
+        return response.status_code
+
+
+class HttpTransport:
+    """Servidor WSGI real en un puerto local y peticiones HTTP con ``requests``."""
+
+    def __init__(self, app, port: int):
+        import logging
+        import requests
+        from werkzeug.serving import make_server
+
+        # El log por petición de werkzeug distorsiona la medición
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self.server = make_server("127.0.0.1", port, app, threaded=True)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.requests = requests
+        self.local = threading.local()
+
+    def request(self, method, path, headers=None, data=None):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        files = None
+        if data and "file" in data:
+            data = dict(data)
+            stream, filename = data.pop("file")
+            files = {"file": (filename, stream)}
+        response = session.request(method, self.base + path, headers=headers, data=data, files=files)
+        return response.status_code
+
+    def close(self):
+        self.server.shutdown()
+
+
+def make_wav(size_kb: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(os.urandom(size_kb * 1024))
+    return buffer.getvalue()
+
+
+def seed_data(users: int, audios_per_user: int, transcript_chars: int) -> list[dict]:
+    """Crea usuarios y audios ya transcritos; devuelve token e IDs por usuario."""
+    from app import db
+    from app.utils.jwt_utils import generate_jwt
+
+    text = ("lorem ipsum dolor sit amet " * (transcript_chars // 27 + 1))[:transcript_chars]
+    seeded = []
+    for _ in range(users):
+        user = db.create_user(name="load", email=f"load-{uuid.uuid4()}@example.com", password="loadtest")
+        audio_ids = []
+        for i in range(audios_per_user):
+            audio_id = str(uuid.uuid4())
+            db.save_audio_metadata({
+                "_id": audio_id,
+                "filename": f"seed-{i}.wav",
+                "object_name": f"{audio_id}.wav",
+                "owner_id": user["_id"],
+                "upload_time": datetime.datetime.utcnow(),
+                "status": "completed",
+                "output_format": "text",
+                "transcription": text,
+                "output_text": text,
+                "language": "es",
+                "model_used": "base",
+                "duration": 60.0,
+                "generate_llm_output": False,
+            })
+            audio_ids.append(audio_id)
+        seeded.append({"token": generate_jwt(user["_id"], user.get("name")), "audio_ids": audio_ids})
+    return seeded
+
+
+def run_load(transport, seeded, scenario: dict, concurrency: int, duration: float,
+             max_requests: int, wav: bytes, seed: int) -> dict:
+    endpoints = list(scenario)
+    weights = [scenario[e] for e in endpoints]
+    samples = {e: [] for e in endpoints}
+    lock = threading.Lock()
+    counter = {"n": 0}
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int):
+        rng = random.Random(seed + index)
+        local = {e: [] for e in endpoints}
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests and counter["n"] >= max_requests:
+                    break
+                counter["n"] += 1
+            user = rng.choice(seeded)
+            headers = {"Authorization": f"Bearer {user['token']}"}
+            endpoint = rng.choices(endpoints, weights)[0]
+
+            start = time.perf_counter()
+            try:
+                if endpoint == "upload":
+                    status = transport.request("POST", "/api/upload", headers=headers, data={
+                        "file": (io.BytesIO(wav), "load.wav"), "mode": "auto", "format": "text",
+                    })
+                elif endpoint == "result":
+                    status = transport.request("GET", f"/api/result/{rng.choice(user['audio_ids'])}", headers=headers)
+                else:
+                    status = transport.request("GET", "/api/list", headers=headers)
+            except Exception:
+                status = 0
+            local[endpoint].append((time.perf_counter() - start, status))
+
+        with lock:
+            for e in endpoints:
+                samples[e].extend(local[e])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+
+    report = {}
+    for endpoint, values in samples.items():
+        latencies_ms = [lat * 1000 for lat, _ in values]
+        errors = sum(1 for _, status in values if status == 0 or status >= 400)
+        report[endpoint] = {
+            "requests": len(values),
+            "errors": errors,
+            "error_rate": errors / len(values) if values else 0.0,
+            "rps": len(values) / wall if wall else None,
+            "latency_ms_p50": percentile(latencies_ms, 50),
+            "latency_ms_p90": percentile(latencies_ms, 90),
+            "latency_ms_p99": percentile(latencies_ms, 99),
+            "latency_ms_max": max(latencies_ms) if latencies_ms else None,
+            "status_codes": {str(code): sum(1 for _, s in values if s == code) for code in sorted({s for _, s in values})},
+        }
+    total = sum(r["requests"] for r in report.values())
+    return {"wall_s": wall, "total_requests": total, "total_rps": total / wall if wall else None, "endpoints": report}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de WhispAi")
+    parser.add_argument("--scenario", default="mixed", choices=sorted(SCENARIOS) + ["all"])
+    parser.add_argument("--transport", default="client", choices=["client", "http"],
+                        help="client: test_client en proceso; http: servidor WSGI local")
+    parser.add_argument("--port", type=int, default=0, help="Puerto para --transport http (0 = libre)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por escenario")
+    parser.add_argument("--requests", type=int, default=0, help="Límite de peticiones por escenario (0 = sin límite)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--audios-per-user", type=int, default=50)
+    parser.add_argument("--transcript-chars", type=int, default=5000)
+    parser.add_argument("--upload-kb", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB local (por defecto mongomock)")
+    parser.add_argument("--output", default=None, help="Fichero JSON de resultados")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    from benchmarks.fakes import install_fakes
+    fakes = install_fakes(mongo_uri=args.mongo_uri)
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        seeded = seed_data(args.users, args.audios_per_user, args.transcript_chars)
+
+    transport = HttpTransport(app, args.port) if args.transport == "http" else ClientTransport(app)
+    wav = make_wav(args.upload_kb)
+    names = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+
+    results = {}
+    try:
+        for name in names:
+            results[name] = run_load(transport, seeded, SCENARIOS[name], args.concurrency,
+                                     args.duration, args.requests, wav, args.seed)
+    finally:
+        if hasattr(transport, "close"):
+            transport.close()
+
+    for name, result in results.items():
+        print(f"\n== {name}: {result['total_rps']:.1f} req/s ({result['total_requests']} peticiones)")
+        print(f"{'endpoint':<10}{'req/s':>9}{'err %':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}")
+        for endpoint, r in result["endpoints"].items():
+            if not r["requests"]:
+                continue
+            print(f"{endpoint:<10}{r['rps']:9.1f}{r['error_rate'] * 100:8.2f}"
+                  f"{r['latency_ms_p50']:9.2f}{r['latency_ms_p90']:9.2f}{r['latency_ms_p99']:9.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+                    "transport": args.transport,
+                    "concurrency": args.concurrency,
+                    "duration_s": args.duration,
+                    "users": args.users,
+                    "audios_per_user": args.audios_per_user,
+                    "transcript_chars": args.transcript_chars,
+                    "upload_kb": args.upload_kb,
+                    "seed": args.seed,
+                    "published_tasks": len(fakes["publisher"].messages),
+                },
+                "scenarios": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Tiempo de arranque y memoria de un proceso de la API.
+
+Cada medición es un subproceso nuevo que importa ``app`` y ejecuta
+``create_app()`` contra los dobles de ``benchmarks/fakes.py``. El modo
+``eager`` reproduce el grafo de imports anterior (whisper y torch cargados
+al importar el paquete) para comparar con el actual (``lazy``).
+
+Uso:
+    python -m benchmarks.startup --repeat 5 --output startup.json
+"""
+import argparse
+import datetime
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+HEAVY_MODULES = ("torch", "whisper", "numpy", "sentence_transformers")
+
+
+def current_rss_mb() -> float | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_child(args) -> dict:
+    start = time.perf_counter()
+
+    from benchmarks.fakes import install_fakes
+    install_fakes(mongo_uri=args.mongo_uri)
+
+    if args.mode == "eager":
+        from app.services import whisper_service
+        whisper_service._import_whisper()
+
+    from app import create_app
+    create_app()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": args.mode,
+        "create_app_s": elapsed,
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def measure(args, mode: str) -> dict:
+    runs = []
+    for _ in range(args.repeat):
+        cmd = [sys.executable, "-m", "benchmarks.startup", "--child", "--mode", mode]
+        if args.mongo_uri:
+            cmd += ["--mongo-uri", args.mongo_uri]
+        start = time.perf_counter()
+        output = subprocess.run(cmd, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["process_s"] = time.perf_counter() - start
+        runs.append(result)
+
+    return {
+        "mode": mode,
+        "process_s_median": statistics.median(r["process_s"] for r in runs),
+        "create_app_s_median": statistics.median(r["create_app_s"] for r in runs),
+        "rss_mb_median": statistics.median(r["rss_mb"] or 0.0 for r in runs),
+        "peak_rss_mb_median": statistics.median(r["peak_rss_mb"] for r in runs),
+        "loaded": runs[-1]["loaded"],
+        "runs": runs,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="eager,lazy", help="Modos a comparar (eager, lazy)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB local (por defecto mongomock)")
+    parser.add_argument("--output", default=None, help="Fichero JSON de resultados")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="lazy", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.child:
+        print(json.dumps(run_child(args)))
+        return
+
+    results = [measure(args, mode) for mode in args.modes.split(",")]
+
+    print(f"{'modo':<8}{'proceso s':>11}{'create_app s':>14}{'RSS MB':>9}{'pico MB':>9}  módulos cargados")
+    for r in results:
+        print(f"{r['mode']:<8}{r['process_s_median']:11.2f}{r['create_app_s_median']:14.2f}"
+              f"{r['rss_mb_median']:9.1f}{r['peak_rss_mb_median']:9.1f}  {', '.join(r['loaded']) or '-'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+                    "python": sys.version.split()[0],
+                    "repeat": args.repeat,
+                },
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
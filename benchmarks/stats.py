@@ -0,0 +1,11 @@
+"""Utilidades estadísticas compartidas por los benchmarks."""
+
+
+def percentile(values, pct):
+    """Percentil con interpolación lineal; ``None`` si no hay valores."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
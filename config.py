@@ -29,6 +29,13 @@ class Config:
     JWT_EXPIRATION_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", "60"))
     JWT_REFRESH_DAYS = int(os.getenv("JWT_REFRESH_DAYS", "7"))
 
+    # Hash de contraseñas (formato de werkzeug, con todos los parámetros explícitos;
+    # al cambiarlo los hashes antiguos se regeneran en el siguiente login)
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2"))
+
     # MinIO
     MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
     MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
@@ -40,8 +47,70 @@ class Config:
     MAX_CONTENT_LENGTH = 200 * 1024 * 1024  # 50 MB
     ALLOWED_EXTENSIONS = {"wav", "mp3", "ogg", "m4a", "mp4", "WMA"}
 
+    # Reproducción de audio
+    PLAYBACK_CHUNK_SIZE = int(os.getenv("PLAYBACK_CHUNK_SIZE", str(64 * 1024)))
+    PLAYBACK_REDIRECT = os.getenv("PLAYBACK_REDIRECT", "false").lower() == "true"
+    PRESIGNED_URL_EXPIRES = int(os.getenv("PRESIGNED_URL_EXPIRES", "300"))
+
+    # Compresión de respuestas (result/list)
+    COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+    # Subida por lotes
+    BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+    BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "8"))
+    BULK_RESULT_MAX_IDS = int(os.getenv("BULK_RESULT_MAX_IDS", "1000"))
+    # Límite del contenido descomprimido de un zip (protege frente a zip bombs)
+    BATCH_MAX_UNCOMPRESSED_BYTES = int(os.getenv("BATCH_MAX_UNCOMPRESSED_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+    # Normalización de audio (16 kHz mono) antes de transcribir
+    NORMALIZE_AUDIO = os.getenv("NORMALIZE_AUDIO", "true").lower() == "true"
+    NORMALIZED_AUDIO_FORMAT = os.getenv("NORMALIZED_AUDIO_FORMAT", "opus")  # opus | flac
+    NORMALIZED_OPUS_BITRATE = os.getenv("NORMALIZED_OPUS_BITRATE", "32k")
+    # Si es false, el original se borra y el normalizado lo sustituye
+    NORMALIZE_KEEP_ORIGINAL = os.getenv("NORMALIZE_KEEP_ORIGINAL", "true").lower() == "true"
+    FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+    FFMPEG_TIMEOUT = int(os.getenv("FFMPEG_TIMEOUT", "3600"))
+
     # Whisper
     WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+    WORD_TIMESTAMPS = os.getenv("WORD_TIMESTAMPS", "false").lower() == "true"
+    # Modelos residentes por worker (detector de idioma + variantes multilingüe y .en)
+    WHISPER_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", "3"))
+    # Modelo multilingüe con el que se detecta el idioma antes de elegir el de transcripción
+    LANGUAGE_DETECTION_MODEL = os.getenv("LANGUAGE_DETECTION_MODEL", "base")
+    # Audios en inglés a la variante .en del tamaño elegido
+    ENGLISH_ONLY_MODELS = os.getenv("ENGLISH_ONLY_MODELS", "true").lower() == "true"
+    # Selección de modelo por plazo: candidatos de menor a mayor precisión
+    MODEL_CANDIDATES = os.getenv("MODEL_CANDIDATES", "tiny,base,small,medium")
+    # Plazo para el modo "auto" cuando la subida no indica "deadline" (segundos desde la subida)
+    MODEL_DEFAULT_DEADLINE_SECONDS = int(os.getenv("MODEL_DEFAULT_DEADLINE_SECONDS", "900"))
+    # Margen sobre el tiempo previsto antes de dar un modelo por válido
+    MODEL_DEADLINE_MARGIN = float(os.getenv("MODEL_DEADLINE_MARGIN", "1.2"))
+    # Peso de cada medición en la media móvil del RTF por modelo
+    MODEL_RTF_ALPHA = float(os.getenv("MODEL_RTF_ALPHA", "0.2"))
+    MODEL_STATS_CACHE_SECONDS = int(os.getenv("MODEL_STATS_CACHE_SECONDS", "60"))
+    # Perfil de hardware al que pertenecen las mediciones (por defecto arquitectura y CPUs)
+    MODEL_RTF_PROFILE = os.getenv("MODEL_RTF_PROFILE", "")
+    # Dos pasadas: borrador rápido con DRAFT_MODEL y refinado en segundo plano
+    TWO_PASS_DEFAULT = os.getenv("TWO_PASS_DEFAULT", "false").lower() == "true"
+    DRAFT_MODEL = os.getenv("DRAFT_MODEL", "tiny")
+    # Audios largos: se transcriben por tramos con checkpoint para reanudar tras un reinicio
+    LONG_AUDIO_THRESHOLD = float(os.getenv("LONG_AUDIO_THRESHOLD", "1200"))
+    LONG_AUDIO_CHUNK_SECONDS = float(os.getenv("LONG_AUDIO_CHUNK_SECONDS", "300"))
+    # Audio extra tras cada tramo para no cortar el último segmento a mitad de palabra
+    LONG_AUDIO_OVERLAP_SECONDS = float(os.getenv("LONG_AUDIO_OVERLAP_SECONDS", "15"))
+    LONG_AUDIO_PROMPT_CHARS = int(os.getenv("LONG_AUDIO_PROMPT_CHARS", "200"))
+
+    # Caché de espectrogramas log-mel para re-transcripciones
+    FEATURE_CACHE_ENABLED = os.getenv("FEATURE_CACHE_ENABLED", "true").lower() == "true"
+    FEATURE_CACHE_BACKEND = os.getenv("FEATURE_CACHE_BACKEND", "disk")  # disk | minio
+    FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "cache/features")
+    FEATURE_CACHE_PREFIX = os.getenv("FEATURE_CACHE_PREFIX", "features")
+    FEATURE_CACHE_MAX_BYTES = int(os.getenv("FEATURE_CACHE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+    # float16 ocupa la mitad pero es con pérdida: el mel reduce su precisión también al calcularlo
+    FEATURE_CACHE_DTYPE = os.getenv("FEATURE_CACHE_DTYPE", "float32")
 
     # LLM / Open WebUI
     OPEN_WEBUI_HOST = os.getenv("OPEN_WEBUI_HOST", "http://localhost:8080")
@@ -53,5 +122,100 @@ class Config:
     RABBITMQ_USER = os.getenv("RABBITMQ_USER", "admin")
     RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "admin")
 
+    # Planificador fair-share (rabbitmq/planificador.py)
+    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
+    SCHEDULER_INTAKE_QUEUE = os.getenv("SCHEDULER_INTAKE_QUEUE", "audios.intake")
+    SCHEDULER_TARGET_DEPTH = int(os.getenv("SCHEDULER_TARGET_DEPTH", "4"))
+    SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "1"))
+    # Mensajes de la cola de entrada sin confirmar a la vez (se confirman al guardarlos en MongoDB)
+    SCHEDULER_PREFETCH = int(os.getenv("SCHEDULER_PREFETCH", "100"))
+    SCHEDULER_RECONNECT_SECONDS = float(os.getenv("SCHEDULER_RECONNECT_SECONDS", "5"))
+    SCHEDULER_QUANTUM = float(os.getenv("SCHEDULER_QUANTUM", "10"))
+    SCHEDULER_COST_UNIT_BYTES = int(os.getenv("SCHEDULER_COST_UNIT_BYTES", str(1024 * 1024)))
+    # Pesos y límites por usuario: "owner_id=2,otro=0.5" / "owner_id=1"
+    SCHEDULER_WEIGHTS = os.getenv("SCHEDULER_WEIGHTS", "")
+    SCHEDULER_MAX_CONCURRENT = os.getenv("SCHEDULER_MAX_CONCURRENT", "")
+    SCHEDULER_MAX_CONCURRENT_PER_USER = int(os.getenv("SCHEDULER_MAX_CONCURRENT_PER_USER", "2"))
+    # Fuera del rango de los workers (WORKER_METRICS_PORT + índice)
+    SCHEDULER_METRICS_PORT = int(os.getenv("SCHEDULER_METRICS_PORT", "9099"))
+
+    # Control de admisión en /api/upload
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    # Espera estimada a partir de la cual "auto" pasa a ADMISSION_DEGRADED_MODE
+    ADMISSION_SLA_SECONDS = int(os.getenv("ADMISSION_SLA_SECONDS", "600"))
+    # Espera estimada a partir de la cual se rechazan subidas con 503
+    ADMISSION_MAX_WAIT_SECONDS = int(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "3600"))
+    ADMISSION_DEGRADED_MODE = os.getenv("ADMISSION_DEGRADED_MODE", "fast")
+    ADMISSION_THROUGHPUT_WINDOW = int(os.getenv("ADMISSION_THROUGHPUT_WINDOW", "900"))
+    # Trabajos/minuto que se suponen si no ha terminado ninguno en la ventana
+    ADMISSION_MIN_THROUGHPUT = float(os.getenv("ADMISSION_MIN_THROUGHPUT", "1"))
+    ADMISSION_CACHE_SECONDS = float(os.getenv("ADMISSION_CACHE_SECONDS", "5"))
+    # Token bucket por usuario (0 = sin límite)
+    RATE_LIMIT_UPLOADS_PER_MINUTE = float(os.getenv("RATE_LIMIT_UPLOADS_PER_MINUTE", "20"))
+    RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+
+    # Ciclo de vida de los trabajos: leases, reintentos y dead-letter
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+    JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+    JOB_REAPER_INTERVAL = int(os.getenv("JOB_REAPER_INTERVAL", "60"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BASE_DELAY = int(os.getenv("JOB_RETRY_BASE_DELAY", "30"))
+    JOB_RETRY_MAX_DELAY = int(os.getenv("JOB_RETRY_MAX_DELAY", "900"))
+    # Reparto de CPU entre procesos de transcripción (0 = automático según núcleos disponibles)
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+    TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+    TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+    WORKER_CPU_AFFINITY = os.getenv("WORKER_CPU_AFFINITY", "false").lower() == "true"
+    # Espera del worker entre consultas cuando las colas están vacías
+    WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "0.5"))
+
+    # Servidor de producción (gunicorn)
+    GUNICORN_BIND = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+    GUNICORN_WORKERS = int(os.getenv("GUNICORN_WORKERS", str((os.cpu_count() or 1) * 2 + 1)))
+    GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "4"))
+    GUNICORN_KEEPALIVE = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+    GUNICORN_TIMEOUT = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+    GUNICORN_GRACEFUL_TIMEOUT = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+    GUNICORN_MAX_REQUESTS = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+    GUNICORN_PRELOAD = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+    # Logging
+    LOG_DIR = os.getenv("LOG_DIR", "logs")
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    # Niveles por módulo, p. ej. "app.services.storage_service=DEBUG,pymongo=WARNING"
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+    # Solo 1 de cada N mensajes DEBUG por punto de llamada (1 = sin muestreo)
+    LOG_DEBUG_SAMPLE_EVERY = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "100"))
+
+    # Búsqueda de texto completo
+    SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+    SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "100"))
+    SEARCH_SNIPPETS_PER_RESULT = int(os.getenv("SEARCH_SNIPPETS_PER_RESULT", "3"))
+    SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "160"))
+
+    # Búsqueda semántica (embeddings locales en CPU)
+    EMBEDDING_ENABLED = os.getenv("EMBEDDING_ENABLED", "true").lower() == "true"
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+    EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "indexes/embeddings")
+    EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float16")
+    EMBEDDING_CHUNK_CHARS = int(os.getenv("EMBEDDING_CHUNK_CHARS", "500"))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_OPEN_INDEXES = int(os.getenv("EMBEDDING_OPEN_INDEXES", "64"))
+    # Búsqueda aproximada: firmas de EMBEDDING_ANN_BITS bits y reordenación exacta de los candidatos
+    EMBEDDING_ANN_BITS = int(os.getenv("EMBEDDING_ANN_BITS", "256"))
+    EMBEDDING_ANN_SEED = int(os.getenv("EMBEDDING_ANN_SEED", "0"))
+    EMBEDDING_ANN_MIN_ROWS = int(os.getenv("EMBEDDING_ANN_MIN_ROWS", "20000"))
+    EMBEDDING_ANN_CANDIDATES = int(os.getenv("EMBEDDING_ANN_CANDIDATES", "2000"))
+    SEMANTIC_SEARCH_MAX_K = int(os.getenv("SEMANTIC_SEARCH_MAX_K", "50"))
+    # El indexador (rabbitmq/indexador.py) es el único proceso que carga el modelo y el índice
+    EMBEDDING_QUEUE = os.getenv("EMBEDDING_QUEUE", "embeddings")
+    EMBEDDING_QUERY_QUEUE = os.getenv("EMBEDDING_QUERY_QUEUE", "embeddings.query")
+    EMBEDDING_QUERY_TIMEOUT = float(os.getenv("EMBEDDING_QUERY_TIMEOUT", "10"))
+
+    # Métricas (Prometheus)
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+    # Segundos entre consultas a RabbitMQ de /metrics para whispai_queue_depth
+    METRICS_QUEUE_DEPTH_CACHE_SECONDS = float(os.getenv("METRICS_QUEUE_DEPTH_CACHE_SECONDS", "15"))
+
     # Formatos de salida LLM permitidos
     ALLOWED_FORMATS = {"text", "summary", "keypoints", "interview", "sentences"}
@@ -0,0 +1,58 @@
+# Configuración de gunicorn para servir la API en producción.
+#
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# Recarga en caliente:
+#   kill -HUP <pid_master>   -> reinicia los workers de forma ordenada (graceful_timeout).
+#                               Con preload_app=True el código ya está cargado en el master,
+#                               así que para desplegar código nuevo usa:
+#   kill -USR2 <pid_master>  -> arranca un master nuevo con el código actualizado y,
+#   kill -WINCH <pid_viejo>  -> cuando esté sano, drena los workers del master antiguo.
+
+import os
+import shutil
+import tempfile
+
+from config import Config
+
+# Las métricas de Prometheus se agregan entre procesos a través de este directorio.
+# Debe definirse antes de importar la app (preload_app). Solo se vacía en el primer
+# arranque: un master nuevo lanzado con USR2 hereda la variable y conserva los ficheros.
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tempfile.gettempdir(), "whispai_prometheus")
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = Config.GUNICORN_BIND
+workers = Config.GUNICORN_WORKERS
+threads = Config.GUNICORN_THREADS
+worker_class = "gthread"
+preload_app = Config.GUNICORN_PRELOAD
+
+keepalive = Config.GUNICORN_KEEPALIVE
+timeout = Config.GUNICORN_TIMEOUT
+graceful_timeout = Config.GUNICORN_GRACEFUL_TIMEOUT
+
+# Reciclar workers periódicamente acota fugas de memoria en procesos de larga vida
+max_requests = Config.GUNICORN_MAX_REQUESTS
+max_requests_jitter = max_requests // 10 if max_requests else 0
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """Abre conexiones propias en cada worker: los clientes creados en el master no son fork-safe."""
+    from app import db
+    from app.services import storage_service
+    from app.utils import log_utils
+
+    db.reset_after_fork()
+    storage_service.reset_after_fork()
+    log_utils.restart_after_fork()
+
+
+def child_exit(server, worker):
+    from app.services import metrics_service
+
+    metrics_service.mark_process_dead(worker.pid)
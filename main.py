@@ -1,6 +1,9 @@
 from app import create_app
+from config import Config
 
+# Punto de entrada WSGI: en producción se sirve con `gunicorn -c gunicorn.conf.py main:app`
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Servidor de desarrollo de Flask (un solo proceso)
+    app.run(host="0.0.0.0", port=5000, debug=Config.DEBUG)
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import logging
+import threading
+import multiprocessing
+import pika
+
+# Asegura que config.py y el paquete app se puedan importar aunque estés en rabbitmq/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import Config
+from app.services import metrics_service, job_service, cpu_service, rabbitmq_service
+from app.utils.utils import run_job, get_app
+from app.utils import log_utils
+
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", Config.RABBITMQ_HOST)
+RABBITMQ_USER = os.getenv("RABBITMQ_USER", Config.RABBITMQ_USER)
+RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", Config.RABBITMQ_PASSWORD)
+QUEUE_NAME = "audios"
+# Bajo "rabbitmq" para que LOG_LEVEL se aplique también al ejecutarlo como script
+logger = logging.getLogger("rabbitmq.consumidor")
+REFINE_QUEUE = job_service.REFINE_QUEUE
+
+def process_message(body, on_claimed=None):
+    """Valida el mensaje y ejecuta el trabajo; los errores ya quedan gestionados al volver."""
+    try:
+        payload = json.loads(body)
+        if "audio_id" not in payload or "object_name" not in payload:
+            raise ValueError("faltan 'audio_id' u 'object_name'")
+    except ValueError as e:
+        get_app().logger.error(f"Mensaje inválido enviado a dead-letter: {e}")
+        try:
+            job_service.dead_letter({"raw": body.decode(errors="replace")}, f"Mensaje inválido: {e}")
+        except Exception as dlq_error:
+            get_app().logger.error(f"No se pudo enviar el mensaje inválido a dead-letter: {dlq_error}")
+        return
+
+    try:
+        run_job(payload, on_claimed)
+    except Exception as e:
+        # El lease sigue activo hasta caducar y el reaper reencolará el trabajo
+        get_app().logger.error(f"Error no recuperable procesando {payload['audio_id']}: {e}")
+
+def next_message(channel):
+    """Siguiente mensaje por prioridad: la cola principal y, solo si está vacía, los refinados."""
+    for queue in (QUEUE_NAME, REFINE_QUEUE):
+        method, properties, body = channel.basic_get(queue=queue)
+        if method is not None:
+            metrics_service.queue_depth.labels(queue).set(method.message_count)
+            return method, body
+        metrics_service.queue_depth.labels(queue).set(0)
+    return None
+
+def run_worker(index: int = 0):
+    """Bucle del worker: un trabajo cada vez, sacado con ``basic_get``.
+
+    Con dos colas de distinta prioridad un consumidor push (``basic_consume``)
+    no permite preferir una sobre otra, así que el worker pregunta primero a la
+    principal y después a la de refinados. El trabajo corre en otro hilo para
+    que pika siga atendiendo los heartbeats de la conexión mientras tanto.
+
+    El mensaje se confirma en cuanto el trabajo tiene lease: con audios de
+    horas, esperar al final superaría el consumer_timeout de RabbitMQ (30 min
+    por defecto), que cierra el canal. Si el worker muere después, el lease
+    caduca y el reaper reencola el trabajo.
+    """
+    app = get_app()
+    # Reintentos, dead-letter, refinados y el reaper publican fuera de esta conexión
+    rabbitmq_service.use_short_lived_connections()
+    port = metrics_service.start_worker_server(Config.WORKER_METRICS_PORT + index)
+    app.logger.info(f"Métricas del worker {index} expuestas en el puerto {port}")
+
+    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
+    connection = pika.BlockingConnection(
+        pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials)
+    )
+    channel = connection.channel()
+    channel.queue_declare(queue=QUEUE_NAME, durable=True)
+    channel.queue_declare(queue=REFINE_QUEUE, durable=True)
+
+    job_service.start_reaper()
+
+    app.logger.info("Worker de transcripción esperando mensajes...")
+    try:
+        while True:
+            message = next_message(channel)
+            if message is None:
+                connection.sleep(Config.WORKER_POLL_SECONDS)
+                continue
+
+            method, body = message
+            acked = threading.Event()
+
+            def ack(delivery_tag=method.delivery_tag, acked=acked):
+                # Se llama desde el hilo del trabajo; el canal solo se usa desde este hilo
+                acked.set()
+                connection.add_callback_threadsafe(lambda: channel.basic_ack(delivery_tag=delivery_tag))
+
+            worker = threading.Thread(target=process_message, args=(body, ack), name="job", daemon=True)
+            worker.start()
+            while worker.is_alive():
+                connection.process_data_events(time_limit=1)
+            if acked.is_set():
+                # Ejecuta el ack pendiente si el trabajo terminó justo después de pedirlo
+                connection.process_data_events(time_limit=0)
+            else:
+                # Mensaje inválido o descartado: no llegó a reclamarse
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.close()
+
+def start_process(index: int, layout: dict) -> multiprocessing.Process:
+    def target():
+        # El hilo del listener de logging no sobrevive al fork
+        log_utils.restart_after_fork()
+        cpu_service.configure_process(index, layout)
+        run_worker(index)
+
+    process = multiprocessing.get_context("fork").Process(target=target, name=f"worker-{index}", daemon=True)
+    process.start()
+    return process
+
+def main():
+    """Arranca ``WORKER_PROCESSES`` workers repartiendo los núcleos disponibles entre ellos.
+
+    Con un solo proceso el worker corre aquí mismo; con varios, este proceso
+    solo los supervisa y relanza los que terminan.
+    """
+    layout = cpu_service.plan()
+    log_utils.configure_logging()
+    logger.info(
+        f"{layout['cpus']} CPUs disponibles: {layout['processes']} procesos × {layout['threads']} hilos"
+        + (" (sobresuscrito)" if layout["oversubscribed"] else "")
+    )
+
+    if layout["processes"] == 1:
+        cpu_service.configure_process(0, layout)
+        run_worker(0)
+        return
+
+    # torch no debe estar importado antes del fork: cada hijo fija sus hilos primero
+    processes = {index: start_process(index, layout) for index in range(layout["processes"])}
+    try:
+        while True:
+            for index, process in list(processes.items()):
+                process.join(timeout=1)
+                if not process.is_alive():
+                    logger.warning(f"Worker {index} terminó con código {process.exitcode}; se relanza")
+                    processes[index] = start_process(index, layout)
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
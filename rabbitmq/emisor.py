@@ -1,17 +1,23 @@
 import os
 import sys
 import json
+import logging
 import pika
 
 # Asegura que config.py se pueda importar aunque estés en rabbitmq/
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 # Configuración desde variables de entorno o config centralizada
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", Config.RABBITMQ_HOST)
 RABBITMQ_USER = os.getenv("RABBITMQ_USER", Config.RABBITMQ_USER)
 RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", Config.RABBITMQ_PASSWORD)
 
+# Con el planificador activo las tareas entran por su cola y él las reparte a "audios"
+TASK_QUEUE = Config.SCHEDULER_INTAKE_QUEUE if Config.SCHEDULER_ENABLED else "audios"
+
 def send_audio_task(payload: dict):
     try:
         credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
@@ -19,19 +25,50 @@ def send_audio_task(payload: dict):
             pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials)
         )
         channel = connection.channel()
-        channel.queue_declare(queue="audios", durable=True)
+        channel.queue_declare(queue=TASK_QUEUE, durable=True)
 
         channel.basic_publish(
             exchange='',
-            routing_key='audios',
+            routing_key=TASK_QUEUE,
             body=json.dumps(payload),
             properties=pika.BasicProperties(delivery_mode=2)
         )
 
-        print(f"✅ Mensaje enviado a RabbitMQ: {payload}")
+        logger.debug("✅ Mensaje enviado a RabbitMQ: %s", payload)
         connection.close()
     except Exception as e:
-        print(f"❌ Error al enviar a RabbitMQ: {e}")
+        logger.error(f"❌ Error al enviar a RabbitMQ: {e}")
+        raise
+
+def send_audio_tasks(payloads: list[dict]):
+    """Publica varias tareas con una sola conexión y canal, esperando confirmación del broker."""
+    if not payloads:
+        return
+    try:
+        credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
+        connection = pika.BlockingConnection(
+            pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials)
+        )
+        try:
+            channel = connection.channel()
+            channel.confirm_delivery()
+            channel.queue_declare(queue=TASK_QUEUE, durable=True)
+
+            # Con confirm_delivery cada basic_publish espera el ack y lanza NackError/UnroutableError
+            for payload in payloads:
+                channel.basic_publish(
+                    exchange='',
+                    routing_key=TASK_QUEUE,
+                    body=json.dumps(payload),
+                    properties=pika.BasicProperties(delivery_mode=2),
+                    mandatory=True
+                )
+        finally:
+            connection.close()
+
+        logger.debug("✅ %d mensajes enviados a RabbitMQ", len(payloads))
+    except Exception as e:
+        logger.error(f"❌ Error al enviar lote a RabbitMQ: {e}")
         raise
 
 
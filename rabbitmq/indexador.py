@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import pika
+
+# Asegura que config.py y el paquete app se puedan importar aunque estés en rabbitmq/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import Config
+from app.services import embedding_service
+from app.utils.utils import get_app
+
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", Config.RABBITMQ_HOST)
+RABBITMQ_USER = os.getenv("RABBITMQ_USER", Config.RABBITMQ_USER)
+RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", Config.RABBITMQ_PASSWORD)
+RECONNECT_SECONDS = 5
+
+# Indexador semántico: único proceso que carga el modelo de embeddings y abre
+# el índice de EMBEDDING_INDEX_DIR.
+#
+#   EMBEDDING_QUEUE        altas (transcripciones terminadas, desde los workers)
+#                          y bajas (audios borrados, desde la API)
+#   EMBEDDING_QUERY_QUEUE  búsquedas de la API por RPC (direct reply-to)
+#
+# Las búsquedas van en su propio canal para no esperar detrás de una cola de altas.
+
+
+def on_update(channel, method, properties, body):
+    app = get_app()
+    try:
+        message = json.loads(body)
+        with app.app_context():
+            if message["action"] == "index":
+                count = embedding_service.index_transcript(
+                    message["owner_id"], message["audio_id"], message.get("segments"), message.get("transcription")
+                )
+                app.logger.info(f"Audio {message['audio_id']} indexado ({count} fragmentos)")
+            elif message["action"] == "remove":
+                embedding_service.remove_audio(message["owner_id"], message["audio_id"])
+            else:
+                raise ValueError(f"acción desconocida '{message['action']}'")
+    except Exception as e:
+        # La búsqueda semántica es secundaria: un mensaje que falla no bloquea la cola
+        app.logger.error(f"Error actualizando el índice semántico: {e}")
+    channel.basic_ack(delivery_tag=method.delivery_tag)
+
+
+def on_query(channel, method, properties, body):
+    app = get_app()
+    try:
+        message = json.loads(body)
+        results = embedding_service.search(
+            message["owner_id"], message["query"], int(message["k"]), message.get("approximate", True)
+        )
+        reply = {"results": results}
+    except Exception as e:
+        app.logger.error(f"Error en la búsqueda semántica: {e}")
+        reply = {"error": str(e)}
+
+    if properties.reply_to:
+        channel.basic_publish(
+            exchange="",
+            routing_key=properties.reply_to,
+            body=json.dumps(reply, ensure_ascii=False),
+            properties=pika.BasicProperties(correlation_id=properties.correlation_id)
+        )
+    channel.basic_ack(delivery_tag=method.delivery_tag)
+
+
+def run(app):
+    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
+    connection = pika.BlockingConnection(
+        pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials)
+    )
+    try:
+        update_channel = connection.channel()
+        update_channel.queue_declare(queue=Config.EMBEDDING_QUEUE, durable=True)
+        update_channel.basic_qos(prefetch_count=1)
+        update_channel.basic_consume(queue=Config.EMBEDDING_QUEUE, on_message_callback=on_update)
+
+        query_channel = connection.channel()
+        query_channel.queue_declare(queue=Config.EMBEDDING_QUERY_QUEUE)
+        query_channel.basic_qos(prefetch_count=1)
+        query_channel.basic_consume(queue=Config.EMBEDDING_QUERY_QUEUE, on_message_callback=on_query)
+
+        app.logger.info(f"Indexador semántico atendiendo '{Config.EMBEDDING_QUEUE}' y '{Config.EMBEDDING_QUERY_QUEUE}'...")
+        # start_consuming atiende los consumidores de todos los canales de la conexión
+        update_channel.start_consuming()
+    finally:
+        if connection.is_open:
+            connection.close()
+
+
+def main():
+    app = get_app()
+    if not embedding_service.installed():
+        app.logger.error("sentence-transformers no está instalado: el indexador no puede arrancar")
+        sys.exit(1)
+
+    # El modelo se carga al arrancar y no en la primera búsqueda
+    embedding_service.get_model()
+
+    while True:
+        try:
+            run(app)
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            app.logger.error(f"Indexador desconectado, reintentando en {RECONNECT_SECONDS} s: {e}")
+            time.sleep(RECONNECT_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
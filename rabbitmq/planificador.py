@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import pika
+
+# Asegura que config.py y el paquete app se puedan importar aunque estés en rabbitmq/
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from config import Config
+from app.services import metrics_service, job_service, scheduler_service, rabbitmq_service
+from app.utils.utils import get_app
+
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", Config.RABBITMQ_HOST)
+RABBITMQ_USER = os.getenv("RABBITMQ_USER", Config.RABBITMQ_USER)
+RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", Config.RABBITMQ_PASSWORD)
+INTAKE_QUEUE = Config.SCHEDULER_INTAKE_QUEUE
+WORKER_QUEUE = "audios"
+
+# Planificador fair-share entre la API y los workers.
+#
+# Consume la cola de entrada, guarda cada mensaje en el documento de su audio
+# (campo scheduler_job) y lo confirma en el acto: las colas virtuales por
+# usuario viven en MongoDB y en memoria solo hay una copia para el deficit
+# round-robin. Así no se acumulan entregas sin confirmar que RabbitMQ cerraría
+# al superar consumer_timeout. En cada tick pasa a "audios" solo lo necesario
+# para mantener SCHEDULER_TARGET_DEPTH mensajes esperando y marca cada audio
+# como despachado. Si el planificador cae, al volver reconstruye las colas
+# desde MongoDB; un duplicado se descarta al reclamar el lease en el worker.
+
+scheduler = scheduler_service.FairScheduler()
+# audio_id de los trabajos en las colas virtuales (una redelivery no los duplica)
+held = set()
+
+
+def hold(payload: dict):
+    if payload["audio_id"] in held:
+        return
+    held.add(payload["audio_id"])
+    scheduler.enqueue(payload.get("owner_id"), payload, scheduler_service.job_cost(payload))
+
+
+def load_held_jobs():
+    """Reconstruye las colas virtuales con los trabajos retenidos en MongoDB."""
+    from app import db
+
+    global scheduler
+    scheduler = scheduler_service.FairScheduler()
+    held.clear()
+    for payload in db.find_held_scheduler_jobs():
+        hold(payload)
+    metrics_service.scheduler_pending.set(len(scheduler))
+
+
+def on_message(channel, method, properties, body):
+    from app import db
+
+    try:
+        payload = json.loads(body)
+        if "audio_id" not in payload or "object_name" not in payload:
+            raise ValueError("faltan 'audio_id' u 'object_name'")
+    except ValueError as e:
+        get_app().logger.error(f"Mensaje inválido enviado a dead-letter: {e}")
+        job_service.dead_letter({"raw": body.decode(errors="replace")}, f"Mensaje inválido: {e}")
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        return
+
+    # Si MongoDB falla la excepción cierra la conexión y el mensaje sin ack vuelve a la cola
+    if db.hold_scheduler_job(payload["audio_id"], payload):
+        hold(payload)
+    channel.basic_ack(delivery_tag=method.delivery_tag)
+    metrics_service.scheduler_pending.set(len(scheduler))
+
+
+def dispatch(worker_channel) -> int:
+    """Rellena la cola de los workers hasta ``SCHEDULER_TARGET_DEPTH``. Devuelve cuántos despachó."""
+    from app import db
+
+    if not len(scheduler):
+        return 0
+
+    depth = worker_channel.queue_declare(queue=WORKER_QUEUE, durable=True, passive=True).method.message_count
+    metrics_service.queue_depth.labels(WORKER_QUEUE).set(depth)
+    free = Config.SCHEDULER_TARGET_DEPTH - depth
+    if free <= 0:
+        return 0
+
+    scheduler.set_active(db.count_active_jobs_by_owner())
+    dispatched = 0
+    while dispatched < free:
+        entry = scheduler.next()
+        if entry is None:
+            break
+        _, payload = entry
+        # Con confirm_delivery basic_publish espera el ack del broker antes de seguir
+        worker_channel.basic_publish(
+            exchange="",
+            routing_key=WORKER_QUEUE,
+            body=json.dumps(payload),
+            properties=pika.BasicProperties(delivery_mode=2),
+            mandatory=True
+        )
+        # Cada audio se marca en cuanto está publicado: un fallo posterior no lo deja pendiente
+        db.mark_audios_scheduled([payload["audio_id"]])
+        held.discard(payload["audio_id"])
+        dispatched += 1
+        metrics_service.scheduler_dispatched.inc()
+    return dispatched
+
+
+def run(app):
+    """Una sesión con RabbitMQ: reconstruye las colas virtuales y reparte hasta que la conexión cae."""
+    load_held_jobs()
+
+    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
+    connection = pika.BlockingConnection(
+        pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials)
+    )
+    try:
+        intake_channel = connection.channel()
+        intake_channel.queue_declare(queue=INTAKE_QUEUE, durable=True)
+        intake_channel.basic_qos(prefetch_count=Config.SCHEDULER_PREFETCH)
+        intake_channel.basic_consume(queue=INTAKE_QUEUE, on_message_callback=on_message)
+
+        worker_channel = connection.channel()
+        worker_channel.confirm_delivery()
+        worker_channel.queue_declare(queue=WORKER_QUEUE, durable=True)
+
+        def tick():
+            try:
+                dispatch(worker_channel)
+            except Exception as e:
+                app.logger.error(f"Error despachando trabajos: {e}")
+            metrics_service.scheduler_pending.set(len(scheduler))
+            metrics_service.scheduler_pending_users.set(len(scheduler.queues))
+            connection.call_later(Config.SCHEDULER_TICK_SECONDS, tick)
+
+        connection.call_later(Config.SCHEDULER_TICK_SECONDS, tick)
+
+        app.logger.info(f"Planificador repartiendo '{INTAKE_QUEUE}' hacia '{WORKER_QUEUE}'...")
+        intake_channel.start_consuming()
+    finally:
+        if connection.is_open:
+            connection.close()
+
+
+def main():
+    app = get_app()
+    # Los mensajes inválidos van a dead-letter fuera de la conexión del bucle
+    rabbitmq_service.use_short_lived_connections()
+    port = metrics_service.start_worker_server(Config.SCHEDULER_METRICS_PORT)
+    app.logger.info(f"Métricas del planificador expuestas en el puerto {port}")
+
+    while True:
+        try:
+            run(app)
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            # RabbitMQ o MongoDB caídos: las colas se reconstruyen desde MongoDB al reconectar
+            app.logger.error(f"Planificador desconectado, reintentando en {Config.SCHEDULER_RECONNECT_SECONDS} s: {e}")
+            time.sleep(Config.SCHEDULER_RECONNECT_SECONDS)
+
+
+if __name__ == "__main__":
+    main()